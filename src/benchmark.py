@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy
+
+import entity.kernels
+import gymadapter
+import simulation
+from collisionavoidance import SearchAgent
+
+# Benchmarks for the hot paths of the simulation
+# every benchmark runs on simulations with fixed seeds, so two runs (on two different commits, say) do exactly the same work
+# the results are written as JSON, and a previous results file can be given to --compare to see what got faster or slower
+
+
+def measure(function, repeat: int, number: int = 1) -> dict:
+    """
+    time 'function' 'repeat' times, each time calling it 'number' times in a row
+    returns statistics of the time per call in seconds, plus how many calls that is per second
+    """
+    # one untimed call first, so anything set up on the first call is not counted
+    function()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+
+    samples.sort()
+    return {
+        "mean": statistics.mean(samples),
+        "median": statistics.median(samples),
+        "min": samples[0],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "per_second": 1.0 / statistics.median(samples),
+        "samples": len(samples),
+    }
+
+
+def ticker(numberOfObstacles: int, seed: int, spatialIndex: bool = False):
+    """
+    returns a function that ticks a simulation once, always with the same sequence of inputs,
+    starting the simulation over from the same state whenever it crashes
+    """
+    start = simulation.SingleSimulation(numberOfObstacles, 2000, 500, spatialIndex=spatialIndex, seed=seed)
+    sim = start.copy()
+    inputs = numpy.random.default_rng(seed).choice([-1.0, 0.0, 0.0, 1.0], 4096).tolist()
+    position = [0]
+
+    def tick():
+        if sim.crashed:
+            start.copyInto(sim)
+
+        sim.tick(inputs[position[0] % len(inputs)], 1.0)
+        position[0] += 1
+
+    return tick
+
+
+def benchmarkTicks(results: dict, scale: float) -> None:
+    for numberOfObstacles in (10, 100, 1000, 3000):
+        for spatialIndex in (False, True):
+            name = "tick/obstacles=" + str(numberOfObstacles) + ("/grid" if spatialIndex else "")
+            results[name] = measure(ticker(numberOfObstacles, 1, spatialIndex), repeat=max(5, int(50 * scale)), number=20)
+
+
+def benchmarkSensors(results: dict, scale: float) -> None:
+    for numberOfObstacles in (10, 100, 1000, 3000):
+        sim = simulation.SingleSimulation(numberOfObstacles, 2000, 500, seed=2)
+        relX = sim.obstacles.relX.copy()
+        relY = sim.obstacles.relY.copy()
+
+        results["sensors/obstacles=" + str(numberOfObstacles)] = measure(lambda: sim.car.sensors.updateDetect(relX, relY),
+                                                                      repeat=max(5, int(50 * scale)), number=50)
+        results["collision/obstacles=" + str(numberOfObstacles)] = measure(lambda: sim.car.collisionMask(relX, relY),
+                                                                        repeat=max(5, int(50 * scale)), number=50)
+
+
+def benchmarkCopies(results: dict, scale: float) -> None:
+    for numberOfObstacles in (10, 1000):
+        sim = simulation.SingleSimulation(numberOfObstacles, 2000, 500, seed=3)
+        scratch = sim.copy()
+        buffer = numpy.empty(sim.snapshotSize())
+        snapshot = sim.snapshot()
+        suffix = "/obstacles=" + str(numberOfObstacles)
+
+        results["copy" + suffix] = measure(sim.copy, repeat=max(5, int(50 * scale)), number=20)
+        results["copyInto" + suffix] = measure(lambda: sim.copyInto(scratch), repeat=max(5, int(50 * scale)), number=50)
+        results["snapshot" + suffix] = measure(lambda: sim.snapshot(buffer), repeat=max(5, int(50 * scale)), number=50)
+        results["restore" + suffix] = measure(lambda: scratch.restore(snapshot), repeat=max(5, int(50 * scale)), number=50)
+
+
+def benchmarkSearchAgent(results: dict, scale: float) -> None:
+    for nSteps in (8, 16, 32, 64):
+        agent = SearchAgent(nSteps)
+        start = simulation.SingleSimulation(10, 800, 500, seed=4)
+        sim = start.copy()
+
+        def decide():
+            if sim.crashed:
+                start.copyInto(sim)
+
+            sim.tick(agent.chooseDirection(sim), 1.0)
+
+        results["search/nSteps=" + str(nSteps)] = measure(decide, repeat=max(10, int(100 * scale)))
+        agent.close()
+
+
+def benchmarkEnvs(results: dict, scale: float) -> None:
+    env = gymadapter.SimulationGymnasiumAdapter(render_mode=None)
+    env.reset(seed=5)
+    actions = numpy.random.default_rng(5).integers(0, 3, 4096).tolist()
+    position = [0]
+
+    def step():
+        _, _, terminated, _, _ = env.step(actions[position[0] % len(actions)])
+        position[0] += 1
+        if terminated:
+            env.reset()
+
+    results["env/single"] = measure(step, repeat=max(5, int(50 * scale)), number=20)
+
+    for numberOfEnvs in (8, 256):
+        vectorEnv = gymadapter.SimulationVectorEnvAdapter(numberOfEnvs, copy=False)
+        vectorEnv.reset(seed=5)
+        vectorActions = numpy.random.default_rng(5).integers(0, 3, (64, numberOfEnvs))
+        vectorPosition = [0]
+
+        def vectorStep():
+            vectorEnv.step(vectorActions[vectorPosition[0] % len(vectorActions)])
+            vectorPosition[0] += 1
+
+        result = measure(vectorStep, repeat=max(5, int(50 * scale)), number=10)
+
+        # count every environment stepped, so this compares directly with env/single
+        result["per_second"] *= numberOfEnvs
+        results["env/vector=" + str(numberOfEnvs)] = result
+        vectorEnv.close()
+
+
+def benchmarkSharedWorld(results: dict, scale: float) -> None:
+    for vehicleCount in (1, 50, 500):
+        inputs = numpy.random.default_rng(6).choice([-1.0, 0.0, 0.0, 1.0], (100, vehicleCount))
+        forward = numpy.ones(vehicleCount)
+
+        # the same cars driven through separate worlds and through one shared world, from a fresh start each time
+        def batchRun():
+            batch = simulation.BatchSimulation(vehicleCount, 10, 800, 500, seed=6, autoReset=False)
+            for turning in inputs:
+                batch.tick(turning, forward)
+
+        def sharedRun():
+            world = simulation.SharedWorldSimulation(vehicleCount, 10, 800, 500, seed=6)
+            for turning in inputs:
+                world.tick(turning, forward)
+
+        for name, function in (("batch", batchRun), ("shared", sharedRun)):
+            result = measure(function, repeat=max(3, int(10 * scale)))
+
+            # count every car ticked, so the two compare directly
+            result["per_second"] *= vehicleCount * len(inputs)
+            results[name + "/vehicles=" + str(vehicleCount)] = result
+
+
+Benchmarks = {
+    "tick": benchmarkTicks,
+    "sensors": benchmarkSensors,
+    "copies": benchmarkCopies,
+    "search": benchmarkSearchAgent,
+    "env": benchmarkEnvs,
+    "shared": benchmarkSharedWorld,
+}
+
+
+def describeRun() -> dict:
+    """
+    what the benchmarks were run on, so results files can be told apart
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "backend": entity.kernels.backend,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """
+    print how every benchmark in both results changed, returns the number that got slower by more than 'threshold'
+    """
+    slower = 0
+
+    print("%-32s %12s %12s %8s" % ("benchmark", "old (us)", "new (us)", "change"), file=sys.stderr)
+    for name in new["results"]:
+        if name not in old["results"]:
+            continue
+
+        before = old["results"][name]["median"]
+        after = new["results"][name]["median"]
+        change = (after - before) / before
+
+        flag = ""
+        if change > threshold:
+            flag = "  slower"
+            slower += 1
+        elif change < -threshold:
+            flag = "  faster"
+
+        print("%-32s %12.2f %12.2f %+7.1f%%%s" % (name, before * 1e6, after * 1e6, change * 100, flag), file=sys.stderr)
+
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, sensors, search agent and environments")
+    parser.add_argument("--only", nargs="*", choices=list(Benchmarks), default=list(Benchmarks),
+                        help="which groups of benchmarks to run, all of them by default")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiplies how many times each benchmark is repeated, less than 1 for a quick run")
+    parser.add_argument("--backend", choices=entity.kernels.Backends, default=None,
+                        help="which backend to benchmark, see entity/kernels.py, numba (if it is installed) by default")
+    parser.add_argument("--output", default=None,
+                        help="file to write the results to as JSON, otherwise they are written to stdout")
+    parser.add_argument("--compare", default=None,
+                        help="a results file from an earlier run to compare these results against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="how much slower a benchmark has to get to count as a regression with --compare, as a fraction")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        try:
+            entity.kernels.setBackend(args.backend)
+        except ImportError as error:
+            parser.error(str(error))
+
+    results = {}
+    for group in args.only:
+        print("running " + group + " benchmarks", file=sys.stderr)
+        Benchmarks[group](results, args.scale)
+
+    output = {"run": describeRun(), "results": results}
+
+    if args.output is None:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as compareFile:
+            old = json.load(compareFile)
+
+        # exit with a failure if anything regressed, so this can be used in a script
+        if compare(old, output, args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,11 @@
+import random
+import time
+from math import log, pi, sqrt
+
+import numpy
+
+import instrumentation
+import lookaheadpool
 import simulation
 
 # manual searching
@@ -12,11 +20,14 @@ class SearchAgent:
     looks ahead nSteps steps to check for the best method forwards
     """
 
-    def __init__(self, nSteps = 8, sensorWeight = 5.0, crashPenalty = -1e9):
+    def __init__(self, nSteps = 8, sensorWeight = 5.0, crashPenalty = -1e9, workers = 0):
         self.nSteps = nSteps
         self.sensorWeight = sensorWeight
         self.crashPenalty = crashPenalty
 
+        # with workers > 0, the lookaheads are run in parallel in that many worker processes, see lookaheadpool.py
+        self.pool = lookaheadpool.LookaheadPool(workers) if workers > 0 else None
+
         # posasible directions to turn
         self.potentialActions = [
             -1.0, # turning left
@@ -24,21 +35,51 @@ class SearchAgent:
             1.0   # turning right
         ]
 
+        # instance that each lookahead is copied into, so a new simulation isn't created for every check
+        self.scratch = None
+
     # choose which direction to turn: left, right, or no turning
     def chooseDirection(self, simInstance: simulation.SingleSimulation):
+        if not instrumentation.enabled:
+            return self._chooseDirection(simInstance)
+
+        start = time.perf_counter()
+        choice = self._chooseDirection(simInstance)
+        instrumentation.phase("search.chooseDirection", start)
+        instrumentation.count("search.decisions")
+
+        return choice
+
+    def _chooseDirection(self, simInstance: simulation.SingleSimulation):
         bestChoice      = self.potentialActions[1] # best choice we have found to turn so far
         highScore       = float("-Infinity")       # the score of that choice
 
+        if self.pool is not None:
+            scores = self.pool.evaluate(simInstance, self.potentialActions, self.nSteps, self.crashPenalty)
+
+            for i, currentScore in zip(self.potentialActions, scores):
+                if currentScore > highScore:
+                    bestChoice = i
+                    highScore = currentScore
+
+            return bestChoice
+
         # check every direction
         for i in self.potentialActions:
             currentScore = 0.0
 
-            # make a new instance
-            checkingInstance = simInstance.copy()
+            # copy the current state into the scratch instance
+            # only fitness and crashed are looked at, so the scratch instance never works out its sensors
+            if self.scratch is None:
+                self.scratch = simInstance.copy()
+                self.scratch.lazySensors = True
+            else:
+                simInstance.copyInto(self.scratch)
+
+            checkingInstance = self.scratch
 
-            # step forwards
-            for j in range(self.nSteps):
-                checkingInstance.tick(i, 1.0)
+            # step forwards, going straight ahead this skips over the ticks where nothing happens
+            checkingInstance.advance(self.nSteps, i, 1.0)
 
             # update the current score
             currentScore = checkingInstance.fitness
@@ -49,4 +90,462 @@ class SearchAgent:
                 bestChoice = i
                 highScore = currentScore
 
-        return bestChoice
\ No newline at end of file
+        return bestChoice
+
+    def close(self):
+        """
+        stop the worker processes, if there are any
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+# tree searching
+# instead of only trying each action for the whole lookahead, this searches sequences of actions as a tree
+# each node of the tree is a copy of the simulation after following one sequence of actions, where each action is held for stepsPerAction ticks
+# only the beamWidth best nodes at each depth are expanded further, and nodes that end up in the same state as another node at the same depth are merged
+# the first action of the best sequence found is the one that gets chosen
+
+class TreeSearchAgent:
+    """
+    beam searches sequences of actions up to depth actions deep, within a time budget (and optionally a node budget) per decision
+    """
+
+    def __init__(self, depth = 8, beamWidth = 6, stepsPerAction = 4, potentialActions = (-1.0, 0.0, 1.0),
+                 timeBudget = 0.005, nodeBudget = None, crashPenalty = -1e9,
+                 headingBuckets = 64, positionQuantum = 10.0, cacheRadius = 300.0):
+        self.depth = depth
+        self.beamWidth = beamWidth
+        self.stepsPerAction = stepsPerAction
+        self.potentialActions = list(potentialActions)
+        self.timeBudget = timeBudget # seconds per decision, or None for no limit
+        self.nodeBudget = nodeBudget # nodes expanded per decision, or None for no limit
+        self.crashPenalty = crashPenalty
+
+        # how finely states are told apart for the transposition cache
+        self.headingBuckets = headingBuckets
+        self.positionQuantum = positionQuantum
+        self.cacheRadiusSquared = cacheRadius ** 2
+
+        # spare simulation instances, so nodes can be copied into them instead of creating new ones
+        self.pool = []
+
+        # statistics from the last decision
+        self.nodesExpanded = 0
+        self.cacheHits = 0
+        self.depthReached = 0
+
+    def _take(self, simInstance: simulation.SingleSimulation) -> simulation.SingleSimulation:
+        """
+        returns a copy of simInstance, reusing an instance from the pool if there is one
+        """
+        if self.pool:
+            returnInstance = self.pool.pop()
+            simInstance.copyInto(returnInstance)
+            return returnInstance
+
+        # nodes are only scored and compared by their obstacles, never by their sensors
+        returnInstance = simInstance.copy()
+        returnInstance.lazySensors = True
+
+        return returnInstance
+
+    def transpositionKey(self, simInstance: simulation.SingleSimulation) -> tuple:
+        """
+        returns a key that is the same for states that are close enough to be treated as the same
+
+        this is the car heading and the positions of the obstacles near the car, both rounded
+        """
+        heading = int(round(simInstance.car.direction / (2 * pi) * self.headingBuckets)) % self.headingBuckets
+
+        relX = simInstance.obstacles.relX
+        relY = simInstance.obstacles.relY
+        nearby = ((relX * relX) + (relY * relY)) < self.cacheRadiusSquared
+
+        positions = numpy.round(numpy.stack((relX[nearby], relY[nearby]), axis=1) / self.positionQuantum).astype(numpy.int64)
+        positions = positions[numpy.lexsort((positions[:, 1], positions[:, 0]))]
+
+        return (heading, positions.tobytes())
+
+    def score(self, simInstance: simulation.SingleSimulation) -> float:
+        """
+        how good a node is, the same as SearchAgent scores its lookaheads
+        """
+        currentScore = simInstance.fitness
+        if simInstance.crashed:
+            currentScore += self.crashPenalty
+
+        return currentScore
+
+    # choose which direction to turn: left, right, or no turning
+    def chooseDirection(self, simInstance: simulation.SingleSimulation):
+        deadline = None if self.timeBudget is None else time.perf_counter() + self.timeBudget
+
+        self.nodesExpanded = 0
+        self.cacheHits = 0
+        self.depthReached = 0
+
+        # each node is (score, first action, instance)
+        beam = [(self.score(simInstance), self.potentialActions[len(self.potentialActions) // 2], self._take(simInstance))]
+        outOfBudget = False
+
+        for depth in range(self.depth):
+            children = {}
+
+            for parentScore, firstAction, parent in beam:
+                # crashed nodes are kept as they are, there is nothing more to find out from them
+                if parent.crashed:
+                    children[("crashed", id(parent))] = (parentScore, firstAction, self._take(parent))
+                    continue
+
+                for action in self.potentialActions:
+                    child = self._take(parent)
+                    child.advance(self.stepsPerAction, action, 1.0)
+
+                    self.nodesExpanded += 1
+                    childScore = self.score(child)
+                    key = self.transpositionKey(child) if not child.crashed else ("crashed", id(child))
+
+                    if key in children:
+                        # already reached this state another way, keep whichever got there better
+                        self.cacheHits += 1
+                        if children[key][0] >= childScore:
+                            self.pool.append(child)
+                            continue
+
+                        self.pool.append(children[key][2])
+
+                    children[key] = (childScore, action if depth == 0 else firstAction, child)
+
+                    if (self.nodeBudget is not None and self.nodesExpanded >= self.nodeBudget) or (deadline is not None and time.perf_counter() >= deadline):
+                        outOfBudget = True
+                        break
+
+                if outOfBudget:
+                    break
+
+            # a depth that was only partly searched can't be compared fairly with itself, so stop at the last full one
+            # unless this was the first depth, where the partial results are all there is
+            if outOfBudget and depth > 0:
+                for _, _, child in children.values():
+                    self.pool.append(child)
+                break
+
+            for _, _, parent in beam:
+                self.pool.append(parent)
+
+            ranked = sorted(children.values(), key=lambda node: node[0], reverse=True)
+            beam = ranked[:self.beamWidth]
+            for _, _, pruned in ranked[self.beamWidth:]:
+                self.pool.append(pruned)
+
+            self.depthReached = depth + 1
+
+            if outOfBudget:
+                break
+
+        bestScore, bestChoice, _ = max(beam, key=lambda node: node[0])
+
+        for _, _, node in beam:
+            self.pool.append(node)
+
+        return bestChoice
+
+
+# monte carlo tree searching
+# builds up a tree of action sequences for as long as it is allowed to each tick, then goes with the most visited action
+# the tree is open loop, which means nodes only store the actions taken to get to them and not a copy of the simulation,
+# every iteration replays its actions from the real state instead, so obstacles respawning differently doesn't invalidate the tree
+# and the part of the tree under the chosen action can be kept for the next decision
+# each action is held for stepsPerAction ticks, in between decisions the agent keeps refining the tree under the action it is carrying out
+
+class MCTSNode:
+    """
+    one node in the tree built by MCTSAgent
+    """
+
+    def __init__(self, action = None):
+        self.action = action  # action taken to get to this node from its parent
+        self.children = {}    # action -> MCTSNode
+        self.visits = 0
+        self.totalValue = 0.0
+
+    def meanValue(self) -> float:
+        return self.totalValue / self.visits if self.visits > 0 else 0.0
+
+
+class MCTSAgent:
+    """
+    anytime monte carlo tree search, which answers within 'deadline' seconds every time it is asked for a direction
+    """
+
+    def __init__(self, deadline = 0.005, stepsPerAction = 4, maxDepth = 8, rolloutActions = 4, potentialActions = (-1.0, 0.0, 1.0), exploration = 0.7, seed = None):
+        self.deadline = deadline             # seconds per decision
+        self.stepsPerAction = stepsPerAction # ticks that each action in the tree is held for
+        self.maxDepth = maxDepth             # most actions deep the tree can go
+        self.rolloutActions = rolloutActions # random actions tried after leaving the tree
+        self.potentialActions = list(potentialActions)
+        self.exploration = exploration       # UCB1 exploration constant
+        self.random = random.Random(seed)    # only used for rollouts
+
+        # node for the state that the committed action leads to, kept between decisions
+        self.root = None
+        self.committedAction = self.potentialActions[len(self.potentialActions) // 2]
+        self.remainingTicks = 0
+
+        # instance that each iteration is replayed in
+        self.scratch = None
+
+        # statistics from the last call
+        self.iterations = 0
+
+    def reset(self) -> None:
+        """
+        forget the tree, for when the agent is given a different simulation
+        """
+        self.root = None
+        self.remainingTicks = 0
+
+    # choose which direction to turn: left, right, or no turning
+    def chooseDirection(self, simInstance: simulation.SingleSimulation, deadline = None):
+        endTime = time.perf_counter() + (self.deadline if deadline is None else deadline)
+
+        if self.root is None:
+            self.root = MCTSNode()
+
+        # the tree is searched from the state at the end of the action currently being carried out
+        self._search(simInstance, endTime)
+
+        if self.remainingTicks == 0:
+            # decision point, go with the action that has been looked at the most, and keep the tree under it
+            if self.root.children:
+                best = max(self.root.children.values(), key=lambda node: (node.visits, node.meanValue()))
+                self.committedAction = best.action
+                self.root = best
+            else:
+                self.root = None
+
+            self.remainingTicks = self.stepsPerAction
+
+        self.remainingTicks -= 1
+
+        return self.committedAction
+
+    def _search(self, simInstance: simulation.SingleSimulation, endTime: float) -> None:
+        """
+        run iterations on the tree under self.root until endTime
+        """
+        self.iterations = 0
+
+        while time.perf_counter() < endTime:
+            if self.scratch is None:
+                self.scratch = simInstance.copy()
+                self.scratch.lazySensors = True
+            else:
+                simInstance.copyInto(self.scratch)
+
+            # finish off the action that is already underway
+            if self.remainingTicks > 0 and not self._tickFor(self.committedAction, self.remainingTicks, endTime):
+                return
+
+            startFitness = self.scratch.fitness
+            ticks = 0
+
+            # selection and expansion, going down the tree until an action that hasn't been tried yet is found
+            node = self.root
+            path = [node]
+            while (not self.scratch.crashed) and (len(path) <= self.maxDepth):
+                untried = [action for action in self.potentialActions if action not in node.children]
+
+                if untried:
+                    child = MCTSNode(self.random.choice(untried))
+                    node.children[child.action] = child
+                else:
+                    child = max(node.children.values(), key=lambda candidate: self._ucb(node, candidate))
+
+                if not self._tickFor(child.action, self.stepsPerAction, endTime):
+                    return
+
+                ticks += self.stepsPerAction
+                node = child
+                path.append(node)
+
+                if untried:
+                    break
+
+            # rollout, with random actions
+            for _ in range(self.rolloutActions):
+                if self.scratch.crashed:
+                    break
+
+                if not self._tickFor(self.random.choice(self.potentialActions), self.stepsPerAction, endTime):
+                    return
+
+                ticks += self.stepsPerAction
+
+            # value is the progress made as a fraction of the most that could have been made, and crashing is the worst possible outcome
+            if self.scratch.crashed:
+                value = -1.0
+            else:
+                value = (self.scratch.fitness - startFitness) / max(1, ticks * simulation.SingleSimulation.CarSpeed)
+
+            for visited in path:
+                visited.visits += 1
+                visited.totalValue += value
+
+            self.iterations += 1
+
+    def _tickFor(self, action: float, ticks: int, endTime: float) -> bool:
+        """
+        tick the scratch instance with the action, returns False if the deadline passed, meaning the iteration has to be thrown away
+        """
+        for _ in range(ticks):
+            self.scratch.tick(action, 1.0)
+
+        return time.perf_counter() < endTime
+
+    def _ucb(self, parent: MCTSNode, child: MCTSNode) -> float:
+        return child.meanValue() + (self.exploration * sqrt(log(parent.visits + 1) / (child.visits + 1)))
+
+
+# cross entropy method planning
+# keeps a chance of taking each action at each step of a sequence, and samples many sequences from those chances at once
+# every sequence is rolled out together in a BatchSimulation that starts from the real state, which is one set of array operations per tick
+# instead of a copy of the simulation per sequence, then the chances are moved towards the actions in the best few sequences (the elites)
+# and the sampling is repeated, the first action of the best sequence found is carried out for stepsPerAction ticks
+# the chances are kept for the next decision, moved along by one action, so the search starts off from the last plan
+
+class CEMAgent:
+    """
+    cross entropy method planner over 'samples' sequences of 'horizon' actions, each held for stepsPerAction ticks
+    """
+
+    def __init__(self, horizon = 6, stepsPerAction = 4, samples = 128, elites = 16, iterations = 3, smoothing = 0.7,
+                 potentialActions = (-1.0, 0.0, 1.0), crashPenalty = -1e9, seed = None):
+        # the first samples of every iteration are each action held the whole way, then the last plan, so there has to be room for them
+        if samples <= len(potentialActions):
+            raise ValueError("Invalid samples/potentialActions combination, samples must be more than the number of potentialActions")
+        if not 1 <= elites <= samples:
+            raise ValueError("Invalid samples/elites combination, elites must be at least 1 and no more than samples")
+
+        self.horizon = horizon               # actions in each sequence
+        self.stepsPerAction = stepsPerAction # ticks that each action is held for
+        self.samples = samples               # sequences rolled out each iteration
+        self.elites = elites                 # best sequences that the chances are refitted to
+        self.iterations = iterations         # rounds of sampling and refitting per decision
+        self.smoothing = smoothing           # how far the chances move towards the elites each iteration
+        self.potentialActions = numpy.array(potentialActions, dtype=numpy.float64)
+        self.crashPenalty = crashPenalty
+        self.random = numpy.random.default_rng(seed)
+
+        # chance of each action (columns) at each step (rows), and the best sequence of action indices from the last decision
+        self.probabilities = None
+        self.plan = None
+        self.committedAction = self.potentialActions[len(self.potentialActions) // 2]
+        self.remainingTicks = 0
+
+        # worlds that the sequences are rolled out in, reloaded from the real state every iteration
+        self.batch = None
+
+        # statistics from the last decision
+        self.bestScore = 0.0
+
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        forget the last plan, for when the agent is given a different simulation
+        """
+        self.probabilities = numpy.full((self.horizon, len(self.potentialActions)), 1.0 / len(self.potentialActions))
+        self.plan = None
+        self.remainingTicks = 0
+
+    # choose which direction to turn: left, right, or no turning
+    def chooseDirection(self, simInstance: simulation.SingleSimulation):
+        if self.remainingTicks == 0:
+            self._plan(simInstance)
+            self.committedAction = float(self.potentialActions[self.plan[0]])
+            self.remainingTicks = self.stepsPerAction
+
+            # move everything along by the action that is about to be carried out, with no idea about the new last step
+            self.probabilities[:-1] = self.probabilities[1:]
+            self.probabilities[-1] = 1.0 / len(self.potentialActions)
+            self.plan = numpy.append(self.plan[1:], self.plan[-1])
+
+        self.remainingTicks -= 1
+
+        return self.committedAction
+
+    def _plan(self, simInstance: simulation.SingleSimulation) -> None:
+        """
+        refine self.probabilities for the state of 'simInstance', leaving the best sequence found in self.plan
+        """
+        timing = instrumentation.enabled
+        if timing:
+            start = time.perf_counter()
+
+        if self.batch is None or self.batch.worldCount != self.samples:
+            self.batch = simulation.BatchSimulation.fromSingle(simInstance, self.samples, seed=int(self.random.integers(2 ** 63)))
+            self.batch.sensorsEnabled = False
+
+        actionCount = len(self.potentialActions)
+        bestSequence = None
+        bestScore = -numpy.inf
+
+        for iteration in range(self.iterations):
+            sequences = self._sample()
+
+            # always try the previous best, and to begin with every action held for the whole horizon, like SearchAgent does
+            if iteration == 0:
+                sequences[:actionCount] = numpy.arange(actionCount)[:, None]
+                if self.plan is not None:
+                    sequences[actionCount] = self.plan
+            else:
+                sequences[0] = bestSequence
+
+            scores = self._rollout(simInstance, sequences)
+
+            best = int(numpy.argmax(scores))
+            if scores[best] > bestScore:
+                bestScore = scores[best]
+                bestSequence = sequences[best].copy()
+
+            # refit the chances to how often each action comes up at each step of the elites
+            elites = sequences[numpy.argpartition(scores, -self.elites)[-self.elites:]]
+            frequencies = (elites[:, :, None] == numpy.arange(actionCount)).mean(axis=0)
+            self.probabilities = ((1.0 - self.smoothing) * self.probabilities) + (self.smoothing * frequencies)
+
+        self.plan = bestSequence
+        self.bestScore = float(bestScore)
+
+        if timing:
+            instrumentation.phase("cem.plan", start)
+            instrumentation.count("cem.plans")
+
+    def _sample(self) -> numpy.ndarray:
+        """
+        returns self.samples sequences of action indices, each step drawn from self.probabilities
+        """
+        cumulative = numpy.cumsum(self.probabilities, axis=1)
+        draws = self.random.random((self.samples, self.horizon, 1)) * cumulative[:, -1:]
+
+        return numpy.minimum((draws >= cumulative).sum(axis=2), len(self.potentialActions) - 1)
+
+    def _rollout(self, simInstance: simulation.SingleSimulation, sequences: numpy.ndarray) -> numpy.ndarray:
+        """
+        returns the score of every sequence, followed from the state of 'simInstance'
+        """
+        batch = self.batch
+        batch.loadSingle(simInstance)
+
+        turning = self.potentialActions[sequences]
+        forward = numpy.ones(self.samples)
+
+        for step in range(self.horizon):
+            for _ in range(self.stepsPerAction):
+                batch.tick(turning[:, step], forward)
+
+            if batch.crashed.all():
+                break
+
+        return batch.fitness + numpy.where(batch.crashed, self.crashPenalty, 0.0)
@@ -0,0 +1,208 @@
+import json
+import os
+
+import numpy
+from numpy.lib.format import open_memmap
+
+# Experience datasets
+# a dataset is a directory of shards, each shard a set of .npy files holding the same number of transitions (one row each):
+#     observations  (n, observation size) int32 or float32, what SimulationGymnasiumAdapter observes before the action (see ObservationDtypes)
+#     actions       (n,) int8, the SimulationGymnasiumAdapter action taken
+#     rewards       (n,) float64, the reward given for it
+#     terminated    (n,) bool, whether the episode ended with it because the car crashed
+#     truncated     (n,) bool, whether the episode was cut short after it instead, the same distinction gymnasium makes
+# the shards are written through memory maps, so a shard never has to fit in memory, and manifest.json lists every shard and its length
+# a dataset can also be made of other datasets (for example one per worker process), listed under "parts" in the manifest
+
+Fields = {
+    "observations": numpy.int32,
+    "actions":      numpy.int8,
+    "rewards":      numpy.float64,
+    "terminated":   numpy.bool_,
+    "truncated":    numpy.bool_,
+}
+
+# dtype the observations are stored as for each of SimulationGymnasiumAdapter's observation modes
+ObservationDtypes = {
+    "multidiscrete": numpy.int32,
+    "float32":       numpy.float32,
+}
+
+ManifestName = "manifest.json"
+
+
+class ShardWriter:
+    """
+    Streams transitions into memory mapped shards of a fixed size, starting a new shard whenever the current one is full
+    """
+
+    def __init__(self, directory, observationSize: int, shardSize: int = 1000000, observationMode: str = "multidiscrete"):
+        self.directory = directory
+        self.observationSize = observationSize
+        self.shardSize = shardSize
+        self.observationMode = observationMode
+        self.fields = dict(Fields, observations=ObservationDtypes[observationMode])
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.shards = []   # (name, length) of every finished shard
+        self.arrays = None # memory maps of the shard being written
+        self.filled = 0    # rows written to it
+
+    def _openShard(self) -> None:
+        name = "shard-" + str(len(self.shards)).zfill(5)
+        os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+
+        self.arrays = {}
+        for field, dtype in self.fields.items():
+            shape = (self.shardSize, self.observationSize) if field == "observations" else (self.shardSize,)
+            self.arrays[field] = open_memmap(os.path.join(self.directory, name, field + ".npy"), mode="w+", dtype=dtype, shape=shape)
+
+        self.shardName = name
+        self.filled = 0
+
+    def _closeShard(self) -> None:
+        for array in self.arrays.values():
+            array.flush()
+
+        self.shards.append((self.shardName, self.filled))
+        self.arrays = None
+        self.writeManifest()
+
+    def append(self, observation, action: int, reward: float, terminated: bool, truncated: bool = False) -> None:
+        """
+        add one transition
+        """
+        if self.arrays is None:
+            self._openShard()
+
+        row = self.filled
+        self.arrays["observations"][row] = observation
+        self.arrays["actions"][row] = action
+        self.arrays["rewards"][row] = reward
+        self.arrays["terminated"][row] = terminated
+        self.arrays["truncated"][row] = truncated
+        self.filled += 1
+
+        if self.filled == self.shardSize:
+            self._closeShard()
+
+    def writeManifest(self) -> None:
+        manifest = {
+            "observationSize": self.observationSize,
+            "observationMode": self.observationMode,
+            "fields": {field: numpy.dtype(dtype).str for field, dtype in self.fields.items()},
+            "shards": [{"name": name, "length": length} for name, length in self.shards],
+        }
+
+        with open(os.path.join(self.directory, ManifestName), "w") as manifestFile:
+            json.dump(manifest, manifestFile, indent=2)
+
+    def close(self) -> None:
+        # the last shard is usually only partly full, the manifest says how much of it is used
+        if self.arrays is not None and self.filled > 0:
+            self._closeShard()
+
+        self.arrays = None
+        self.writeManifest()
+
+
+def writeParts(directory, parts: list) -> None:
+    """
+    make 'directory' a dataset made of the datasets in its subdirectories 'parts'
+    """
+    with open(os.path.join(directory, ManifestName), "w") as manifestFile:
+        json.dump({"parts": parts}, manifestFile, indent=2)
+
+
+class Dataset:
+    """
+    Reads a dataset written by ShardWriter without loading it into memory
+
+    every shard is opened as a read only memory map, and a minibatch only reads the rows it is made of
+    """
+
+    def __init__(self, directory):
+        self.shards = []
+
+        # the fields, observation size and observation mode it was written with, from the manifests
+        self.fields = None
+        self.observationSize = None
+        self.observationMode = None
+
+        self._load(directory)
+
+        self.lengths = numpy.array([len(shard["actions"]) for shard in self.shards], dtype=numpy.int64)
+        self.starts = numpy.concatenate(([0], numpy.cumsum(self.lengths)))
+
+    def _load(self, directory) -> None:
+        with open(os.path.join(directory, ManifestName)) as manifestFile:
+            manifest = json.load(manifestFile)
+
+        for part in manifest.get("parts", []):
+            self._load(os.path.join(directory, part))
+
+        if self.fields is None and "fields" in manifest:
+            self.fields = {field: numpy.dtype(dtype) for field, dtype in manifest["fields"].items()}
+            self.observationSize = manifest["observationSize"]
+            self.observationMode = manifest.get("observationMode", "multidiscrete")
+
+        for shard in manifest.get("shards", []):
+            arrays = {}
+            for field in self.fields:
+                array = numpy.load(os.path.join(directory, shard["name"], field + ".npy"), mmap_mode="r")
+                arrays[field] = array[:shard["length"]]
+
+            self.shards.append(arrays)
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def get(self, indices) -> dict:
+        """
+        returns the transitions at 'indices' (numbered across every shard) as a dict of arrays, in the order given
+        """
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+
+        # a negative index would be counted back from the start of the first shard, rather than the end of the dataset
+        if len(indices) > 0 and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError("indices must be from 0 to " + str(len(self) - 1) + ", the dataset has " + str(len(self)) + " transitions")
+
+        # read each shard's rows in order, which is kinder to the page cache, then put them back in the order asked for
+        order = numpy.argsort(indices, kind="stable")
+        sortedIndices = indices[order]
+        shardOf = numpy.searchsorted(self.starts, sortedIndices, side="right") - 1
+
+        batch = {}
+        for field in self.fields:
+            parts = []
+            for shard in numpy.unique(shardOf):
+                rows = sortedIndices[shardOf == shard] - self.starts[shard]
+                parts.append(self.shards[shard][field][rows])
+
+            if parts:
+                values = numpy.concatenate(parts)
+            else:
+                # nothing was asked for, which still has the shape of the field, the same as ShardWriter gives it
+                values = numpy.empty((0, self.observationSize) if field == "observations" else (0,), dtype=self.fields[field])
+
+            batch[field] = numpy.empty_like(values)
+            batch[field][order] = values
+
+        return batch
+
+    def batches(self, batchSize: int, shuffle: bool = True, seed=None, dropLast: bool = False):
+        """
+        yields every transition once, in minibatches of 'batchSize', see get
+        """
+        if shuffle:
+            indices = numpy.random.default_rng(seed).permutation(len(self))
+        else:
+            indices = numpy.arange(len(self))
+
+        for start in range(0, len(indices), batchSize):
+            chunk = indices[start:start + batchSize]
+            if dropLast and len(chunk) < batchSize:
+                break
+
+            yield self.get(chunk)
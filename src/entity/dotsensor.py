@@ -1,40 +1,204 @@
+import entity.kernels
 import entity.obstacle
 
 from math import cos, sin, sqrt
 
+import numpy
+
+class DotSensorArray:
+    """
+    Every dot sensor attached to a vehicle, stored as arrays so that all of them can be aimed and updated in one go
+
+    the values of each sensor are available through the DotSensor views in self.views
+    """
+    def __init__(self, offsetAngles: list[float], length: float = 250.0):
+        self.length = length             # length of the rays from the centre of the car
+        self.lengthSquared = length ** 2 # used in calculations
+
+        self.offsetAngle = numpy.array(offsetAngles, dtype=numpy.float64) # offset of each ray from the vehicle direction
+        self.facingDirection = numpy.zeros(len(offsetAngles))              # direction each ray is facing
+        self.farCornerX = numpy.zeros(len(offsetAngles))                   # the relative coordinates of the far corner of each ray
+        self.farCornerY = numpy.zeros(len(offsetAngles))
+        self.d_r_2 = numpy.zeros(len(offsetAngles))                        # used in calculations
+        self._detect = numpy.zeros(len(offsetAngles))                      # value of detection of each ray to feed into the AI, see detect
+
+        # when the sensors are only worked out when something reads them (see SingleSimulation.lazySensors),
+        # stale is set instead of updating them, and refresher is called to bring them up to date the next time they are read
+        self.stale = False
+        self.refresher = None
+
+        self.views: list[DotSensor] = []
+        for index in range(len(offsetAngles)):
+            view = DotSensor.__new__(DotSensor)
+            view._bind(self, index)
+            self.views.append(view)
+
+    def __len__(self) -> int:
+        return len(self.offsetAngle)
+
+    @property
+    def detect(self) -> numpy.ndarray:
+        self.refresh()
+        return self._detect
+
+    def refresh(self) -> None:
+        """
+        bring the sensors up to date if they are stale
+        """
+        if self.stale:
+            self.stale = False
+            self.refresher()
+
+    def copyFrom(self, other: "DotSensorArray") -> None:
+        """
+        make every sensor the same as the matching one in 'other', which must have the same number of sensors
+
+        if 'other' is stale and these sensors can refresh themselves, they are left stale too instead of being worked out now
+        """
+        if other.stale and self.refresher is None:
+            other.refresh()
+
+        self.stale = other.stale
+        self.length = other.length
+        self.lengthSquared = other.lengthSquared
+
+        numpy.copyto(self.offsetAngle, other.offsetAngle)
+        numpy.copyto(self.facingDirection, other.facingDirection)
+        numpy.copyto(self.farCornerX, other.farCornerX)
+        numpy.copyto(self.farCornerY, other.farCornerY)
+        numpy.copyto(self.d_r_2, other.d_r_2)
+        numpy.copyto(self._detect, other._detect)
+
+    def faceDirection(self, direction: float) -> None:
+        """
+        update the direction of every sensor and recalculate the far corners, see DotSensor.faceDirection
+        """
+        numpy.add(self.offsetAngle, direction, out=self.facingDirection)
+
+        numpy.multiply(numpy.sin(self.facingDirection), self.length, out=self.farCornerX)
+        numpy.multiply(numpy.cos(self.facingDirection), -self.length, out=self.farCornerY)
+
+        self.d_r_2[:] = (self.farCornerX ** 2) + (self.farCornerY ** 2)
+
+    def updateDetect(self, relX: numpy.ndarray, relY: numpy.ndarray) -> None:
+        """
+        finds the nearest detected obstacle for every sensor at once, given the positions of all of the obstacles
+
+        this gives the same result as calling DotSensor.updateDetect on each sensor, but every ray is checked against every obstacle in one pass
+        """
+        if entity.kernels.backend == "numba":
+            entity.kernels.updateDetect(self.farCornerX, self.farCornerY, self.d_r_2, self.length, self.lengthSquared,
+                                        entity.obstacle.Obstacle.radius() ** 2, relX, relY, self._detect)
+            return
+
+        distanceSquared = (relX ** 2) + (relY ** 2)
+
+        # anything further away than the length of the rays can never be detected, so only look at the obstacles that are in range
+        inRange = numpy.flatnonzero(distanceSquared <= self.lengthSquared)
+        if len(inRange) == 0:
+            self._detect[:] = 0.0
+            return
+
+        relX = relX[inRange]
+        relY = relY[inRange]
+        distanceSquared = distanceSquared[inRange]
+
+        # one row per sensor, one column per obstacle
+        nearestDistanceSquared = DotSensorArray.nearestDetected(self.farCornerX[:, None], self.farCornerY[:, None], self.d_r_2[:, None], self.lengthSquared, relX, relY, distanceSquared)
+
+        # infinity turns into a negative detect, which gets clamped to 0, meaning no collision
+        numpy.clip(1.0 - (numpy.sqrt(nearestDistanceSquared) / self.length), 0.0, 1.0, out=self._detect)
+
+    @staticmethod
+    def nearestDetected(farCornerX, farCornerY, d_r_2, lengthSquared: float, relX, relY, distanceSquared) -> numpy.ndarray:
+        """
+        returns the squared distance to the nearest obstacle detected by each ray, or infinity when a ray detects nothing
+
+        the ray arrays and obstacle arrays are broadcast against each other, with the obstacles along the last axis,
+        so this works for one car's sensors or for a whole batch of cars at once
+        """
+        # see DotSensor.updateDetect for where this comes from
+        D = (relY * farCornerX) - (relX * farCornerY)
+        constantPart = (entity.obstacle.Obstacle.radius() ** 2) * d_r_2
+
+        detected = ((constantPart - (D * D)) > 0) & (distanceSquared <= lengthSquared) & (((((farCornerX - relX) ** 2) + ((farCornerY - relY) ** 2)) * 1.1) < lengthSquared)
+
+        return numpy.where(detected, distanceSquared, float("Infinity")).min(axis=-1)
+
+
 class DotSensor:
     """
     This class attempts to detect dots along a line from the centre point of the car up to a maximum given length
 
     self.detect is a value representing how close the nearest obstacle along the line is to the base of the sensor
     when it is 0 there is no obstacle detected, when it is 1, the obstacle is exactly on top of it, with linear interpolation in between
+
+    this is a view onto one slot of a DotSensorArray, a sensor created on its own gets an array with just itself in it
     """
     def __init__(self, length: float = 250.0):
-        self.facingDirection = 0.0       # direction the vehicle is facing
-        self.offsetAngle = 0.0           # offset of the ray from the vehicle direction
-        self.length = length             # length of the ray from the centre of the car
-        self.lengthSquared = length ** 2 # used in calculations
-        self.detect = 0.0                # value of detection to feed into the AI
-        self.farCorner = (0.0, 0.0)      # the relative coordinates of the far corner of the ray
-        self.d_r_2 = 0.0                 # also used in calculations
+        sensorArray = DotSensorArray([0.0], length)
+        sensorArray.views[0] = self
+
+        self._bind(sensorArray, 0)
+
+    def _bind(self, sensorArray: DotSensorArray, index: int) -> None:
+        self.sensorArray = sensorArray
+        self.index = index
+
+    @property
+    def length(self) -> float:
+        return self.sensorArray.length
+
+    @property
+    def lengthSquared(self) -> float:
+        return self.sensorArray.lengthSquared
+
+    @property
+    def offsetAngle(self) -> float:
+        return float(self.sensorArray.offsetAngle[self.index])
+
+    @property
+    def facingDirection(self) -> float:
+        self.sensorArray.refresh()
+        return float(self.sensorArray.facingDirection[self.index])
+
+    @property
+    def farCorner(self) -> tuple:
+        self.sensorArray.refresh()
+        return (float(self.sensorArray.farCornerX[self.index]), float(self.sensorArray.farCornerY[self.index]))
+
+    @property
+    def d_r_2(self) -> float:
+        self.sensorArray.refresh()
+        return float(self.sensorArray.d_r_2[self.index])
+
+    @property
+    def detect(self) -> float:
+        return float(self.sensorArray.detect[self.index])
+
+    @detect.setter
+    def detect(self, value: float) -> None:
+        self.sensorArray.detect[self.index] = value
 
     def faceDirection(self, direction: float):
         """
         update the direction of the sensor and recalculate the far corner
         """
-        self.facingDirection = direction + self.offsetAngle
+        facingDirection = direction + self.offsetAngle
 
-        cornerX = sin(self.facingDirection) * self.length
-        cornerY = -(cos(self.facingDirection) * self.length)
+        cornerX = sin(facingDirection) * self.length
+        cornerY = -(cos(facingDirection) * self.length)
 
-        self.farCorner = (cornerX, cornerY)
-        self.d_r_2 = ((self.farCorner[0] ** 2) + (self.farCorner[1] ** 2))
+        self.sensorArray.facingDirection[self.index] = facingDirection
+        self.sensorArray.farCornerX[self.index] = cornerX
+        self.sensorArray.farCornerY[self.index] = cornerY
+        self.sensorArray.d_r_2[self.index] = ((cornerX ** 2) + (cornerY ** 2))
 
     def setOffset(self, offsetAngle):
         """
         set the offset to use from the direction given to the sensor
         """
-        self.offsetAngle = offsetAngle
+        self.sensorArray.offsetAngle[self.index] = offsetAngle
 
     def updateDetect(self, obstacleList: list[entity.obstacle.Obstacle]):
         """
@@ -44,11 +208,16 @@ class DotSensor:
         nearestDistanceSquaredSoFar = float("Infinity")
         radiusSquared = (obstacleList[0].radius() ** 2)
 
+        farCorner = self.farCorner
+        lengthSquared = self.lengthSquared
         constantPart = radiusSquared * self.d_r_2
 
         for obstacle in obstacleList:
+            relX = obstacle.relX
+            relY = obstacle.relY
+
             # first check to see if the obstacle is in range
-            distanceSquared = ((obstacle.relX ** 2) + (obstacle.relY ** 2))
+            distanceSquared = ((relX ** 2) + (relY ** 2))
             if (distanceSquared < nearestDistanceSquaredSoFar):
                 # closer than what is currently closest, so check if it collides
                 # mathematical theory taken from https://mathworld.wolfram.com/Circle-LineIntersection.html
@@ -56,14 +225,14 @@ class DotSensor:
 
                 # see Vehicle.collidedWith, this is an optimised version of that
 
-                D = (obstacle.relY * self.farCorner[0]) - (obstacle.relX * self.farCorner[1])
+                D = (relY * farCorner[0]) - (relX * farCorner[1])
 
                 # (delta > 0) means collision
                 #    constantPart - (D * D) == delta
-                if ((constantPart - (D * D)) > 0) and (distanceSquared <= self.lengthSquared):
+                if ((constantPart - (D * D)) > 0) and (distanceSquared <= lengthSquared):
                     # closer to the centre than any previous, so now check distance to far end with a small buffer (10%)
                     # this makes sure the direction is correct
-                    if ((((self.farCorner[0] - obstacle.relX) ** 2) + ((self.farCorner[1] - obstacle.relY) ** 2)) * 1.1) < self.lengthSquared:
+                    if ((((farCorner[0] - relX) ** 2) + ((farCorner[1] - relY) ** 2)) * 1.1) < lengthSquared:
                         # we have a new closest colliding point!
                         nearestDistanceSquaredSoFar = distanceSquared
 
@@ -0,0 +1,181 @@
+import math
+import os
+import warnings
+
+import numpy
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Compiled kernels
+# loop versions of the array calculations done every tick (Vehicle.collisionKernel, DotSensorArray.updateDetect, ObstacleStore.move and
+# ObstacleStore.respawnMask), for numba to compile to machine code
+# each one does the same floating point operations in the same order as the numpy version, so the results are identical,
+# but without the overhead of a numpy call for every operation, which is most of what a tick costs with only a few obstacles
+#
+# numba is optional, without it these are left as plain python (far too slow to use) and the numpy versions are always used
+# the compiled code is cached on disk, so only the first run after this file changes has to wait for it to compile
+#
+# the backend can be chosen with setBackend, or with the COLLISION_AVOIDANCE_BACKEND environment variable before anything is imported
+
+Backends = ("numpy", "numba")
+
+# the backend in use, checked by each of the classes whose calculations are in here
+backend = "numpy"
+
+
+def available() -> bool:
+    """
+    whether the numba backend can be used
+    """
+    return numba is not None
+
+
+def setBackend(name: str) -> None:
+    """
+    use the 'name' backend for every simulation from now on
+    the environment variable is set as well, so worker processes started after this use the same backend
+    """
+    global backend
+
+    if name not in Backends:
+        raise ValueError("unknown backend " + str(name) + ", choose from " + ", ".join(Backends))
+
+    if name == "numba" and numba is None:
+        raise ImportError("the numba backend needs numba to be installed")
+
+    backend = name
+    os.environ["COLLISION_AVOIDANCE_BACKEND"] = name
+
+
+def _jit(function):
+    if numba is None:
+        return function
+
+    return numba.njit(cache=True)(function)
+
+
+@_jit
+def collidingIndices(topLeftX, topLeftY, topRightX, topRightY, bottomLeftX, bottomLeftY, bottomRightX, bottomRightY,
+                     r, rangeSquared, relX, relY):
+    """
+    see Vehicle.collidingIndices
+    """
+    found = numpy.empty(len(relX), dtype=numpy.int64)
+    count = 0
+
+    for i in range(len(relX)):
+        x = relX[i]
+        y = relY[i]
+
+        # written this way round so an obstacle at infinity is skipped
+        if not ((x * x) + (y * y)) <= rangeSquared:
+            continue
+
+        # front vector
+        d_x = (topRightX - x) - (topLeftX - x)
+        d_y = (topRightY - y) - (topLeftY - y)
+
+        d_r = math.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((topLeftX - x) * (topRightY - y)) - ((topRightX - x) * (topLeftY - y))
+        collidesHorizontal = ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # bottom vector
+        d_x = (bottomLeftX - x) - (bottomRightX - x)
+        d_y = (bottomLeftY - y) - (bottomRightY - y)
+
+        d_r = math.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((bottomRightX - x) * (bottomLeftY - y)) - ((bottomLeftX - x) * (bottomRightY - y))
+        collidesHorizontal = collidesHorizontal or (((r * r) * (d_r * d_r) - (D * D)) > 0)
+
+        if not collidesHorizontal:
+            continue
+
+        # right vector
+        d_x = (bottomRightX - x) - (topRightX - x)
+        d_y = (bottomRightY - y) - (topRightY - y)
+
+        d_r = math.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((topRightX - x) * (bottomRightY - y)) - ((bottomRightX - x) * (topRightY - y))
+        collidesVertical = ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # left vector
+        d_x = (topLeftX - x) - (bottomLeftX - x)
+        d_y = (topLeftY - y) - (bottomLeftY - y)
+
+        d_r = math.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((bottomLeftX - x) * (topLeftY - y)) - ((topLeftX - x) * (bottomLeftY - y))
+        collidesVertical = collidesVertical or (((r * r) * (d_r * d_r) - (D * D)) > 0)
+
+        if collidesVertical:
+            found[count] = i
+            count += 1
+
+    return found[:count]
+
+
+@_jit
+def updateDetect(farCornerX, farCornerY, d_r_2, length, lengthSquared, radiusSquared, relX, relY, detect):
+    """
+    see DotSensorArray.updateDetect, the result is written into 'detect'
+    """
+    for sensor in range(len(detect)):
+        nearestDistanceSquared = math.inf
+        constantPart = radiusSquared * d_r_2[sensor]
+
+        for i in range(len(relX)):
+            x = relX[i]
+            y = relY[i]
+
+            distanceSquared = (x * x) + (y * y)
+            if not distanceSquared <= lengthSquared:
+                continue
+
+            D = (y * farCornerX[sensor]) - (x * farCornerY[sensor])
+            if not (constantPart - (D * D)) > 0:
+                continue
+
+            if ((((farCornerX[sensor] - x) * (farCornerX[sensor] - x)) + ((farCornerY[sensor] - y) * (farCornerY[sensor] - y))) * 1.1) < lengthSquared:
+                if distanceSquared < nearestDistanceSquared:
+                    nearestDistanceSquared = distanceSquared
+
+        if nearestDistanceSquared == math.inf:
+            detect[sensor] = 0.0
+        else:
+            detect[sensor] = min(1.0, max(0.0, 1.0 - (math.sqrt(nearestDistanceSquared) / length)))
+
+
+@_jit
+def move(relX, relY, deltaX, deltaY):
+    """
+    see ObstacleStore.move, deltaX is subtracted from every x position and deltaY added to every y position
+    """
+    for i in range(len(relX)):
+        relX[i] -= deltaX
+        relY[i] += deltaY
+
+
+@_jit
+def respawnIndices(relX, relY, sandboxSize):
+    """
+    see ObstacleStore.respawnIndices
+    """
+    found = numpy.empty(len(relX), dtype=numpy.int64)
+    count = 0
+
+    for i in range(len(relX)):
+        if abs(relX[i]) > sandboxSize or abs(relY[i]) > sandboxSize or relX[i] == math.inf:
+            found[count] = i
+            count += 1
+
+    return found[:count]
+
+
+# pick the backend, numba if it is installed unless told otherwise
+_requested = os.environ.get("COLLISION_AVOIDANCE_BACKEND", "numba" if available() else "numpy")
+try:
+    setBackend(_requested)
+except (ValueError, ImportError) as error:
+    warnings.warn(str(error) + ", using the numpy backend instead")
@@ -1,5 +1,149 @@
 from math import sin, cos, pi
-import random
+
+import numpy
+
+import entity.kernels
+
+# used to respawn obstacles that are not given a generator of their own, see Obstacle.respawn
+_defaultRng = numpy.random.default_rng()
+
+class ObstacleStore:
+    """
+    Structure-of-arrays storage for every obstacle in a simulation
+
+    the positions and collision flags of the obstacles are kept in contiguous numpy arrays, so that the per tick work
+    (moving, checking for respawns and checking for collisions) can be done for every obstacle at once instead of one at a time
+    """
+    def __init__(self, sandboxSize: float = 2000.0, minimumDistance: float = 500.0, capacity: int = 16) -> None:
+        self.sandboxSize = sandboxSize
+        self.minSpawnDistance = minimumDistance
+
+        # only the first self.count entries of each array are in use, the rest is spare capacity
+        self.count = 0
+        self._relX = numpy.zeros(capacity, dtype=numpy.float64)
+        self._relY = numpy.zeros(capacity, dtype=numpy.float64)
+        self._colliding = numpy.zeros(capacity, dtype=numpy.bool_)
+
+        # views handed out for each slot, see Obstacle
+        self.views: list[Obstacle] = []
+
+    @property
+    def relX(self) -> numpy.ndarray:
+        return self._relX[:self.count]
+
+    @property
+    def relY(self) -> numpy.ndarray:
+        return self._relY[:self.count]
+
+    @property
+    def colliding(self) -> numpy.ndarray:
+        return self._colliding[:self.count]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, relative_X: float, relative_Y: float) -> "Obstacle":
+        """
+        add a new obstacle to the end of the store and return the view for it
+        """
+        if self.count == len(self._relX):
+            self._grow(max(16, 2 * self.count))
+
+        self._relX[self.count] = relative_X
+        self._relY[self.count] = relative_Y
+        self._colliding[self.count] = False
+        self.count += 1
+
+        view = Obstacle.__new__(Obstacle)
+        view._bind(self, self.count - 1)
+        self.views.append(view)
+
+        return view
+
+    def copy(self) -> "ObstacleStore":
+        """
+        returns a new store holding the same obstacles as this one
+        """
+        returnStore = ObstacleStore(self.sandboxSize, self.minSpawnDistance, len(self._relX))
+        returnStore.count = self.count
+        returnStore._relX[:] = self._relX
+        returnStore._relY[:] = self._relY
+        returnStore._colliding[:] = self._colliding
+
+        for obstacle in self.views:
+            view = Obstacle.__new__(Obstacle)
+            view._bind(returnStore, obstacle.index)
+            view.screenSpaceX = obstacle.screenSpaceX
+            view.screenSpaceY = obstacle.screenSpaceY
+            returnStore.views.append(view)
+
+        return returnStore
+
+    def copyFrom(self, other: "ObstacleStore") -> None:
+        """
+        make this store hold the same obstacles as 'other', reusing the arrays and views already allocated where possible
+        """
+        self.sandboxSize = other.sandboxSize
+        self.minSpawnDistance = other.minSpawnDistance
+
+        self.resize(other.count)
+        self._relX[:self.count] = other.relX
+        self._relY[:self.count] = other.relY
+        self._colliding[:self.count] = other.colliding
+
+    def resize(self, count: int) -> None:
+        """
+        change how many obstacles are in use, new obstacles are left with whatever values were in their slot
+        """
+        if count > len(self._relX):
+            self._grow(max(count, 2 * len(self._relX)))
+
+        self.count = count
+
+        while len(self.views) < count:
+            view = Obstacle.__new__(Obstacle)
+            view._bind(self, len(self.views))
+            self.views.append(view)
+
+        del self.views[count:]
+
+    def _grow(self, capacity: int) -> None:
+        """
+        reallocate the arrays with a larger capacity, keeping the values currently in use
+        """
+        for name in ("_relX", "_relY", "_colliding"):
+            old = getattr(self, name)
+            new = numpy.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def move(self, speed: float, direction: float) -> None:
+        """
+        move every obstacle with the speed and direction of the car given to it, see Obstacle.move
+        """
+        if entity.kernels.backend == "numba":
+            entity.kernels.move(self.relX, self.relY, speed * sin(direction), speed * cos(direction))
+            return
+
+        self.relX[:] -= speed * sin(direction)
+        self.relY[:] += speed * cos(direction)
+
+    def respawnMask(self) -> numpy.ndarray:
+        """
+        returns a boolean array of which obstacles have fallen outside of the sandbox, or have x position infinity, signalling that they need a respawn
+        """
+        relX = self.relX
+        return (numpy.abs(relX) > self.sandboxSize) | (numpy.abs(self.relY) > self.sandboxSize) | (relX == float("Infinity"))
+
+    def respawnIndices(self) -> numpy.ndarray:
+        """
+        returns the indices of the obstacles that need a respawn, in order, see respawnMask
+        """
+        if entity.kernels.backend == "numba":
+            return entity.kernels.respawnIndices(self.relX, self.relY, self.sandboxSize)
+
+        return numpy.flatnonzero(self.respawnMask())
+
 
 class Obstacle:
     @staticmethod
@@ -11,6 +155,8 @@ class Obstacle:
 
     """
     An obstacle that has to be avoided by the vehicle that is being driven
+
+    this is a view onto one slot of an ObstacleStore, an obstacle created on its own gets a store with just itself in it
     """
     def __init__(self, relative_X: float, relative_Y: float, sandboxSize: float = 2000.0, minimumDistance: float = 500.0) -> None:
         """
@@ -18,16 +164,52 @@ class Obstacle:
 
         if relative_X is Infinity then this signals to the obstacle that it must respawn itself
         """
-        self.relX = relative_X
-        self.relY = relative_Y
+        store = ObstacleStore(sandboxSize, minimumDistance, 1)
+        store.count = 1
+        store._relX[0] = relative_X
+        store._relY[0] = relative_Y
+        store.views.append(self)
 
-        self.sandboxSize = sandboxSize
-        self.minSpawnDistance = minimumDistance
+        self._bind(store, 0)
+
+    def _bind(self, store: ObstacleStore, index: int) -> None:
+        self.store = store
+        self.index = index
 
         self.screenSpaceX = 0.0
         self.screenSpaceY = 0.0
 
-        self.collidingWithCar = False
+    @property
+    def relX(self) -> float:
+        return float(self.store._relX[self.index])
+
+    @relX.setter
+    def relX(self, value: float) -> None:
+        self.store._relX[self.index] = value
+
+    @property
+    def relY(self) -> float:
+        return float(self.store._relY[self.index])
+
+    @relY.setter
+    def relY(self, value: float) -> None:
+        self.store._relY[self.index] = value
+
+    @property
+    def collidingWithCar(self) -> bool:
+        return bool(self.store._colliding[self.index])
+
+    @collidingWithCar.setter
+    def collidingWithCar(self, value: bool) -> None:
+        self.store._colliding[self.index] = value
+
+    @property
+    def sandboxSize(self) -> float:
+        return self.store.sandboxSize
+
+    @property
+    def minSpawnDistance(self) -> float:
+        return self.store.minSpawnDistance
 
     def makeScreenSpacePoints(self, screen_X, screen_Y) -> None:
         """
@@ -43,27 +225,34 @@ class Obstacle:
         self.relX -= speed * sin(direction)
         self.relY += speed * cos(direction)
 
-    def respawn(self, vehicleDirection: float, position=None) -> None:
+    def respawn(self, vehicleDirection: float, position=None, rng: numpy.random.Generator = None) -> None:
         """
         respawn the obstacle either at a random point in the general direction of the car or at a given position
+        the random point is drawn from 'rng', which should be the generator of the simulation the obstacle belongs to
         """
         if position is not None:
             self.relX = position[0]
             self.relY = position[1]
             return
 
+        if rng is None:
+            rng = _defaultRng
+
+        def randint(low, high):
+            return int(rng.integers(low, high, endpoint=True))
+
         if (vehicleDirection > pi / 4) and (vehicleDirection < ((3 / 4) * pi)):
-            self.relX = random.randint(round(self.minSpawnDistance), round(self.sandboxSize))
-            self.relY = random.randint(-round(self.sandboxSize), round(self.sandboxSize))
+            self.relX = randint(round(self.minSpawnDistance), round(self.sandboxSize))
+            self.relY = randint(-round(self.sandboxSize), round(self.sandboxSize))
 
         elif (vehicleDirection > pi / 4) and  vehicleDirection < ((5 / 4) * pi):
-            self.relY = random.randint(round(self.minSpawnDistance), round(self.sandboxSize))
-            self.relX = random.randint(-round(self.sandboxSize), round(self.sandboxSize))
+            self.relY = randint(round(self.minSpawnDistance), round(self.sandboxSize))
+            self.relX = randint(-round(self.sandboxSize), round(self.sandboxSize))
 
         elif (vehicleDirection > pi / 4) and  vehicleDirection < ((7 / 4) * pi):
-            self.relX = -random.randint(round(self.minSpawnDistance), round(self.sandboxSize))
-            self.relY = random.randint(-round(self.sandboxSize), round(self.sandboxSize))
+            self.relX = -randint(round(self.minSpawnDistance), round(self.sandboxSize))
+            self.relY = randint(-round(self.sandboxSize), round(self.sandboxSize))
 
         else:
-            self.relY = -random.randint(round(self.minSpawnDistance), round(self.sandboxSize))
-            self.relX = random.randint(-round(self.sandboxSize), round(self.sandboxSize))
+            self.relY = -randint(round(self.minSpawnDistance), round(self.sandboxSize))
+            self.relX = randint(-round(self.sandboxSize), round(self.sandboxSize))
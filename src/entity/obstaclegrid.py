@@ -0,0 +1,106 @@
+import entity.obstacle
+
+from math import cos, floor, isfinite, sin
+
+import numpy
+
+class ObstacleGrid:
+    """
+    A uniform grid over the obstacles in an ObstacleStore, so that only the obstacles near the car have to be checked
+
+    the cells are fixed in the world instead of being relative to the car, so when the obstacles all move with the car
+    none of them change cell, only self.originX/self.originY (how far the car has travelled) changes
+    an obstacle only moves to a different cell when it respawns, which is when update has to be called for it
+
+    the positions in the store are still what collisions and sensors are checked against, the grid only decides which obstacles to check
+    """
+    def __init__(self, store: entity.obstacle.ObstacleStore, cellSize: float = 250.0) -> None:
+        self.store = store
+        self.cellSize = cellSize
+
+        # world position of the car, an obstacle's world position is its relative position plus this
+        self.originX = 0.0
+        self.originY = 0.0
+
+        self.cells: dict[tuple, set] = {} # cell -> indices of the obstacles in it
+        self.cellOf: list = []            # index -> the cell that obstacle is in, or None if it has no position yet
+
+        self.rebuild()
+
+    def _cellFor(self, relX: float, relY: float):
+        if not (isfinite(relX) and isfinite(relY)):
+            return None
+
+        return (floor((relX + self.originX) / self.cellSize), floor((relY + self.originY) / self.cellSize))
+
+    def rebuild(self) -> None:
+        """
+        put every obstacle in the store back into the grid from scratch
+        """
+        self.cells = {}
+        self.cellOf = []
+
+        for index in range(len(self.store)):
+            self.update(index)
+
+    def update(self, index: int) -> None:
+        """
+        move an obstacle to the right cell after it has been added to the store or respawned
+        """
+        cell = self._cellFor(float(self.store._relX[index]), float(self.store._relY[index]))
+
+        if index < len(self.cellOf):
+            oldCell = self.cellOf[index]
+            if oldCell == cell:
+                return
+
+            if oldCell is not None:
+                self.cells[oldCell].discard(index)
+                if not self.cells[oldCell]:
+                    del self.cells[oldCell]
+
+            self.cellOf[index] = cell
+        else:
+            self.cellOf.extend([None] * (index + 1 - len(self.cellOf)))
+            self.cellOf[index] = cell
+
+        if cell is not None:
+            self.cells.setdefault(cell, set()).add(index)
+
+    def move(self, speed: float, direction: float) -> None:
+        """
+        the car moved, see ObstacleStore.move
+        """
+        self.originX += speed * sin(direction)
+        self.originY -= speed * cos(direction)
+
+    def query(self, radius: float) -> numpy.ndarray:
+        """
+        returns the indices of every obstacle that could be within radius of the car, and possibly some further away
+        """
+        # one pixel of slack, in case the relative and world positions have rounded differently
+        radius += 1.0
+
+        minX = floor((self.originX - radius) / self.cellSize)
+        maxX = floor((self.originX + radius) / self.cellSize)
+        minY = floor((self.originY - radius) / self.cellSize)
+        maxY = floor((self.originY + radius) / self.cellSize)
+
+        found = []
+        for cellX in range(minX, maxX + 1):
+            for cellY in range(minY, maxY + 1):
+                cell = self.cells.get((cellX, cellY))
+                if cell:
+                    found.extend(cell)
+
+        return numpy.array(found, dtype=numpy.intp)
+
+    def copyFrom(self, other: "ObstacleGrid") -> None:
+        """
+        make this grid the same as 'other', which must be the grid of a store holding the same obstacles as this one's
+        """
+        self.cellSize = other.cellSize
+        self.originX = other.originX
+        self.originY = other.originY
+        self.cells = {cell: set(indices) for cell, indices in other.cells.items()}
+        self.cellOf = list(other.cellOf)
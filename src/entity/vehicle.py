@@ -1,8 +1,11 @@
 import entity.obstacle
 import entity.dotsensor
+import entity.kernels
 
 from math import cos, sin, sqrt, radians
 
+import numpy
+
 class Vehicle:
     # every value in this list is an offset from forwards that a detection ray will be spawned in
     dotSensorAngleList = [-90, -70, -50, -30, -15, 0, 15, 30, 50, 70, 90]
@@ -33,24 +36,40 @@ class Vehicle:
         self.screenSpaceBottomRight: tuple = (0.0, 0.0)
         self.screenSpaceCentre:      tuple = (0.0, 0.0)
 
-        self.dotSensorList = []
-        for angle in Vehicle.dotSensorAngleList:
-            self.dotSensorList.append(entity.dotsensor.DotSensor())
-            self.dotSensorList[-1].setOffset(radians(angle))
+        # the sensors are all updated together, self.dotSensorList gives a view of each one
+        self.sensors = entity.dotsensor.DotSensorArray([radians(angle) for angle in Vehicle.dotSensorAngleList])
+        self.dotSensorList = self.sensors.views
 
-    def rotatePoints(self) -> None:
+    def copyFrom(self, other: "Vehicle") -> None:
+        """
+        make this vehicle the same as 'other', including its sensors, without creating any new objects
+        """
+        self.speed     = other.speed
+        self.direction = other.direction
+        self.maxSpeed  = other.maxSpeed
+
+        self.topLeft     = other.topLeft
+        self.topRight    = other.topRight
+        self.bottomLeft  = other.bottomLeft
+        self.bottomRight = other.bottomRight
+
+        # the screen space points are not copied, they are only used for drawing and makeScreenSpacePoints is called before every draw
+
+        self.sensors.copyFrom(other.sensors)
+
+    def rotatePoints(self, aimSensors: bool = True) -> None:
         """
         Calculate the position of the points on the rectangle representing the car, given the rotation that it currently has
 
-        also update the angle and positioning of any sensors attached to the car
+        also update the angle and positioning of any sensors attached to the car, unless aimSensors is False
         """
         self.topLeft     = (((self.topLeftDatum[0]     * cos(self.direction)) - (self.topLeftDatum[1]     * sin(self.direction))), ((self.topLeftDatum[0]     * sin(self.direction)) + (self.topLeftDatum[1]     * cos(self.direction))))
         self.topRight    = (((self.topRightDatum[0]    * cos(self.direction)) - (self.topRightDatum[1]    * sin(self.direction))), ((self.topRightDatum[0]    * sin(self.direction)) + (self.topRightDatum[1]    * cos(self.direction))))
         self.bottomLeft  = (((self.bottomLeftDatum[0]  * cos(self.direction)) - (self.bottomLeftDatum[1]  * sin(self.direction))), ((self.bottomLeftDatum[0]  * sin(self.direction)) + (self.bottomLeftDatum[1]  * cos(self.direction))))
         self.bottomRight = (((self.bottomRightDatum[0] * cos(self.direction)) - (self.bottomRightDatum[1] * sin(self.direction))), ((self.bottomRightDatum[0] * sin(self.direction)) + (self.bottomRightDatum[1] * cos(self.direction))))
 
-        for sensor in self.dotSensorList:
-            sensor.faceDirection(self.direction)
+        if aimSensors:
+            self.sensors.faceDirection(self.direction)
 
     def makeScreenSpacePoints(self, screen_X, screen_Y) -> None:
         """
@@ -150,6 +169,88 @@ class Vehicle:
 
         return False
 
+    def collisionMask(self, relX: numpy.ndarray, relY: numpy.ndarray) -> numpy.ndarray:
+        """
+        checks every obstacle position given in the arrays for collision with the vehicle at once
+
+        this is the same calculation as Vehicle.collidedWith, done on whole arrays of obstacles, and returns a boolean array of which ones collide
+        """
+        return Vehicle.collisionKernel(self.topLeft, self.topRight, self.bottomLeft, self.bottomRight, relX, relY)
+
+    def collidingIndices(self, relX: numpy.ndarray, relY: numpy.ndarray) -> numpy.ndarray:
+        """
+        returns the indices of the obstacle positions given in the arrays that collide with the vehicle
+
+        only the obstacles within collisionRange of the car can, and most of the time there are none, so the full check is only run on those
+        """
+        if entity.kernels.backend == "numba":
+            return entity.kernels.collidingIndices(self.topLeft[0], self.topLeft[1], self.topRight[0], self.topRight[1],
+                                                   self.bottomLeft[0], self.bottomLeft[1], self.bottomRight[0], self.bottomRight[1],
+                                                   entity.obstacle.Obstacle.radius(), Vehicle.collisionRange() ** 2, relX, relY)
+
+        close = numpy.flatnonzero(((relX * relX) + (relY * relY)) <= (Vehicle.collisionRange() ** 2))
+        if len(close) == 0:
+            return close
+
+        return close[self.collisionMask(relX[close], relY[close])]
+
+    @staticmethod
+    def collisionKernel(topLeft: tuple, topRight: tuple, bottomLeft: tuple, bottomRight: tuple, relX: numpy.ndarray, relY: numpy.ndarray) -> numpy.ndarray:
+        """
+        the array version of Vehicle.collidedWith, for corners of a car at any rotation
+
+        the corner coordinates can be plain numbers or arrays, as long as they broadcast against relX and relY
+        so this can check many cars against their own obstacles at once
+        """
+        r = entity.obstacle.Obstacle.radius()
+
+        # front vector
+        d_x = (topRight[0] - relX) - (topLeft[0] - relX)
+        d_y = (topRight[1] - relY) - (topLeft[1] - relY)
+
+        d_r = numpy.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((topLeft[0] - relX) * (topRight[1] - relY)) - ((topRight[0] - relX) * (topLeft[1] - relY))
+        collidesHorizontal = ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # bottom vector
+        d_x = (bottomLeft[0] - relX) - (bottomRight[0] - relX)
+        d_y = (bottomLeft[1] - relY) - (bottomRight[1] - relY)
+
+        d_r = numpy.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((bottomRight[0] - relX) * (bottomLeft[1] - relY)) - ((bottomLeft[0] - relX) * (bottomRight[1] - relY))
+        collidesHorizontal |= ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # same early out as Vehicle.collidedWith, most of the time nothing is near the front or back of the car
+        if not collidesHorizontal.any():
+            return collidesHorizontal
+
+        # right vector
+        d_x = (bottomRight[0] - relX) - (topRight[0] - relX)
+        d_y = (bottomRight[1] - relY) - (topRight[1] - relY)
+
+        d_r = numpy.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((topRight[0] - relX) * (bottomRight[1] - relY)) - ((bottomRight[0] - relX) * (topRight[1] - relY))
+        collidesVertical = ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # left vector
+        d_x = (topLeft[0] - relX) - (bottomLeft[0] - relX)
+        d_y = (topLeft[1] - relY) - (bottomLeft[1] - relY)
+
+        d_r = numpy.sqrt((d_x * d_x) + (d_y * d_y))
+        D = ((bottomLeft[0] - relX) * (topLeft[1] - relY)) - ((topLeft[0] - relX) * (bottomLeft[1] - relY))
+        collidesVertical |= ((r * r) * (d_r * d_r) - (D * D)) > 0
+
+        # more than one intersection means that it is colliding with a corner
+        return collidesHorizontal & collidesVertical
+
+    @staticmethod
+    def collisionRange() -> float:
+        """
+        Return how far the centre of an obstacle can be from the centre of the car and still collide with it, in pixels
+        collisionKernel only reports a collision near a corner, so this is the distance to a corner plus the diagonal of the obstacle
+        """
+        return (sqrt((Vehicle.getWidth() ** 2) + (Vehicle.getHeight() ** 2)) / 2) + (entity.obstacle.Obstacle.radius() * sqrt(2))
+
     @staticmethod
     def getWidth() -> float:
         """
@@ -0,0 +1,108 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy
+
+import dataset
+import gymadapter
+import simulation
+from collisionavoidance import SearchAgent
+from entity.vehicle import Vehicle
+
+# Action number for each turning input, the reverse of SimulationGymnasiumAdapter.step
+ACTION_FOR_TURNING = {0.0: 0, -1.0: 1, 1.0: 2}
+
+
+def generate(directory, episodes, seed, nSteps, shardSize, obstacleCount, sandboxSize, minSpawnDist, maxTicks, observationMode="multidiscrete"):
+    """
+    runs the search agent for each seed in 'episodes', writing every transition into a dataset in 'directory'
+    observations are written the way SimulationGymnasiumAdapter observes them in 'observationMode'
+    returns the number of transitions written
+    """
+    agent = SearchAgent(nSteps)
+    if observationMode == "float32":
+        observation = numpy.zeros(2 + len(Vehicle.dotSensorAngleList), dtype=numpy.float32)
+    else:
+        observation = numpy.zeros(1 + len(Vehicle.dotSensorAngleList), dtype=numpy.int64)
+    writer = dataset.ShardWriter(directory, len(observation), shardSize, observationMode)
+    transitions = 0
+
+    try:
+        for episode in episodes:
+            sim = simulation.SingleSimulation(obstacleCount, sandboxSize, minSpawnDist, seed=None if seed is None else seed + episode)
+            gymadapter.observe(sim, observation, observationMode)
+
+            for tick in range(maxTicks):
+                turning = agent.chooseDirection(sim)
+                sim.tick(turning, 1.0)
+
+                # crashing terminates the episode, being cut short at maxTicks only truncates it
+                terminated = sim.crashed
+                truncated = not terminated and tick == maxTicks - 1
+
+                writer.append(observation, ACTION_FOR_TURNING[turning], sim.fitness, terminated, truncated)
+                transitions += 1
+
+                if terminated or truncated:
+                    break
+
+                gymadapter.observe(sim, observation, observationMode)
+
+    finally:
+        writer.close()
+        agent.close()
+
+    return transitions
+
+
+def main():
+    """
+    Runs the search agent headless over many episodes, storing what it saw and did as a dataset for training (see dataset.py)
+    """
+
+    parser = argparse.ArgumentParser(description="Generate a dataset of search agent transitions")
+    parser.add_argument("output", help="directory to write the dataset to")
+    parser.add_argument("--episodes", type=int, default=100,
+                        help="number of episodes to run")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to run episodes in, each one writes its own part of the dataset")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first episode, each episode after it uses the next number")
+    parser.add_argument("--steps", type=int, default=8,
+                        help="lookahead steps for the search agent")
+    parser.add_argument("--shard-size", type=int, default=1000000,
+                        help="transitions per shard file")
+    parser.add_argument("--max-ticks", type=int, default=100000,
+                        help="longest an episode can go on for before it is cut short")
+    parser.add_argument("--observations", choices=gymadapter.SimulationGymnasiumAdapter.observation_modes, default="multidiscrete",
+                        help="how observations are stored, the same as SimulationGymnasiumAdapter's observation modes (see train_model.py --observations)")
+    parser.add_argument("--obstacles", type=int, default=10)
+    parser.add_argument("--sandbox-size", type=float, default=800)
+    parser.add_argument("--min-spawn-dist", type=float, default=500)
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    settings = (args.seed, args.steps, args.shard_size, args.obstacles, args.sandbox_size, args.min_spawn_dist, args.max_ticks, args.observations)
+
+    if args.workers <= 1:
+        transitions = generate(args.output, range(args.episodes), *settings)
+    else:
+        # each worker takes every n-th episode, and writes them into a part of the dataset of its own
+        parts = ["worker-" + str(worker) for worker in range(args.workers)]
+        jobs = [(os.path.join(args.output, part), range(worker, args.episodes, args.workers)) + settings for worker, part in enumerate(parts)]
+
+        os.makedirs(args.output, exist_ok=True)
+        with multiprocessing.Pool(args.workers) as pool:
+            transitions = sum(pool.starmap(generate, jobs))
+
+        dataset.writeParts(args.output, parts)
+
+    elapsed = time.perf_counter() - startTime
+    print(str(transitions) + " transitions from " + str(args.episodes) + " episodes in " + str(round(elapsed, 2)) + "s, " +
+          str(round(transitions / elapsed, 1)) + " per second")
+
+
+if __name__ == "__main__":
+    main()
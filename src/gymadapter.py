@@ -1,10 +1,60 @@
 import enum
+import time
 from math import pi
 import gymnasium
 import numpy
 import pyglet
+import instrumentation
 import renderer
 import simulation
+import visualiser
+
+def float32_observation_space(sensor_count):
+    """
+    The observation space of the float32 observation mode: sin and cos of the direction of the car, then the detect value of each sensor
+    """
+    low = numpy.zeros(2 + sensor_count, dtype=numpy.float32)
+    low[:2] = -1.0
+
+    return gymnasium.spaces.Box(low, numpy.ones(2 + sensor_count, dtype=numpy.float32), dtype=numpy.float32)
+
+
+def observation_mode_of(observation_space):
+    """
+    The observation mode that gives 'observation_space', for example the observation space of a saved model
+    """
+    return "float32" if isinstance(observation_space, gymnasium.spaces.Box) else "multidiscrete"
+
+
+def observe(sim, out, observation_mode, envs=None):
+    """
+    Write the observation of the simulation into out, in the given observation mode (see SimulationGymnasiumAdapter.observation_modes)
+
+    sim is either a SingleSimulation, with out one observation, or a BatchSimulation, with out one row per world,
+    in which case only the worlds in the boolean mask envs are written if it is given
+    every adapter and tool that observes the simulation goes through here, so they all observe it the same way
+    """
+    if isinstance(sim, simulation.BatchSimulation):
+        rows = slice(None) if envs is None else envs
+        direction = sim.direction[rows]
+        detect = sim.detect[rows]
+    else:
+        # a view of out with one row, so it is written in place the same way as a batch
+        out = out[None]
+        rows = slice(None)
+        direction = sim.car.direction
+        detect = sim.car.sensors.detect
+
+    if observation_mode == "float32":
+        out[rows, 0] = numpy.sin(direction)
+        out[rows, 1] = numpy.cos(direction)
+        out[rows, 2:] = detect
+        return
+
+    # direction * 1000 then the detection of each sensor, both truncated to ints by the integer array
+    out[rows, 0] = direction * 1000
+    out[rows, 1:] = detect
+
 
 class SimulationGymnasiumAdapter(gymnasium.Env):
     class Actions(enum.Enum):
@@ -12,9 +62,15 @@ class SimulationGymnasiumAdapter(gymnasium.Env):
         LEFT = 1
         RIGHT = 2
 
-    metadata = {"render_modes": ["pyglet_renderer"], "render_fps": 60}
+    # pyglet_renderer draws every step in this process, pyglet_async hands each step to a visualiser.Visualiser which draws in its own process
+    metadata = {"render_modes": ["pyglet_renderer", "pyglet_async"], "render_fps": 60}
+
+    # observation_mode "multidiscrete" observes int(direction * 1000) and int(detect) of each sensor, as a new array every step
+    # "float32" observes sin and cos of the direction and the full detect value of each sensor, written into the same array every step
+    # (so an observation is only valid until the next step or reset, copy it to keep it)
+    observation_modes = ["multidiscrete", "float32"]
 
-    def __init__(self, render_mode="pyglet_renderer", sandbox_size=800, min_spawn_dist=500, obstacle_count=10):
+    def __init__(self, render_mode="pyglet_renderer", sandbox_size=800, min_spawn_dist=500, obstacle_count=10, observation_mode="multidiscrete"):
         # Create the simulator object
         self.obstacle_count = obstacle_count
         self.min_spawn_dist = min_spawn_dist
@@ -25,37 +81,46 @@ class SimulationGymnasiumAdapter(gymnasium.Env):
         self.action_space = gymnasium.spaces.Discrete(3) # 3 actions: forwards, left, right
 
         # Create the observation space
-        observation_list = [int((2 * pi * 1000) + 1)]
+        assert observation_mode in self.observation_modes
+        self.observation_mode = observation_mode
 
-        for sensor in self.sim.car.dotSensorList:
-            observation_list.append(int(sensor.length) + 1)
+        if observation_mode == "float32":
+            self.observation_space = float32_observation_space(len(self.sim.car.dotSensorList))
+            self.observation = numpy.zeros(self.observation_space.shape, dtype=numpy.float32)
+        else:
+            observation_list = [int((2 * pi * 1000) + 1)]
 
-        self.observation_space = gymnasium.spaces.MultiDiscrete(observation_list)
+            for sensor in self.sim.car.dotSensorList:
+                observation_list.append(int(sensor.length) + 1)
+
+            self.observation_space = gymnasium.spaces.MultiDiscrete(observation_list)
 
         # Set render mode
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
         self.window = None # Initialised in render() if rendering
+        self.renderer = None
+        self.visualiser = None # Initialised in render() if rendering asynchronously
 
 
     def reset(self, seed=None, options=None):
         # Seed the random number generator
         super().reset(seed=seed)
 
-        # Create a new simulation
-        self.sim = simulation.SingleSimulation(self.obstacle_count, self.sandbox_size, self.min_spawn_dist)
-
-        # Observe the detection of each sensor
-        observation_list = [int(self.sim.car.direction * 1000)]
+        # Create a new simulation, seeded from the environment's generator so an episode can be repeated from the seed given here
+        self.sim = simulation.SingleSimulation(self.obstacle_count, self.sandbox_size, self.min_spawn_dist,
+                                               seed=int(self.np_random.integers(2 ** 63)))
 
-        for sensor in self.sim.car.dotSensorList:
-            observation_list.append(int(sensor.detect))
-
-        return (numpy.array(observation_list), {})
+        return (self.observe(), {})
 
 
     # Run one tick of the simulation
     def step(self, action):
+        # see instrumentation, the tick, building the observation and rendering are timed separately
+        timing = instrumentation.enabled
+        if timing:
+            stepStart = phaseStart = time.perf_counter()
+
         # Tick over the simulation based on the action chosen
         if action == 0:
             self.sim.tick(0.0, 1.0)
@@ -66,6 +131,9 @@ class SimulationGymnasiumAdapter(gymnasium.Env):
         elif action == 2:
             self.sim.tick(1.0, 1.0)
 
+        if timing:
+            phaseStart = instrumentation.phase("env.tick", phaseStart)
+
         # Return the results of the tick
 
         # If we've crashed this simulation is terminated
@@ -74,34 +142,63 @@ class SimulationGymnasiumAdapter(gymnasium.Env):
         # Higher fitness == better
         reward = self.sim.fitness
 
-        # Observe the detection of each sensor
-        observation_list = [int(self.sim.car.direction * 1000)]
+        observation = self.observe()
 
-        for sensor in self.sim.car.dotSensorList:
-            observation_list.append(int(sensor.detect))
+        if timing:
+            phaseStart = instrumentation.phase("env.observe", phaseStart)
 
         # Render a frame if required
-        if self.render_mode == "pyglet_renderer":
+        if self.render_mode is not None:
             self.render()
 
+            if timing:
+                instrumentation.phase("env.render", phaseStart)
+
         if self.sim.crashed:
             if self.window != None:
                 self.window.close()
 
             self.window = None
 
+        if timing:
+            instrumentation.phase("env.step", stepStart)
+            instrumentation.count("env.steps")
+
         # No truncation ever
         # (the simulation will always eventually finish as obstacle density keeps rising)
         # Also no auxiliary info
-        return (numpy.array(observation_list), reward, terminated, False, {})
+        return (observation, reward, terminated, False, {})
+
+
+    # Observe the direction of the car and the detection of each sensor
+    def observe(self):
+        if self.observation_mode == "float32":
+            observe(self.sim, self.observation, self.observation_mode)
+            return self.observation
+
+        observation = numpy.zeros(self.observation_space.shape, dtype=numpy.int64)
+        observe(self.sim, observation, self.observation_mode)
+
+        return observation
 
 
     # Render one frame of the simulation
     def render(self):
+        # Publishing the state to the visualiser doesn't wait for it to be drawn
+        if self.render_mode == "pyglet_async":
+            if self.visualiser == None:
+                self.visualiser = visualiser.Visualiser(fps=self.metadata["render_fps"])
+
+            self.visualiser.publish(self.sim)
+            return
+
         # If the renderer isn't already running, start it
         if(self.window == None):
             self.window = pyglet.window.Window(800, 800, "Car Navigation - Renderer")
-            renderer.render(self.sim, self.window)
+            self.renderer = renderer.render(self.sim, self.window)
+
+        # the simulation is replaced on reset, so make sure the window is showing the current one
+        self.renderer.sim = self.sim
 
         # Render a frame
         pyglet.clock.tick()
@@ -118,3 +215,108 @@ class SimulationGymnasiumAdapter(gymnasium.Env):
     def close(self):
         if(self.window != None):
             self.window = None
+            self.renderer = None
+
+        if(self.visualiser != None):
+            self.visualiser.close()
+            self.visualiser = None
+
+
+class SimulationVectorEnvAdapter(gymnasium.vector.VectorEnv):
+    """
+    Runs num_envs copies of the simulation as one gymnasium vector environment, backed by simulation.BatchSimulation
+
+    every environment is stepped in one vectorised call, with the observations, rewards and terminations written into
+    arrays that are allocated once, instead of stepping each environment in turn and building the arrays up every step
+    observations (in either observation mode) and actions are the same as SimulationGymnasiumAdapter, and environments that crash are reset in the same step
+    """
+
+    metadata = {"render_modes": [], "autoreset_mode": gymnasium.vector.AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs=8, sandbox_size=800, min_spawn_dist=500, obstacle_count=10, copy=True, observation_mode="multidiscrete"):
+        self.num_envs = num_envs
+        self.obstacle_count = obstacle_count
+        self.min_spawn_dist = min_spawn_dist
+        self.sandbox_size = sandbox_size
+        self.copy = copy # return copies of the buffers, so they aren't overwritten by the next step
+        self.sim = simulation.BatchSimulation(num_envs, obstacle_count, sandbox_size, min_spawn_dist, autoReset=False)
+
+        # Same spaces as SimulationGymnasiumAdapter
+        self.single_action_space = gymnasium.spaces.Discrete(3) # 3 actions: forwards, left, right
+
+        assert observation_mode in SimulationGymnasiumAdapter.observation_modes
+        self.observation_mode = observation_mode
+
+        if observation_mode == "float32":
+            self.single_observation_space = float32_observation_space(self.sim.detect.shape[1])
+        else:
+            observation_list = [int((2 * pi * 1000) + 1)]
+
+            for _ in range(self.sim.detect.shape[1]):
+                observation_list.append(int(self.sim.sensorLength) + 1)
+
+            self.single_observation_space = gymnasium.spaces.MultiDiscrete(observation_list)
+
+        self.action_space = gymnasium.vector.utils.batch_space(self.single_action_space, num_envs)
+        self.observation_space = gymnasium.vector.utils.batch_space(self.single_observation_space, num_envs)
+
+        self.render_mode = None
+
+        # Buffers written to every step
+        self.observations = numpy.zeros((num_envs,) + self.single_observation_space.shape, dtype=self.single_observation_space.dtype)
+        self.rewards = numpy.zeros(num_envs)
+        self.terminations = numpy.zeros(num_envs, dtype=numpy.bool_)
+        self.truncations = numpy.zeros(num_envs, dtype=numpy.bool_)
+
+        # Action number to turning input, see SimulationGymnasiumAdapter.step
+        self.turning_for_action = numpy.array([0.0, -1.0, 1.0])
+        self.forward = numpy.ones(num_envs)
+
+
+    def reset(self, *, seed=None, options=None):
+        # Seed the random number generator
+        if seed is not None:
+            self._np_random, self._np_random_seed = gymnasium.utils.seeding.np_random(seed)
+            self.sim.rng = numpy.random.default_rng(seed)
+
+        self.sim.reset()
+
+        self.observe()
+        return (self.observations.copy() if self.copy else self.observations, {})
+
+
+    def step(self, actions):
+        self.sim.tick(self.turning_for_action[numpy.asarray(actions)], self.forward)
+
+        # Higher fitness == better
+        numpy.copyto(self.rewards, self.sim.fitness)
+        numpy.copyto(self.terminations, self.sim.terminated)
+
+        self.observe()
+
+        infos = {}
+
+        # Start crashed environments again, keeping the last observation of the old run in the info
+        if self.terminations.any():
+            infos["final_obs"] = numpy.array([row if done else None for row, done in zip(self.observations.copy(), self.terminations)], dtype=object)
+            infos["_final_obs"] = self.terminations.copy()
+            infos["final_info"] = {}
+
+            self.sim.reset(self.terminations)
+            self.observe(self.terminations)
+
+        if self.copy:
+            return (self.observations.copy(), self.rewards.copy(), self.terminations.copy(), self.truncations.copy(), infos)
+
+        return (self.observations, self.rewards, self.terminations, self.truncations, infos)
+
+
+    def observe(self, envs=None):
+        """
+        write the observations of the given environments (a boolean mask, or every environment if not given) into self.observations
+        """
+        observe(self.sim, self.observations, self.observation_mode, envs)
+
+
+    def close_extras(self, **kwargs):
+        self.sim = None
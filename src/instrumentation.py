@@ -0,0 +1,189 @@
+import json
+import sys
+import time
+
+# Opt-in timing and counters for the hot paths
+# nothing is recorded unless enabled is True, and the code being timed checks that flag before it even reads the clock,
+# so when it is off the cost is one attribute check per phase
+#
+# usage, in code being timed:
+#     timing = instrumentation.enabled
+#     if timing: start = time.perf_counter()
+#     ... phase one ...
+#     if timing: start = instrumentation.phase("thing.one", start)
+#     ... phase two ...
+#     if timing: start = instrumentation.phase("thing.two", start)
+#
+# and to turn it on: instrumentation.enable("timings.jsonl", reportInterval=10.0)
+
+enabled = False
+
+# where summaries are written, and how often (seconds), see maybeReport
+output = None
+interval = None
+nextReport = 0.0
+
+
+class Histogram:
+    """
+    Distribution of durations in nanoseconds, bucketed by their top three bits, so recording one is cheap whatever the value
+
+    that gives four buckets between each power of two, so a percentile read from the buckets is within 25% of the real value
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+        self.buckets = [0] * 256
+
+    @staticmethod
+    def bucketFor(nanoseconds: int) -> int:
+        bits = nanoseconds.bit_length()
+        if bits <= 3:
+            return nanoseconds
+
+        return ((bits - 3) * 4) + ((nanoseconds >> (bits - 3)) & 3) + 4
+
+    @staticmethod
+    def bucketTop(bucket: int) -> int:
+        """
+        returns the smallest number of nanoseconds that is past the end of 'bucket'
+        """
+        if bucket < 8:
+            return bucket + 1
+
+        octave, step = divmod(bucket - 4, 4)
+        return (5 + step) << octave
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds < self.minimum:
+            self.minimum = seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+        self.buckets[min(255, Histogram.bucketFor(int(seconds * 1e9)))] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        returns the upper edge of the bucket that the given fraction of durations fall within, in seconds
+        """
+        target = fraction * self.count
+        seen = 0
+        for bucket, bucketCount in enumerate(self.buckets):
+            seen += bucketCount
+            if seen >= target and bucketCount:
+                return min(self.maximum, Histogram.bucketTop(bucket) / 1e9)
+
+        return self.maximum
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count,
+            "min": self.minimum,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.maximum,
+        }
+
+
+timers: dict[str, Histogram] = {}
+counters: dict[str, int] = {}
+
+
+def enable(path=None, reportInterval=None) -> None:
+    """
+    start recording, with a summary written to 'path' (as one JSON object per line) every 'reportInterval' seconds
+    path can also be an open file, without a path nothing is written until report is called
+    """
+    global enabled, output, interval, nextReport
+
+    if isinstance(path, str):
+        path = open(path, "a")
+
+    output = path
+    interval = reportInterval
+    nextReport = time.perf_counter() + (reportInterval or 0.0)
+    enabled = True
+
+
+def disable() -> None:
+    """
+    stop recording, writing one last summary if there is somewhere to write it
+    """
+    global enabled, output
+
+    if output is not None:
+        report()
+        if output not in (sys.stdout, sys.stderr):
+            output.close()
+        output = None
+
+    enabled = False
+
+
+def reset() -> None:
+    timers.clear()
+    counters.clear()
+
+
+def record(name: str, seconds: float) -> None:
+    histogram = timers.get(name)
+    if histogram is None:
+        histogram = timers[name] = Histogram()
+
+    histogram.record(seconds)
+
+
+def phase(name: str, start: float) -> float:
+    """
+    record the time since 'start' against 'name', returns the current time so the next phase can start from it
+    """
+    now = time.perf_counter()
+    record(name, now - start)
+    return now
+
+
+def count(name: str, amount: int = 1) -> None:
+    counters[name] = counters.get(name, 0) + amount
+
+
+def summary() -> dict:
+    return {
+        "time": time.time(),
+        "counters": dict(counters),
+        "timers": {name: histogram.summary() for name, histogram in timers.items()},
+    }
+
+
+def report(stream=None) -> None:
+    """
+    write a summary of everything recorded so far as one line of JSON
+    """
+    stream = stream or output or sys.stderr
+    stream.write(json.dumps(summary()) + "\n")
+    stream.flush()
+
+
+def maybeReport() -> None:
+    """
+    write a summary if it has been at least the report interval since the last one
+    """
+    global nextReport
+
+    if interval is None or output is None:
+        return
+
+    now = time.perf_counter()
+    if now >= nextReport:
+        nextReport = now + interval
+        report()
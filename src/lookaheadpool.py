@@ -0,0 +1,145 @@
+import multiprocessing
+
+import simulation
+
+# lookahead pool
+# a set of worker processes that each keep a warm copy of the simulation being searched
+# instead of sending the whole simulation every decision, only the ticks that happened to it since the last decision are sent,
+# which each worker replays on its own copy (see SingleSimulation.replayTick), then each worker scores its share of the candidate actions
+# the state of the random number generator is sent along with every update, so lookaheads respawn obstacles the same way the real simulation would
+# the simulation being followed keeps a log of its ticks for that (see SingleSimulation.tickLog), which is turned off again once the pool stops following it
+
+
+def _worker(connection):
+    """
+    runs in a worker process, keeping a warm copy of the simulation and scoring lookaheads from it
+    """
+    warm = None
+    scratch = None
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        kind, payload, rngState, check, actions, nSteps, crashPenalty = message
+
+        if kind == "snapshot":
+            warm = simulation.SingleSimulation.fromSnapshot(payload)
+        elif warm is not None:
+            for turning, forward, respawnPositions in payload:
+                warm.replayTick(turning, forward, respawnPositions)
+
+        if warm is not None:
+            warm.rng.bit_generator.state = rngState
+
+        # make sure the warm copy is still following the real simulation, otherwise ask for a snapshot
+        if warm is None or (warm.fitness, warm.obstacleRespawnCount, len(warm.obstacles), warm.crashed) != check:
+            warm = None
+            connection.send(None)
+            continue
+
+        scores = []
+        for action in actions:
+            if scratch is None:
+                scratch = warm.copy()
+                scratch.lazySensors = True
+            else:
+                warm.copyInto(scratch)
+
+            scratch.advance(nSteps, action, 1.0)
+
+            currentScore = scratch.fitness
+            if scratch.crashed:
+                currentScore += crashPenalty
+
+            scores.append(currentScore)
+
+        connection.send(scores)
+
+
+class LookaheadPool:
+    """
+    persistent worker processes that score lookaheads of a simulation in parallel
+    """
+
+    def __init__(self, workers: int):
+        self.connections = []
+        self.processes = []
+
+        # the simulation the workers' warm copies are following
+        self.following = None
+
+        # how many full snapshots have had to be sent, as opposed to just the ticks since the last decision
+        self.snapshotsSent = 0
+
+        for _ in range(workers):
+            parentConnection, childConnection = multiprocessing.Pipe()
+
+            process = multiprocessing.Process(target=_worker, args=(childConnection,), daemon=True)
+            process.start()
+            childConnection.close()
+
+            self.connections.append(parentConnection)
+            self.processes.append(process)
+
+    def evaluate(self, simInstance: simulation.SingleSimulation, actions: list, nSteps: int, crashPenalty: float) -> list:
+        """
+        returns the score of holding each action for nSteps ticks from the current state of simInstance, in the same order as actions
+
+        this turns on simInstance's tick log, so the ticks between decisions can be sent on, which also stops advance skipping ticks for it,
+        it stays on until the pool follows a different simulation, or stopFollowing or close is called
+        """
+        # the first time a simulation is seen the workers are sent all of it, after that only what has happened since
+        if (self.following is not simInstance) or (simInstance.tickLog is None):
+            kind, payload = "snapshot", simInstance.snapshot()
+            self.stopFollowing()
+            self.following = simInstance
+            self.snapshotsSent += 1
+        else:
+            kind, payload = "delta", simInstance.tickLog
+
+        simInstance.tickLog = []
+        rngState = simInstance.rng.bit_generator.state
+        check = (simInstance.fitness, simInstance.obstacleRespawnCount, len(simInstance.obstacles), simInstance.crashed)
+
+        # share the actions out between the workers, every worker gets the update even if it has no actions to score
+        shares = [actions[worker::len(self.connections)] for worker in range(len(self.connections))]
+
+        for connection, share in zip(self.connections, shares):
+            connection.send((kind, payload, rngState, check, share, nSteps, crashPenalty))
+
+        results = [connection.recv() for connection in self.connections]
+
+        # a worker that lost track of the simulation gets sent a snapshot and asked again
+        for worker, result in enumerate(results):
+            if result is None:
+                self.snapshotsSent += 1
+                self.connections[worker].send(("snapshot", simInstance.snapshot(), rngState, check, shares[worker], nSteps, crashPenalty))
+                results[worker] = self.connections[worker].recv()
+
+        scores = [0.0] * len(actions)
+        for worker, result in enumerate(results):
+            scores[worker::len(self.connections)] = result
+
+        return scores
+
+    def stopFollowing(self) -> None:
+        """
+        turn off the tick log of the simulation being followed, the next evaluate sends whichever simulation it is given in full
+        """
+        if self.following is not None:
+            self.following.tickLog = None
+            self.following = None
+
+    def close(self) -> None:
+        self.stopFollowing()
+
+        for connection in self.connections:
+            connection.send(None)
+
+        for process in self.processes:
+            process.join()
+
+        self.connections = []
+        self.processes = []
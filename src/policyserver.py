@@ -0,0 +1,341 @@
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import time
+
+import numpy
+
+import instrumentation
+
+# Serving a trained model to many simulations at once
+# a PolicyServer loads the model once and listens on a Unix socket, each connection being one caller asking for actions
+# (a simulation, or a vector of them asking for all their actions in one request)
+# when a caller connects the server sends a Hello, saying how big an observation is and what dtype it is sent as,
+# after that each request is a RequestHeader followed by that many observations, and is answered with one int64 action per observation
+#
+# requests that arrive within 'window' seconds of each other are stacked and answered with one call to the model,
+# so the cost of a forward pass is shared between every caller waiting at the time instead of paid by each one
+#
+# the server never blocks on a caller, answers are queued on their connection and sent whenever its socket can take them,
+# so a caller that stops reading only holds up its own answers, and once too much is queued for it, nothing more is read from it either
+
+Hello = struct.Struct("<I16s")      # observation size, numpy dtype string of the observations
+RequestHeader = struct.Struct("<I") # number of observations that follow
+
+ActionDtype = numpy.dtype("<i8")
+
+
+class Connection:
+    """
+    One caller connected to a PolicyServer, with whatever part of its next request has arrived so far,
+    and whatever has not been sent to it yet
+    """
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.received = bytearray()
+        self.outgoing = bytearray()
+        self.waiting = 0 # requests received and not answered yet
+
+
+class PolicyServer:
+    """
+    Answers requests from PolicyClients with actions chosen by 'model', in batches, see the top of this file
+
+    'model' is anything with a stable-baselines3 style predict and observation_space, usually a loaded stable-baselines3 model
+    a batch is run as soon as either every connected caller is waiting on an answer, 'maxBatch' observations are waiting,
+    or the oldest request has waited 'window' seconds
+    """
+
+    # bytes that can be queued for a caller before the server stops reading its requests until it catches up
+    MaxOutgoing = 1 << 20
+
+    def __init__(self, model, path, window: float = 0.002, maxBatch: int = 1024, reportInterval: float = None, output=None):
+        self.model = model
+        self.path = path
+        self.window = window
+        self.maxBatch = maxBatch
+
+        self.observationSize = int(numpy.prod(model.observation_space.shape))
+        self.observationDtype = numpy.dtype(model.observation_space.dtype).newbyteorder("<")
+        self.hello = Hello.pack(self.observationSize, self.observationDtype.str.encode())
+
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen()
+        self.listener.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.connections = {}
+
+        self.pending = []     # (connection, observations, time received) of every request waiting for the next batch
+        self.pendingRows = 0
+        self.running = False
+
+        # statistics since the last report
+        self.output = output or sys.stdout
+        self.reportInterval = reportInterval
+        self.latency = instrumentation.Histogram()
+        self.batchTime = instrumentation.Histogram()
+        self.decisions = 0
+        self.batches = 0
+        self.periodStart = time.perf_counter()
+        self.nextReport = self.periodStart + (reportInterval or 0.0)
+
+    def _accept(self) -> None:
+        sock, _ = self.listener.accept()
+        sock.setblocking(False)
+
+        connection = Connection(sock)
+        self.connections[sock] = connection
+        self.selector.register(sock, selectors.EVENT_READ, connection)
+
+        self._send(connection, self.hello)
+
+    def _send(self, connection, data: bytes) -> None:
+        """
+        queue 'data' to be sent to 'connection', sending as much of it as the socket will take straight away
+        """
+        connection.outgoing += data
+        self._flush(connection)
+
+    def _flush(self, connection) -> None:
+        """
+        send as much of what is queued for 'connection' as its socket will take without blocking,
+        and only ask to be told when the socket is writable while there is something left to send
+        """
+        try:
+            while connection.outgoing:
+                sent = connection.socket.send(connection.outgoing)
+                del connection.outgoing[:sent]
+        except BlockingIOError:
+            pass
+        except ConnectionError:
+            self._disconnect(connection)
+            return
+
+        events = ((selectors.EVENT_READ if len(connection.outgoing) < PolicyServer.MaxOutgoing else 0) |
+                  (selectors.EVENT_WRITE if connection.outgoing else 0))
+        if self.selector.get_key(connection.socket).events != events:
+            self.selector.modify(connection.socket, events, connection)
+
+    def _disconnect(self, connection) -> None:
+        self.selector.unregister(connection.socket)
+        del self.connections[connection.socket]
+        connection.socket.close()
+
+        # anything it was still waiting for is dropped
+        self.pending = [request for request in self.pending if request[0] is not connection]
+        self.pendingRows = sum(len(request[1]) for request in self.pending)
+
+    def _receive(self, connection) -> None:
+        """
+        read what 'connection' has sent, queueing every request that has arrived whole
+        """
+        try:
+            data = connection.socket.recv(1 << 16)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            data = b""
+
+        if not data:
+            self._disconnect(connection)
+            return
+
+        connection.received += data
+        now = time.perf_counter()
+        rowSize = self.observationSize * self.observationDtype.itemsize
+
+        while len(connection.received) >= RequestHeader.size:
+            (rows,) = RequestHeader.unpack_from(connection.received)
+            end = RequestHeader.size + (rows * rowSize)
+            if len(connection.received) < end:
+                break
+
+            observations = numpy.frombuffer(bytes(connection.received[RequestHeader.size:end]), dtype=self.observationDtype)
+            del connection.received[:end]
+
+            # the answer to no observations is no actions, which there is nothing to send for, so it never goes near the model
+            if rows == 0:
+                continue
+
+            self.pending.append((connection, observations.reshape(rows, self.observationSize), now))
+            self.pendingRows += rows
+            connection.waiting += 1
+
+    def _batchReady(self, now: float) -> bool:
+        if not self.pending:
+            return False
+
+        # no one else can add to the batch while every caller is waiting on it, so there is no point waiting for the window
+        if all(connection.waiting for connection in self.connections.values()):
+            return True
+
+        return self.pendingRows >= self.maxBatch or now >= self.pending[0][2] + self.window
+
+    def _runBatch(self) -> None:
+        """
+        answer every pending request with one call to the model
+        """
+        batch = self.pending
+        self.pending = []
+        self.pendingRows = 0
+
+        start = time.perf_counter()
+        actions, _ = self.model.predict(numpy.concatenate([request[1] for request in batch]), deterministic=True)
+        actions = numpy.asarray(actions, dtype=ActionDtype).reshape(-1)
+        self.batchTime.record(time.perf_counter() - start)
+
+        row = 0
+        for connection, observations, received in batch:
+            answer = actions[row:row + len(observations)]
+            row += len(observations)
+
+            # a caller that disconnected while the batch was running has already been dropped
+            if connection.socket not in self.connections:
+                continue
+
+            connection.waiting -= 1
+            self._send(connection, answer.tobytes())
+            self.latency.record(time.perf_counter() - received)
+
+        self.decisions += len(actions)
+        self.batches += 1
+
+    def summary(self) -> dict:
+        """
+        statistics of the requests answered since the last report, latency is from a request arriving whole to its answer being queued to send
+        """
+        elapsed = time.perf_counter() - self.periodStart
+
+        return {
+            "time": time.time(),
+            "connections": len(self.connections),
+            "decisions": self.decisions,
+            "requests": self.latency.count,
+            "batches": self.batches,
+            "mean_batch": self.decisions / self.batches if self.batches else 0.0,
+            "decisions_per_second": self.decisions / elapsed if elapsed > 0 else 0.0,
+            "requests_per_second": self.latency.count / elapsed if elapsed > 0 else 0.0,
+            "latency": self.latency.summary(),
+            "forward_pass": self.batchTime.summary(),
+        }
+
+    def report(self) -> None:
+        """
+        write a summary as one line of JSON, then start counting again
+        """
+        self.output.write(json.dumps(self.summary()) + "\n")
+        self.output.flush()
+
+        self.latency = instrumentation.Histogram()
+        self.batchTime = instrumentation.Histogram()
+        self.decisions = 0
+        self.batches = 0
+        self.periodStart = time.perf_counter()
+
+    def serve(self, duration: float = None) -> None:
+        """
+        answer requests until stop is called, or for 'duration' seconds if given
+        """
+        self.running = True
+        end = None if duration is None else time.perf_counter() + duration
+
+        while self.running and (end is None or time.perf_counter() < end):
+            # sleep until something arrives, the oldest request's window runs out or the next report is due,
+            # waking up at least twice a second to see if stop was called
+            now = time.perf_counter()
+            timeout = 0.5
+            if self.pending:
+                timeout = min(timeout, self.pending[0][2] + self.window - now)
+            if self.reportInterval is not None:
+                timeout = min(timeout, self.nextReport - now)
+            if end is not None:
+                timeout = min(timeout, end - now)
+
+            for key, events in self.selector.select(max(0.0, timeout)):
+                if key.fileobj is self.listener:
+                    self._accept()
+                    continue
+
+                if events & selectors.EVENT_WRITE:
+                    self._flush(key.data)
+
+                # flushing can find out that the caller has gone
+                if (events & selectors.EVENT_READ) and key.fileobj in self.connections:
+                    self._receive(key.data)
+
+            now = time.perf_counter()
+            if self._batchReady(now):
+                self._runBatch()
+
+            if self.reportInterval is not None and now >= self.nextReport:
+                self.nextReport = now + self.reportInterval
+                self.report()
+
+        self.running = False
+
+    def stop(self) -> None:
+        self.running = False
+
+    def close(self) -> None:
+        for connection in list(self.connections.values()):
+            self._disconnect(connection)
+
+        self.selector.unregister(self.listener)
+        self.selector.close()
+        self.listener.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class PolicyClient:
+    """
+    Asks a PolicyServer for actions, predict can be used in place of the model's own predict
+    """
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+
+        observationSize, dtype = Hello.unpack(self._receive(Hello.size))
+        self.observationSize = observationSize
+        self.observationDtype = numpy.dtype(dtype.rstrip(b"\0").decode())
+
+    def _receive(self, length: int) -> bytes:
+        data = bytearray()
+        while len(data) < length:
+            chunk = self.socket.recv(length - len(data))
+            if not chunk:
+                raise ConnectionError("the policy server closed the connection")
+            data += chunk
+
+        return bytes(data)
+
+    def predict(self, observations, state=None, episode_start=None, deterministic=True):
+        """
+        returns (actions, None) for one observation or an array of them, the same as a stable-baselines3 model's predict
+        the model is always run deterministically
+        """
+        observations = numpy.asarray(observations, dtype=self.observationDtype)
+        rows = observations.reshape(-1, self.observationSize)
+
+        self.socket.sendall(RequestHeader.pack(len(rows)) + rows.tobytes())
+        actions = numpy.frombuffer(self._receive(len(rows) * ActionDtype.itemsize), dtype=ActionDtype)
+
+        if observations.ndim == 1:
+            return (actions[0], None)
+
+        return (actions, None)
+
+    def close(self) -> None:
+        self.socket.close()
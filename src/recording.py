@@ -0,0 +1,225 @@
+import bisect
+import mmap
+import struct
+
+import numpy
+
+import simulation
+
+# Episode recording
+# a trace file is a short header followed by chunks, each chunk covering up to keyframeInterval ticks in a row
+# a chunk starts with a keyframe, which is a snapshot of the simulation from before its first tick (see SingleSimulation.snapshot),
+# then one row of TickColumns per tick, then the position of every obstacle respawned during those ticks, in order
+# that is everything replayTick needs, so any tick can be reached by restoring the keyframe before it and replaying at most one chunk
+#
+# chunks are only ever appended, and every value is a little endian float64 at an offset that is a multiple of 8,
+# so a trace can be memory mapped and read without copying, and a trace cut short by a crash is still readable up to its last whole chunk
+
+FileMagic = b"CARTRACE"
+FileVersion = 1
+FileHeader = struct.Struct("<8sII")      # magic, version, number of tick columns
+ChunkHeader = struct.Struct("<4s4xqqqq") # magic, first tick, tick count, respawn count, keyframe length
+ChunkMagic = b"CHNK"
+
+# what is recorded every tick, the inputs to the tick and the state of the car after it
+TickColumns = ("turning", "forward", "direction", "speed", "fitness", "crashed", "respawns", "obstacleCount")
+
+
+class Recorder:
+    """
+    Writes every tick of a simulation to a trace file, see the top of this file for the format
+
+    the ticks of a chunk are kept in memory until the chunk is full (or the car crashes), then written out in one go,
+    so recording costs one row written into an array per tick, plus a snapshot at the start of each chunk
+    """
+
+    def __init__(self, path, sim: simulation.SingleSimulation, keyframeInterval: int = 256):
+        self.file = open(path, "wb")
+        self.file.write(FileHeader.pack(FileMagic, FileVersion, len(TickColumns)))
+
+        self.keyframeInterval = keyframeInterval
+        self.ticks = numpy.empty((keyframeInterval, len(TickColumns)))
+        self.respawns = []
+
+        self.tick = 0
+        self.chunkTicks = 0
+        self.keyframe = sim.snapshot()
+
+        self.sim = sim
+        sim.recorder = self
+
+    def record(self, sim: simulation.SingleSimulation, turning: float, forward: float, respawnPositions: list) -> None:
+        """
+        called by SingleSimulation.tick at the end of every tick
+        """
+        self.ticks[self.chunkTicks] = (turning, forward, sim.car.direction, sim.car.speed, sim.fitness, sim.crashed,
+                                       len(respawnPositions), len(sim.obstacles))
+        self.respawns.extend(respawnPositions)
+        self.chunkTicks += 1
+        self.tick += 1
+
+        # write the crash out straight away, so it is in the file whatever happens next
+        if self.chunkTicks == self.keyframeInterval or sim.crashed:
+            self.flush()
+            self.keyframe = sim.snapshot()
+
+    def flush(self) -> None:
+        """
+        write the ticks recorded since the last chunk as a new chunk
+        """
+        if self.chunkTicks == 0:
+            return
+
+        respawns = numpy.array(self.respawns, dtype=numpy.float64).reshape(-1, 2)
+
+        self.file.write(ChunkHeader.pack(ChunkMagic, self.tick - self.chunkTicks, self.chunkTicks, len(respawns), len(self.keyframe)))
+        self.file.write(self.keyframe.astype("<f8").tobytes())
+        self.file.write(self.ticks[:self.chunkTicks].astype("<f8").tobytes())
+        self.file.write(respawns.astype("<f8").tobytes())
+        self.file.flush()
+
+        self.chunkTicks = 0
+        self.respawns = []
+
+    def close(self) -> None:
+        if self.file is None:
+            return
+
+        self.flush()
+        self.file.close()
+        self.file = None
+
+        if self.sim.recorder is self:
+            self.sim.recorder = None
+
+
+class Chunk:
+    """
+    One chunk of a trace, each array is a view straight into the memory mapped file
+    """
+
+    def __init__(self, firstTick, keyframe, ticks, respawns):
+        self.firstTick = firstTick
+        self.keyframe = keyframe
+        self.ticks = ticks
+        self.respawns = respawns
+
+        # where the respawns of each tick start in self.respawns
+        self.respawnStarts = numpy.concatenate(([0], numpy.cumsum(ticks[:, TickColumns.index("respawns")]))).astype(numpy.int64)
+
+
+class Replay:
+    """
+    Reads a trace file written by Recorder, and puts a simulation into the state it was in after any recorded tick
+
+    the recorded car state of every tick can be read directly from ticks without simulating anything,
+    to see the obstacles as well a simulation has to be rebuilt, which is done from the nearest keyframe before the wanted tick
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, columns = FileHeader.unpack_from(self.map, 0)
+        if magic != FileMagic or version != FileVersion or columns != len(TickColumns):
+            raise ValueError(str(path) + " is not a trace file this version can read")
+
+        self.chunks = []
+        offset = FileHeader.size
+        while offset + ChunkHeader.size <= len(self.map):
+            magic, firstTick, tickCount, respawnCount, keyframeLength = ChunkHeader.unpack_from(self.map, offset)
+            end = offset + ChunkHeader.size + 8 * (keyframeLength + (tickCount * len(TickColumns)) + (respawnCount * 2))
+
+            # a chunk that was only partly written when the recording stopped is ignored
+            if magic != ChunkMagic or end > len(self.map):
+                break
+
+            position = offset + ChunkHeader.size
+            keyframe = numpy.frombuffer(self.map, dtype="<f8", count=keyframeLength, offset=position)
+            position += 8 * keyframeLength
+            ticks = numpy.frombuffer(self.map, dtype="<f8", count=tickCount * len(TickColumns), offset=position).reshape(tickCount, len(TickColumns))
+            position += 8 * tickCount * len(TickColumns)
+            respawns = numpy.frombuffer(self.map, dtype="<f8", count=respawnCount * 2, offset=position).reshape(respawnCount, 2)
+
+            self.chunks.append(Chunk(firstTick, keyframe, ticks, respawns))
+            offset = end
+
+        self.firstTicks = [chunk.firstTick for chunk in self.chunks]
+
+    def __len__(self) -> int:
+        """
+        the number of ticks recorded
+        """
+        if not self.chunks:
+            return 0
+
+        return self.chunks[-1].firstTick + len(self.chunks[-1].ticks)
+
+    @property
+    def ticks(self) -> numpy.ndarray:
+        """
+        every recorded tick as one array, with a column for each of TickColumns
+        """
+        if not self.chunks:
+            return numpy.empty((0, len(TickColumns)))
+
+        return numpy.concatenate([chunk.ticks for chunk in self.chunks])
+
+    def column(self, name: str) -> numpy.ndarray:
+        return self.ticks[:, TickColumns.index(name)]
+
+    def _replayChunk(self, sim, chunk, start, end) -> None:
+        """
+        replay ticks start to end (counted from the start of the chunk) onto 'sim'
+        """
+        turning = TickColumns.index("turning")
+        forward = TickColumns.index("forward")
+
+        for index in range(start, end):
+            respawns = chunk.respawns[chunk.respawnStarts[index]:chunk.respawnStarts[index + 1]].tolist()
+            sim.replayTick(chunk.ticks[index, turning], chunk.ticks[index, forward], respawns)
+
+    def simulationAt(self, tick: int, sim: simulation.SingleSimulation = None) -> simulation.SingleSimulation:
+        """
+        returns a simulation in the state it was in after 'tick' recorded ticks, 0 being the state when recording started
+        if 'sim' is given it is put into that state instead of making a new one
+        """
+        if not 0 <= tick <= len(self):
+            raise IndexError("tick " + str(tick) + " is outside the recording, which has " + str(len(self)) + " ticks")
+
+        chunkIndex = max(0, bisect.bisect_right(self.firstTicks, tick) - 1)
+        chunk = self.chunks[chunkIndex]
+
+        if sim is None:
+            sim = simulation.SingleSimulation.fromSnapshot(chunk.keyframe)
+        else:
+            sim.restore(chunk.keyframe)
+
+        self._replayChunk(sim, chunk, 0, tick - chunk.firstTick)
+        return sim
+
+    def play(self, start: int = 0, end: int = None, sim: simulation.SingleSimulation = None):
+        """
+        yields a simulation after every recorded tick from 'start' up to 'end', always the same instance, moved on one tick each time
+        """
+        end = len(self) if end is None else end
+        sim = self.simulationAt(start, sim)
+
+        chunkIndex = max(0, bisect.bisect_right(self.firstTicks, start) - 1)
+        tick = start
+        while tick < end and chunkIndex < len(self.chunks):
+            chunk = self.chunks[chunkIndex]
+            chunkEnd = min(end, chunk.firstTick + len(chunk.ticks))
+
+            for index in range(tick - chunk.firstTick, chunkEnd - chunk.firstTick):
+                self._replayChunk(sim, chunk, index, index + 1)
+                yield sim
+
+            tick = chunkEnd
+            chunkIndex += 1
+
+    def close(self) -> None:
+        # drop every view into the map before closing it
+        self.chunks = []
+        self.map.close()
+        self.file.close()
@@ -1,62 +1,170 @@
 import pyglet
 import time
 
-def render(sim, window):
+import instrumentation
+from entity.obstacle import Obstacle
+
+# Font used for all text
+mainFont = "Comic Shanns Mono"
+mainFontSize = 24
+
+_fontLoaded = False
+
+def loadFont():
     """
-    Render the given simulation 'sim' into window 'window'
+    Make the main font available to pyglet, this only has to be done once however many windows are opened
+    """
+    global _fontLoaded
+
+    if not _fontLoaded:
+        pyglet.resource.add_font("assets/ComicShannsMono-Regular.ttf")
+        _fontLoaded = True
+
+
+class Renderer:
+    """
+    Draws a simulation into a window, keeping the same shapes and labels from frame to frame
+
+    every shape is created once and after that only has its position, colour or text changed when that is different from the last frame
+    there is one circle per obstacle, and more are added as the simulation adds obstacles
+    circles that are not needed (because the simulation has fewer obstacles, or the obstacle is off screen) are hidden rather than deleted
     """
 
-    # Define font used
-    pyglet.resource.add_font("assets/ComicShannsMono-Regular.ttf")
-    mainFont = "Comic Shanns Mono"
-    mainFontSize = 24
+    # colours of the car corners, in the order top left, top right, bottom left, bottom right
+    CornerColours = ((255, 0, 255), (255, 255, 0), (0, 255, 255), (255, 255, 255))
+
+    ObstacleColour = (0, 255, 0)
+    CollidingColour = (255, 0, 0)
+
+    def __init__(self, window, sim=None):
+        loadFont()
+
+        self.window = window
+        self.sim = sim
+
+        # Batch all of the draws together so Pyglet can optimise the OpenGL
+        self.batch = pyglet.graphics.Batch()
+
+        # draw the obstacles behind the car and the text
+        self.obstacleGroup = pyglet.graphics.Group(order=0)
+        self.foregroundGroup = pyglet.graphics.Group(order=1)
+
+        # Car corners
+        self.corners = [pyglet.shapes.Circle(0, 0, 3, color=colour, batch=self.batch, group=self.foregroundGroup)
+                        for colour in Renderer.CornerColours]
+
+        # Debug info, one label per line
+        self.labels = [pyglet.text.Label("", font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255),
+                                         x=10, y=self.flipY(10 + (30 * line)), anchor_x="left", anchor_y="top",
+                                         batch=self.batch, group=self.foregroundGroup)
+                       for line in range(4)]
+
+        # Obstacles, see obstacleCircle
+        self.obstacleCircles = []
+        self.obstacleColliding = []
+
+        # On each frame, draw the scene
+        @window.event
+        def on_draw():
+            window.clear()
+            if self.sim is not None:
+                self.draw(self.sim)
+
+        @window.event
+        def on_close():
+            window.close()
 
     # Flip the Y coordinate so things render the right way round.
     # This isn't strictly necessary, and 0 being the bottom left is in my opinion superior,
     # however this renderer replaces a Pygame-based renderer which has Y in the top left instead,
     # and consistency is nice.
-    def flip_y_coord(y):
-        return window.get_size()[1] - y
+    def flipY(self, y):
+        return self.window.get_size()[1] - y
 
-    # On each frame, draw the scene
-    @window.event
-    def on_draw():
-        # Even though this array is not read, all objects to be drawn must be added or they won't render.
-        # Presumably, that is the garbage collector's doing.
-        objects = []
+    def setText(self, label, text):
+        # changing the text of a label lays it out again, so only do it when the text actually changes
+        if label.text != text:
+            label.text = text
 
-        # Batch all of the draws together so Pyglet can optimise the OpenGL
-        drawBatch = pyglet.graphics.Batch()
+    def obstacleCircle(self, index):
+        """
+        returns the circle for the obstacle at 'index', making more circles if there are not enough yet
+        """
+        while len(self.obstacleCircles) <= index:
+            circle = pyglet.shapes.Circle(0, 0, Obstacle.radius(), color=Renderer.ObstacleColour, batch=self.batch, group=self.obstacleGroup)
+            circle.visible = False
+            self.obstacleCircles.append(circle)
+            self.obstacleColliding.append(False)
+
+        return self.obstacleCircles[index]
+
+    def draw(self, sim):
+        """
+        Bring every shape up to date with 'sim' and draw them
+        """
+        timing = instrumentation.enabled
+        if timing:
+            start = time.perf_counter()
+
+        width, height = self.window.get_size()
 
         # Car corners
-        sim.car.makeScreenSpacePoints(800, 800)
+        sim.car.makeScreenSpacePoints(width, height)
 
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceTopLeft[0], flip_y_coord(sim.car.screenSpaceTopLeft[1]), 3, color=(255, 0, 255), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceTopRight[0], flip_y_coord(sim.car.screenSpaceTopRight[1]), 3, color=(255, 255, 0), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceBottomLeft[0], flip_y_coord(sim.car.screenSpaceBottomLeft[1]), 3, color=(0, 255, 255), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceBottomRight[0], flip_y_coord(sim.car.screenSpaceBottomRight[1]), 3, color=(255, 255, 255), batch=drawBatch))
+        for circle, corner in zip(self.corners, (sim.car.screenSpaceTopLeft, sim.car.screenSpaceTopRight,
+                                                 sim.car.screenSpaceBottomLeft, sim.car.screenSpaceBottomRight)):
+            circle.position = (corner[0], self.flipY(corner[1]))
 
         # Debug info
-        objects.append(pyglet.text.Label(str(sim.car.direction), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(10), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.obstacleList[0].relX), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(40), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.obstacleList[0].relY), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(70), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.instanceNo), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(100), anchor_x="left", anchor_y="top", batch=drawBatch))
-
-        # Obstacles
-        for obstacle in sim.obstacleList:
-            obstacle.makeScreenSpacePoints(800, 800)
-            objects.append(pyglet.shapes.Circle(obstacle.screenSpaceX,
-                                                flip_y_coord(obstacle.screenSpaceY),
-                                                obstacle.radius(),
-                                                color=(255 if obstacle.collidingWithCar else 0,
-                                                       0 if obstacle.collidingWithCar else 255,
-                                                       0),
-                                                batch=drawBatch))
+        self.setText(self.labels[0], str(sim.car.direction))
+        self.setText(self.labels[1], str(sim.obstacleList[0].relX))
+        self.setText(self.labels[2], str(sim.obstacleList[0].relY))
+        self.setText(self.labels[3], str(sim.instanceNo))
+
+        # Obstacles, worked out for all of them at once, then only the ones that can be seen are updated
+        obstacles = sim.obstacles
+        radius = Obstacle.radius()
+        screenX = obstacles.relX + (width / 2)
+        screenY = height - (obstacles.relY + (height / 2))
+        onScreen = (screenX > -radius) & (screenX < width + radius) & (screenY > -radius) & (screenY < height + radius)
+
+        for index, (x, y, visible, colliding) in enumerate(zip(screenX.tolist(), screenY.tolist(), onScreen.tolist(), obstacles.colliding.tolist())):
+            circle = self.obstacleCircle(index)
+
+            if not visible:
+                if circle.visible:
+                    circle.visible = False
+                continue
+
+            circle.position = (x, y)
+
+            if colliding != self.obstacleColliding[index]:
+                circle.color = Renderer.CollidingColour if colliding else Renderer.ObstacleColour
+                self.obstacleColliding[index] = colliding
+
+            if not circle.visible:
+                circle.visible = True
+
+        # hide the circles left over from a simulation with more obstacles
+        for circle in self.obstacleCircles[len(obstacles):]:
+            if circle.visible:
+                circle.visible = False
+
+        if timing:
+            start = instrumentation.phase("render.update", start)
 
         # Draw the scene
-        window.clear()
-        drawBatch.draw()
+        self.batch.draw()
+
+        if timing:
+            instrumentation.phase("render.draw", start)
+            instrumentation.count("render.frames")
+
 
-    @window.event
-    def on_close():
-        window.close()
+def render(sim, window):
+    """
+    Render the given simulation 'sim' into window 'window'
+
+    returns the Renderer drawing it, change its sim attribute to show a different simulation in the same window
+    """
+    return Renderer(window, sim)
@@ -0,0 +1,72 @@
+import argparse
+import os
+import time
+
+import pyglet
+
+import recording
+import renderer
+
+def main():
+    """
+    Replays an episode recorded with run_search_agent.py --record, either in a window or as fast as possible without one
+    """
+
+    parser = argparse.ArgumentParser(description="Replay a recorded episode")
+    parser.add_argument("trace", help="trace file written by run_search_agent.py --record")
+    parser.add_argument("--start", type=int, default=0,
+                        help="tick to start from, reached from the nearest keyframe instead of replaying everything before it")
+    parser.add_argument("--end", type=int, default=None,
+                        help="tick to stop at, the end of the recording by default")
+    parser.add_argument("--headless", action="store_true",
+                        help="replay without opening a window, as fast as possible, and report how it ended")
+    parser.add_argument("--render-fps", type=float, default=60.0,
+                        help="ticks shown per second when not headless")
+    args = parser.parse_args()
+
+    replay = recording.Replay(args.trace)
+    print(args.trace + ": " + str(len(replay)) + " ticks in " + str(len(replay.chunks)) + " chunks")
+
+    window = None
+    if not args.headless:
+        # Set the load path for assets
+        pyglet.resource.path = [os.path.dirname(__file__) + "/.."]
+        pyglet.resource.reindex()
+
+        window = pyglet.window.Window(800, 800, "Car Navigation - Replay")
+        sceneRenderer = renderer.render(None, window)
+
+    startTime = time.perf_counter()
+    ticks = 0
+    sim = None
+
+    for sim in replay.play(args.start, args.end):
+        ticks += 1
+
+        if window is not None:
+            if window.context is None:
+                break
+
+            sceneRenderer.sim = sim
+            window.switch_to()
+            window.dispatch_events()
+            if window.context is None:
+                break
+            window.dispatch_event("on_draw")
+            window.flip()
+
+            time.sleep(max(0.0, (ticks / args.render_fps) - (time.perf_counter() - startTime)))
+
+    elapsed = time.perf_counter() - startTime
+
+    if sim is not None:
+        print("Replayed " + str(ticks) + " ticks in " + str(round(elapsed, 3)) + "s, " + str(round(ticks / elapsed, 1)) + " ticks per second")
+        print("Fitness " + str(sim.fitness) + ", " + ("crashed" if sim.crashed else "not crashed") + ", " + str(len(sim.obstacles)) + " obstacles")
+
+    if window is not None:
+        window.close()
+
+    replay.close()
+
+if __name__ == "__main__":
+    main()
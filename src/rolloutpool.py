@@ -0,0 +1,240 @@
+import multiprocessing
+from math import pi
+from multiprocessing import shared_memory
+
+import gymnasium
+import numpy
+
+from stable_baselines3.common.vec_env import VecEnv
+
+import gymadapter
+import simulation
+from entity.dotsensor import DotSensor
+from entity.vehicle import Vehicle
+
+# Commands sent from the pool to its workers, as single bytes so nothing is pickled per step
+COMMAND_STEP  = b"s"
+COMMAND_RESET = b"r"
+COMMAND_CLOSE = b"c"
+
+# Inputs for each action, see gymadapter.SimulationGymnasiumAdapter.step
+ACTION_TURNING = (0.0, -1.0, 1.0)
+
+
+class SharedBuffers:
+    """
+    The arrays shared between the pool and its workers, each one backed by its own block of shared memory
+
+    the pool creates the blocks, and each worker attaches to them by name
+    """
+
+    def __init__(self, num_envs, observation_size, names=None, observation_dtype=numpy.int64):
+        self.num_envs = num_envs
+        self.observation_size = observation_size
+        self.blocks = {}
+
+        layout = {
+            "actions":               ((num_envs,),                   numpy.int64),
+            "observations":          ((num_envs, observation_size),  observation_dtype),
+            "rewards":               ((num_envs,),                   numpy.float64),
+            "dones":                 ((num_envs,),                   numpy.bool_),
+            "terminal_observations": ((num_envs, observation_size),  observation_dtype),
+        }
+
+        for key, (shape, dtype) in layout.items():
+            size = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+
+            if names is None:
+                self.blocks[key] = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                self.blocks[key] = shared_memory.SharedMemory(name=names[key])
+
+            setattr(self, key, numpy.ndarray(shape, dtype=dtype, buffer=self.blocks[key].buf))
+
+    def names(self):
+        return {key: block.name for key, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        # the arrays have to be dropped before the memory they point into can be closed
+        for key in self.blocks:
+            setattr(self, key, None)
+
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def _worker(connection, names, num_envs, observation_size, env_indices, seed, sandbox_size, min_spawn_dist, obstacle_count, observation_mode):
+    """
+    runs the simulations for env_indices in a worker process, reading actions from and writing results to the shared buffers
+    """
+    buffers = SharedBuffers(num_envs, observation_size, names, numpy.float32 if observation_mode == "float32" else numpy.int64)
+    sims = {}
+
+    # every new simulation gets its own seed from this, so with a seed the whole sequence of episodes can be repeated
+    seeds = numpy.random.default_rng(seed)
+
+    def new_sim(index):
+        sims[index] = simulation.SingleSimulation(obstacle_count, sandbox_size, min_spawn_dist, seed=int(seeds.integers(2 ** 63)))
+        gymadapter.observe(sims[index], buffers.observations[index], observation_mode)
+
+    try:
+        while True:
+            command = connection.recv_bytes()
+
+            if command == COMMAND_STEP:
+                for index in env_indices:
+                    sim = sims[index]
+                    sim.tick(ACTION_TURNING[buffers.actions[index]], 1.0)
+
+                    # Higher fitness == better
+                    buffers.rewards[index] = sim.fitness
+                    buffers.dones[index] = sim.crashed
+
+                    gymadapter.observe(sim, buffers.observations[index], observation_mode)
+
+                    # start a crashed simulation again, keeping the last observation of the old one
+                    if sim.crashed:
+                        buffers.terminal_observations[index] = buffers.observations[index]
+                        new_sim(index)
+
+            elif command == COMMAND_RESET:
+                if seed is not None:
+                    seeds = numpy.random.default_rng(seed)
+
+                for index in env_indices:
+                    new_sim(index)
+
+            connection.send_bytes(command)
+
+            if command == COMMAND_CLOSE:
+                break
+
+    finally:
+        buffers.close()
+        connection.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    A stable-baselines3 VecEnv that runs its environments in a pool of worker processes, so training can use every core
+
+    each worker looks after an even share of the environments
+    actions, observations, rewards and dones are passed through shared memory, the only thing sent to the workers each step is a one byte command
+    """
+
+    def __init__(self, num_envs=8, num_workers=None, sandbox_size=800, min_spawn_dist=500, obstacle_count=10, seed=None, observation_mode="multidiscrete"):
+        if num_workers is None:
+            num_workers = min(num_envs, multiprocessing.cpu_count())
+
+        if num_workers > num_envs:
+            raise ValueError("Invalid num_envs/num_workers combination, each worker needs at least one environment")
+
+        # Same spaces as SimulationGymnasiumAdapter
+        assert observation_mode in gymadapter.SimulationGymnasiumAdapter.observation_modes
+
+        if observation_mode == "float32":
+            observation_space = gymadapter.float32_observation_space(len(Vehicle.dotSensorAngleList))
+        else:
+            observation_list = [int((2 * pi * 1000) + 1)]
+
+            for _ in Vehicle.dotSensorAngleList:
+                observation_list.append(int(DotSensor().length) + 1)
+
+            observation_space = gymnasium.spaces.MultiDiscrete(observation_list)
+
+        observation_size = observation_space.shape[0]
+        self.buffers = SharedBuffers(num_envs, observation_size, observation_dtype=observation_space.dtype)
+        self.connections = []
+        self.processes = []
+        self.closed = False
+
+        for worker in range(num_workers):
+            parent_connection, child_connection = multiprocessing.Pipe()
+
+            process = multiprocessing.Process(target=_worker,
+                                              args=(child_connection, self.buffers.names(), num_envs, observation_size,
+                                                    list(range(worker, num_envs, num_workers)),
+                                                    None if seed is None else seed + worker,
+                                                    sandbox_size, min_spawn_dist, obstacle_count, observation_mode),
+                                              daemon=True)
+            process.start()
+            child_connection.close()
+
+            self.connections.append(parent_connection)
+            self.processes.append(process)
+
+        self.render_mode = None
+
+        super().__init__(num_envs, observation_space, gymnasium.spaces.Discrete(3))
+
+
+    def _command(self, command):
+        # send to every worker first so they all run at the same time, then wait for all of them
+        for connection in self.connections:
+            connection.send_bytes(command)
+
+        for connection in self.connections:
+            connection.recv_bytes()
+
+
+    def reset(self):
+        self._command(COMMAND_RESET)
+
+        self._reset_seeds()
+        self._reset_options()
+
+        return self.buffers.observations.copy()
+
+
+    def step_async(self, actions):
+        self.buffers.actions[:] = actions
+        for connection in self.connections:
+            connection.send_bytes(COMMAND_STEP)
+
+
+    def step_wait(self):
+        for connection in self.connections:
+            connection.recv_bytes()
+
+        dones = self.buffers.dones.copy()
+
+        info_list = [{} for _ in range(self.num_envs)]
+        for index in numpy.flatnonzero(dones):
+            info_list[index]["terminal_observation"] = self.buffers.terminal_observations[index].copy()
+            info_list[index]["TimeLimit.truncated"] = False
+
+        return (self.buffers.observations.copy(), self.buffers.rewards.copy(), dones, info_list)
+
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._command(COMMAND_CLOSE)
+
+        for process in self.processes:
+            process.join()
+
+        self.buffers.close(unlink=True)
+        self.closed = True
+
+
+    def get_attr(self, attr_name, indices=None):
+        if attr_name == "render_mode":
+            return [None for _ in self._get_indices(indices)]
+
+        raise AttributeError(attr_name + " is not available from the worker processes")
+
+
+    def set_attr(self, attr_name, value, indices=None):
+        raise AttributeError(attr_name + " can not be set in the worker processes")
+
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise AttributeError(method_name + " can not be called in the worker processes")
+
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -1,94 +1,206 @@
+import argparse
 import os
+import statistics
 import common
+import entity.kernels
+import instrumentation
 import pyglet
-import threading
 import simulation
 import time
 
-from collisionavoidance import SearchAgent
+import recording
+import renderer
+from collisionavoidance import SearchAgent, TreeSearchAgent, MCTSAgent, CEMAgent
 
-def render(sim, window):
+class WindowObserver:
     """
-    Render the given simulation 'sim' into window 'window'
+    Shows a simulation in a window while it is being run, without holding it up
+
+    the simulation is not ticked by the window, instead the runner calls sample after every tick,
+    and a frame is only drawn if enough time has passed since the last one for the chosen frame rate
     """
 
-    # Define font used
-    pyglet.resource.add_font("assets/ComicShannsMono-Regular.ttf")
-    mainFont = "Comic Shanns Mono"
-    mainFontSize = 24
-
-    # Flip the Y coordinate so things render the right way round.
-    # This isn't strictly necessary, and 0 being the bottom left is in my opinion superior,
-    # however this renderer replaces a Pygame-based renderer which has Y in the top left instead,
-    # and consistency is nice.
-    def flip_y_coord(y):
-        return window.get_size()[1] - y
-
-    # On each frame, draw the scene
-    @window.event
-    def on_draw():
-        # Even though this array is not read, all objects to be drawn must be added or they won't render.
-        # Presumably, that is the garbage collector's doing.
-        objects = []
-
-        # Batch all of the draws together so Pyglet can optimise the OpenGL
-        drawBatch = pyglet.graphics.Batch()
-
-        # Car corners
-        sim.car.makeScreenSpacePoints(800, 800)
-
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceTopLeft[0], flip_y_coord(sim.car.screenSpaceTopLeft[1]), 3, color=(255, 0, 255), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceTopRight[0], flip_y_coord(sim.car.screenSpaceTopRight[1]), 3, color=(255, 255, 0), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceBottomLeft[0], flip_y_coord(sim.car.screenSpaceBottomLeft[1]), 3, color=(0, 255, 255), batch=drawBatch))
-        objects.append(pyglet.shapes.Circle(sim.car.screenSpaceBottomRight[0], flip_y_coord(sim.car.screenSpaceBottomRight[1]), 3, color=(255, 255, 255), batch=drawBatch))
-
-        # Debug info
-        objects.append(pyglet.text.Label(str(sim.car.direction), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(10), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.obstacleList[0].relX), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(40), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.obstacleList[0].relY), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(70), anchor_x="left", anchor_y="top", batch=drawBatch))
-        objects.append(pyglet.text.Label(str(sim.instanceNo), font_name=mainFont, font_size=mainFontSize, color=(255, 255, 255), x=10, y=flip_y_coord(100), anchor_x="left", anchor_y="top", batch=drawBatch))
-
-        # Obstacles
-        for obstacle in sim.obstacleList:
-            obstacle.makeScreenSpacePoints(800, 800)
-            objects.append(pyglet.shapes.Circle(obstacle.screenSpaceX,
-                                                flip_y_coord(obstacle.screenSpaceY),
-                                                obstacle.radius(),
-                                                color=(255 if obstacle.collidingWithCar else 0,
-                                                       0 if obstacle.collidingWithCar else 255,
-                                                       0),
-                                                batch=drawBatch))
-
-        # Draw the scene
-        window.clear()
-        drawBatch.draw()
-
-        sim.tick(SearchAgent().chooseDirection(sim), 1.0)
-
-        if sim.crashed:
-            pyglet.app.exit()
-
-    @window.event
-    def on_close():
-        window.close()
+    def __init__(self, window, fps: float = 60.0):
+        self.window = window
+        self.frameInterval = 1.0 / fps
+        self.nextFrame = 0.0
+        self.renderer = None
 
-def main():
+    def sample(self, sim) -> bool:
+        """
+        draw 'sim' if a frame is due, returns False once the window has been closed
+        """
+        if self.closed():
+            return False
+
+        now = time.perf_counter()
+        if now < self.nextFrame:
+            return True
+
+        self.nextFrame = now + self.frameInterval
+
+        # the same renderer is kept for every episode, it only needs to be pointed at the current simulation
+        if self.renderer is None:
+            self.renderer = renderer.render(sim, self.window)
+        self.renderer.sim = sim
+
+        self.window.switch_to()
+        self.window.dispatch_events()
+        if self.closed():
+            return False
+
+        self.window.dispatch_event("on_draw")
+        self.window.flip()
+
+        return True
+
+    def closed(self) -> bool:
+        # the renderer's on_close closes the window, which leaves it without a context
+        return self.window.has_exit or self.window.context is None
+
+def runEpisode(agent, observer=None, seed=None, recordPath=None) -> tuple:
     """
-    Runs the control panel, which is responsible for running simulations,
-    visualising the data, etc.
+    Runs one episode of the simulation with 'agent' choosing where the car goes, as fast as it can be ticked
+    returns the final fitness, how many ticks it lasted, and whether it was stopped early by the observer
+    if recordPath is given, every tick is recorded there (see recording.Recorder)
     """
 
-    # Set the load path for assets
-    pyglet.resource.path = [os.path.dirname(__file__) + "/.."]
-    pyglet.resource.reindex()
-    print(pyglet.resource.path[0])
-
     # Spawn an instance of the simulation
-    sim = simulation.SingleSimulation(10, 800, 500)
+    sim = simulation.SingleSimulation(10, 800, 500, seed=seed)
     sim.tick(0.0, 0.0)
-    render(sim, pyglet.window.Window(800, 800, "Car Navigation - Renderer"))
-    pyglet.app.run()
-    print("Fitness for search agent: " + str(sim.fitness))
+
+    recorder = None if recordPath is None else recording.Recorder(recordPath, sim)
+    try:
+        return runSimulation(sim, agent, observer)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+def runSimulation(sim, agent, observer=None) -> tuple:
+    """
+    Ticks 'sim' with 'agent' choosing where the car goes until it crashes, see runEpisode
+    """
+    ticks = 0
+    while not sim.crashed:
+        sim.tick(agent.chooseDirection(sim), 1.0)
+        ticks += 1
+
+        if observer is not None and not observer.sample(sim):
+            return sim.fitness, ticks, True
+
+    # show the crash before moving on
+    if observer is not None:
+        observer.nextFrame = 0.0
+        observer.sample(sim)
+
+    return sim.fitness, ticks, False
+
+def main():
+    """
+    Runs the search agent on the simulation for a number of episodes, optionally watching it in a window,
+    then reports how well it did
+    """
+
+    parser = argparse.ArgumentParser(description="Run a search agent on the simulation")
+    parser.add_argument("--agent", choices=["search", "tree", "mcts", "cem"], default="search",
+                        help="search looks ahead with each action held constant, tree searches sequences of actions, mcts runs monte carlo tree search to a deadline, "
+                             "cem samples sequences of actions and rolls them all out at once")
+    parser.add_argument("--steps", type=int, default=8,
+                        help="lookahead steps for the search agent, or actions deep for the tree and cem agents")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds the tree or mcts agent may spend on each decision, 0.005 by default for both")
+    parser.add_argument("--samples", type=int, default=128,
+                        help="sequences of actions the cem agent rolls out each iteration, at least as many as the 16 elites it keeps")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes to run the search agent's lookaheads in parallel, 0 runs them in this process")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without opening a window, so no display is needed")
+    parser.add_argument("--episodes", type=int, default=1,
+                        help="number of episodes to run, each one with a new simulation")
+    parser.add_argument("--render-fps", type=float, default=60.0,
+                        help="how many frames per second to draw when not headless, the simulation itself runs as fast as it can")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the first episode, each episode after it uses the next number, so a run can be repeated")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="record every tick to FILE so the episode can be replayed with replay_trace.py, with more than one episode the episode number is added to the name")
+    parser.add_argument("--backend", choices=entity.kernels.Backends, default=None,
+                        help="how the simulation is calculated, numba (if it is installed) is used by default, see entity/kernels.py")
+    parser.add_argument("--instrument", default=None, metavar="FILE",
+                        help="record how long each part of the tick, search and rendering takes, and write summaries to FILE as JSON lines")
+    parser.add_argument("--instrument-interval", type=float, default=10.0,
+                        help="seconds between summaries written with --instrument")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        try:
+            entity.kernels.setBackend(args.backend)
+        except ImportError as error:
+            parser.error(str(error))
+
+    if args.instrument is not None:
+        instrumentation.enable(args.instrument, args.instrument_interval)
+
+    if args.agent == "mcts":
+        agent = MCTSAgent(deadline=0.005 if args.time_budget is None else args.time_budget, seed=args.seed)
+    elif args.agent == "cem":
+        try:
+            agent = CEMAgent(horizon=args.steps, samples=args.samples, seed=args.seed)
+        except ValueError as error:
+            parser.error("--samples: " + str(error))
+    elif args.agent == "tree":
+        agent = TreeSearchAgent(depth=args.steps, timeBudget=0.005 if args.time_budget is None else args.time_budget)
+    else:
+        agent = SearchAgent(args.steps, workers=args.workers)
+
+    observer = None
+    if not args.headless:
+        # Set the load path for assets
+        pyglet.resource.path = [os.path.dirname(__file__) + "/.."]
+        pyglet.resource.reindex()
+        print(pyglet.resource.path[0])
+
+        observer = WindowObserver(pyglet.window.Window(800, 800, "Car Navigation - Renderer"), args.render_fps)
+
+    fitnesses = []
+    totalTicks = 0
+    startTime = time.perf_counter()
+
+    for episode in range(args.episodes):
+        if args.agent in ("mcts", "cem"):
+            agent.reset()
+
+        recordPath = args.record
+        if recordPath is not None and args.episodes > 1:
+            name, extension = os.path.splitext(recordPath)
+            recordPath = name + "-" + str(episode + 1) + extension
+
+        fitness, ticks, stopped = runEpisode(agent, observer, None if args.seed is None else args.seed + episode, recordPath)
+        if stopped:
+            break
+
+        fitnesses.append(fitness)
+        totalTicks += ticks
+        print("Episode " + str(episode + 1) + ": fitness " + str(fitness) + " after " + str(ticks) + " ticks")
+
+    elapsed = time.perf_counter() - startTime
+
+    if observer is not None:
+        observer.window.close()
+
+    if args.agent == "search":
+        agent.close()
+
+    if args.instrument is not None:
+        instrumentation.disable()
+
+    if fitnesses:
+        print("Fitness for " + args.agent + " agent over " + str(len(fitnesses)) + " episodes: " +
+              "mean " + str(statistics.mean(fitnesses)) +
+              ", stdev " + str(statistics.stdev(fitnesses) if len(fitnesses) > 1 else 0.0) +
+              ", median " + str(statistics.median(fitnesses)) +
+              ", min " + str(min(fitnesses)) +
+              ", max " + str(max(fitnesses)))
+        print(str(totalTicks) + " ticks in " + str(round(elapsed, 2)) + "s, " + str(round(totalTicks / elapsed, 1)) + " ticks per second")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,66 @@
+import numpy
+
+from stable_baselines3.common.vec_env import VecEnv
+
+import gymadapter
+
+class SimulationVecEnvAdapter(VecEnv):
+    """
+    A stable-baselines3 VecEnv over gymadapter.SimulationVectorEnvAdapter, so the batched simulation can be trained on directly
+    instead of wrapping single environments with make_vec_env
+    """
+
+    def __init__(self, num_envs=8, sandbox_size=800, min_spawn_dist=500, obstacle_count=10, observation_mode="multidiscrete"):
+        self.venv = gymadapter.SimulationVectorEnvAdapter(num_envs, sandbox_size, min_spawn_dist, obstacle_count, copy=False, observation_mode=observation_mode)
+        self.actions = None
+
+        super().__init__(num_envs, self.venv.single_observation_space, self.venv.single_action_space)
+
+
+    def reset(self):
+        seed = self._seeds[0]
+        observations, _ = self.venv.reset(seed=seed)
+
+        self._reset_seeds()
+        self._reset_options()
+
+        # stable-baselines3 keeps hold of the last observations, so they can't be the buffer that the next step writes into
+        return observations.copy()
+
+
+    def step_async(self, actions):
+        self.actions = actions
+
+
+    def step_wait(self):
+        observations, rewards, terminations, truncations, infos = self.venv.step(self.actions)
+
+        dones = terminations | truncations
+
+        # stable-baselines3 wants a list of info dicts, with the observation from before the reset for environments that finished
+        info_list = [{} for _ in range(self.num_envs)]
+        for index in numpy.flatnonzero(dones):
+            info_list[index]["terminal_observation"] = infos["final_obs"][index]
+            info_list[index]["TimeLimit.truncated"] = bool(truncations[index] and not terminations[index])
+
+        return (observations.copy(), rewards.copy(), dones, info_list)
+
+
+    def close(self):
+        self.venv.close()
+
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self.venv, attr_name) for _ in self._get_indices(indices)]
+
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.venv, attr_name, value)
+
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self.venv, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+
+# Add stable-baselines3 from lib subdir
+sys.path.append(os.path.dirname(__file__) + "/../lib/stable_baselines3")
+import stable_baselines3
+
+import policyserver
+
+def main():
+    """
+    Loads a trained model once and answers requests for actions from any number of simulations (see policyserver.py)
+    """
+
+    parser = argparse.ArgumentParser(description="Serve a trained model's actions over a Unix socket, batching requests together")
+    parser.add_argument("model", help="the saved model to serve")
+    parser.add_argument("--algorithm", choices=["A2C", "PPO", "DQN"], default="A2C",
+                        help="the stable-baselines3 algorithm the model was trained with")
+    parser.add_argument("--socket", default="/tmp/collision-avoidance-policy.sock",
+                        help="path of the Unix socket to listen on")
+    parser.add_argument("--window", type=float, default=2.0,
+                        help="milliseconds to wait for more requests to batch with the first one waiting")
+    parser.add_argument("--max-batch", type=int, default=1024,
+                        help="observations in a batch that make it run without waiting for the rest of the window")
+    parser.add_argument("--device", default="cpu",
+                        help="torch device to run the model on")
+    parser.add_argument("--report-interval", type=float, default=10.0,
+                        help="seconds between the latency and throughput reports written to stdout as JSON lines")
+    args = parser.parse_args()
+
+    model = getattr(stable_baselines3, args.algorithm).load(args.model, device=args.device)
+
+    server = policyserver.PolicyServer(model, args.socket, args.window / 1000.0, args.max_batch, args.report_interval)
+    print("serving " + args.model + " on " + args.socket, file=sys.stderr)
+
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.report()
+        server.close()
+
+if __name__ == "__main__":
+    main()
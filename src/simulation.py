@@ -1,9 +1,15 @@
-from entity.obstacle import Obstacle
+from entity.obstacle import Obstacle, ObstacleStore
+from entity.obstaclegrid import ObstacleGrid
 from entity.vehicle import Vehicle
-from entity.dotsensor import DotSensor
+from entity.dotsensor import DotSensor, DotSensorArray
 
 from dataclasses import dataclass
-from math import pi, cos, radians
+from math import pi, cos, floor, radians, sin, sqrt
+import time
+
+import numpy
+
+import instrumentation
 
 class SingleSimulation:
     """
@@ -26,19 +32,29 @@ class SingleSimulation:
     # px
     FloorIsLavaStart = -100
 
+    # most ticks that advance works out at once, see advance
+    AdvanceStretch = 256
+
+
+    def __init__(self, numberOfObstacles, sandboxSize: float = 2000.0, minDistance: float = 500.0, spatialIndex: bool = False, seed=None,
+                 lazySensors: bool = False):
+        """
+        if spatialIndex is True, the obstacles are also kept in an ObstacleGrid, so collisions and sensors only look at the obstacles near the car
+        this only pays off once there are a lot of obstacles, with only a few the overhead of the grid costs more than it saves
+
+        every random number the simulation uses comes from its own generator seeded with 'seed', so two simulations with the same seed
+        given the same inputs play out the same way, without a seed the generator is seeded from the operating system
 
-    def __init__(self, numberOfObstacles, sandboxSize: float = 2000.0, minDistance: float = 500.0):
+        lazySensors sets up the simulation for lookaheads, see the lazySensors property
+        """
         # Make sure obstacles are not spawned outside a valid range
         if sandboxSize < minDistance:
             raise ValueError("Invalid sandboxSize/minDistance combination, minDistance must be less than sandboxSize")
 
-        # Instance counter
-        if "instanceCount" not in SingleSimulation.__dict__:
-            SingleSimulation.instanceCount = 0
-        else:
-            SingleSimulation.instanceCount += 1
+        self.instanceNo = SingleSimulation._nextInstanceNo()
 
-        self.instanceNo = SingleSimulation.instanceCount
+        # Random number generator for obstacle spawning
+        self.rng = numpy.random.default_rng(seed)
 
         # Sandbox initialisation
         self.sandboxSize = sandboxSize
@@ -51,58 +67,220 @@ class SingleSimulation:
         self.floorIsLavaHeight = SingleSimulation.FloorIsLavaStart
 
         # Obstacle initialisation
-        self.obstacleList: list[Obstacle] = []
+        self.obstacles = ObstacleStore(self.sandboxSize, capacity=max(16, 2 * numberOfObstacles))
         for _ in range(numberOfObstacles):
-            self.obstacleList.append(Obstacle(float("Infinity"), 0.0, self.sandboxSize))
+            self.obstacles.append(float("Infinity"), 0.0)
+
+        self.grid = ObstacleGrid(self.obstacles) if spatialIndex else None
+
+        self.lazySensors = lazySensors
 
+        # Tick log, see tick and replayTick
+        self.tickLog = None
+        self._scriptedRespawns = None
+
+        # recording.Recorder writing every tick to a file, if there is one
+        self.recorder = None
 
         # Tick over once
         self.tick(0.0, 0.0)
 
+    @property
+    def obstacleList(self) -> list[Obstacle]:
+        """
+        a view of every obstacle in the simulation, backed by self.obstacles
+        """
+        return self.obstacles.views
+
+    @property
+    def lazySensors(self) -> bool:
+        """
+        when True, tick only works out what fitness and crashed need (movement, respawns, collisions and the floor is lava),
+        and the sensors are left stale until something reads them, when they are worked out from the state at that point
+        a lookahead that only looks at fitness and crashed never pays for the sensors at all, and ends up with the same fitness and crashed
+
+        this belongs to the instance rather than its state, so it is not changed by copyInto or restore
+        """
+        return self.car.sensors.refresher is not None
+
+    @lazySensors.setter
+    def lazySensors(self, lazy: bool) -> None:
+        if not lazy:
+            self.car.sensors.refresh()
+
+        self.car.sensors.refresher = self._refreshSensors if lazy else None
+
+    def _refreshSensors(self) -> None:
+        """
+        aim the sensors and update what they detect, the same as tick does when the sensors are not lazy
+        """
+        self.car.sensors.faceDirection(self.car.direction)
+
+        if self.grid is not None:
+            nearby = self.grid.query(self.car.sensors.length)
+            self.car.sensors.updateDetect(self.obstacles.relX[nearby], self.obstacles.relY[nearby])
+        else:
+            self.car.sensors.updateDetect(self.obstacles.relX, self.obstacles.relY)
+
+    @staticmethod
+    def _nextInstanceNo() -> int:
+        """
+        Instance counter
+        """
+        if "instanceCount" not in SingleSimulation.__dict__:
+            SingleSimulation.instanceCount = 0
+        else:
+            SingleSimulation.instanceCount += 1
+
+        return SingleSimulation.instanceCount
+
+    @classmethod
+    def _blank(cls) -> "SingleSimulation":
+        """
+        create an instance without running the constructor, so no obstacles are spawned and no tick is run
+        the state has to be filled in afterwards with copyInto or restore
+        """
+        returnInstance = cls.__new__(cls)
+        returnInstance.instanceNo = SingleSimulation._nextInstanceNo()
+        returnInstance.rng        = numpy.random.default_rng(0)
+
+        returnInstance.sandboxSize          = 0.0
+        returnInstance.obstacleRespawnCount = 0
+        returnInstance.car                  = Vehicle()
+        returnInstance.fitness              = 0.0
+        returnInstance.crashed              = False
+        returnInstance.floorIsLavaHeight    = SingleSimulation.FloorIsLavaStart
+        returnInstance.obstacles            = ObstacleStore()
+        returnInstance.grid                 = None
+        returnInstance.tickLog              = None
+        returnInstance.recorder             = None
+        returnInstance._scriptedRespawns    = None
+
+        return returnInstance
 
     def copy(self):
-        returnInstance                      = SingleSimulation(len(self.obstacleList))
-        returnInstance.sandboxSize          = self.sandboxSize
-        returnInstance.obstacleRespawnCount = self.obstacleRespawnCount
+        """
+        returns a new instance with the same state as this one
+        """
+        returnInstance = SingleSimulation._blank()
+        self.copyInto(returnInstance)
+
+        return returnInstance
+
+    def copyInto(self, other: "SingleSimulation") -> None:
+        """
+        overwrite the state of 'other' with the state of this instance
+        this reuses the arrays already allocated in 'other', so a lookahead can keep one scratch instance and copy into it every time
+
+        the state of the random number generator is copied as well, so the copy respawns obstacles the same way this instance would
+        """
+        if instrumentation.enabled:
+            instrumentation.count("simulation.copies")
+
+        other.sandboxSize          = self.sandboxSize
+        other.obstacleRespawnCount = self.obstacleRespawnCount
+        other.fitness              = self.fitness
+        other.crashed              = self.crashed
+        other.floorIsLavaHeight    = self.floorIsLavaHeight
+
+        other.rng.bit_generator.state = self.rng.bit_generator.state
+
+        other.car.copyFrom(self.car)
+        other.obstacles.copyFrom(self.obstacles)
+
+        # the copy keeps using a spatial index if this instance has one
+        if self.grid is None:
+            other.grid = None
+        else:
+            if other.grid is None:
+                other.grid = ObstacleGrid(other.obstacles, self.grid.cellSize)
+            other.grid.copyFrom(self.grid)
+
+    # layout of a snapshot, the header is followed by the x positions, y positions and collision flags of every obstacle
+    SnapshotHeader = ("direction", "speed", "fitness", "floorIsLavaHeight", "crashed", "obstacleRespawnCount", "sandboxSize", "minSpawnDistance", "obstacleCount")
+
+    def snapshotSize(self) -> int:
+        """
+        returns the number of values a snapshot of this instance needs
+        """
+        return len(SingleSimulation.SnapshotHeader) + len(self.car.sensors) + (3 * len(self.obstacles))
 
+    def snapshot(self, out: numpy.ndarray = None) -> numpy.ndarray:
+        """
+        returns the state of the simulation as one flat array of floats, which can be given back to restore
+
+        the header values are followed by the detect value of each sensor, then the obstacle arrays
+        the state of the random number generator is not part of the snapshot, only what has already been spawned
+        if 'out' is given and is big enough, the snapshot is written into the start of it instead of a new array
+        """
+        size = self.snapshotSize()
+        if out is None or len(out) < size:
+            out = numpy.empty(size)
+
+        header = len(SingleSimulation.SnapshotHeader)
+        sensorCount = len(self.car.sensors)
+        obstacleCount = len(self.obstacles)
+
+        out[:header] = (self.car.direction, self.car.speed, self.fitness, self.floorIsLavaHeight, self.crashed, self.obstacleRespawnCount,
+                        self.obstacles.sandboxSize, self.obstacles.minSpawnDistance, obstacleCount)
 
-        # copy over the car ==================================================================
-        returnInstance.car             = Vehicle()
-        returnInstance.car.direction   = self.car.direction
-        returnInstance.car.speed       = self.car.speed
-        returnInstance.car.maxSpeed    = self.car.maxSpeed
+        position = header
+        out[position:position + sensorCount] = self.car.sensors.detect
+        position += sensorCount
+        out[position:position + obstacleCount] = self.obstacles.relX
+        position += obstacleCount
+        out[position:position + obstacleCount] = self.obstacles.relY
+        position += obstacleCount
+        out[position:position + obstacleCount] = self.obstacles.colliding
 
-        returnInstance.car.topLeft     = self.car.topLeft
-        returnInstance.car.topRight    = self.car.topRight
-        returnInstance.car.bottomLeft  = self.car.bottomLeft
-        returnInstance.car.bottomRight = self.car.bottomRight
+        return out[:size]
 
-        returnInstance.car.topLeftDatum     = self.car.topLeftDatum
-        returnInstance.car.topRightDatum    = self.car.topRightDatum
-        returnInstance.car.bottomLeftDatum  = self.car.bottomLeftDatum
-        returnInstance.car.bottomRightDatum = self.car.bottomRightDatum
+    def restore(self, snapshot: numpy.ndarray) -> None:
+        """
+        put the simulation back into the state saved by snapshot
+        """
+        header = len(SingleSimulation.SnapshotHeader)
+        sensorCount = len(self.car.sensors)
 
-        returnInstance.car.screenSpaceTopLeft     = self.car.screenSpaceTopLeft
-        returnInstance.car.screenSpaceTopRight    = self.car.screenSpaceTopRight
-        returnInstance.car.screenSpaceBottomLeft  = self.car.screenSpaceBottomLeft
-        returnInstance.car.screenSpaceBottomRight = self.car.screenSpaceBottomRight
-        returnInstance.car.screenSpaceCentre      = self.car.screenSpaceCentre
+        (direction, speed, fitness, floorIsLavaHeight, crashed, obstacleRespawnCount,
+         sandboxSize, minSpawnDistance, obstacleCount) = snapshot[:header].tolist()
+        obstacleCount = int(obstacleCount)
 
-        for angle in self.car.dotSensorAngleList:
-            returnInstance.car.dotSensorList.append(DotSensor())
-            returnInstance.car.dotSensorList[-1].setOffset(radians(angle))
+        self.car.direction = direction
+        self.car.speed = speed
+        self.fitness = fitness
+        self.floorIsLavaHeight = floorIsLavaHeight
+        self.crashed = bool(crashed)
+        self.obstacleRespawnCount = int(obstacleRespawnCount)
+        self.sandboxSize = sandboxSize
 
-        returnInstance.car.rotatePoints()
+        # recalculate the corners of the car and the direction of its sensors, then put back what the sensors last saw
+        self.car.sensors.stale = False
+        self.car.rotatePoints()
 
-        returnInstance.obstacleList = []
+        position = header
+        self.car.sensors.detect[:] = snapshot[position:position + sensorCount]
+        position += sensorCount
 
-        for obstacle in self.obstacleList:
-            returnInstance.obstacleList.append(Obstacle(obstacle.relX, obstacle.relY, obstacle.sandboxSize, obstacle.minSpawnDistance))
-            returnInstance.obstacleList[-1].screenSpaceX     = obstacle.screenSpaceX
-            returnInstance.obstacleList[-1].screenSpaceY     = obstacle.screenSpaceY
-            returnInstance.obstacleList[-1].collidingWithCar = obstacle.collidingWithCar
+        self.obstacles.sandboxSize = sandboxSize
+        self.obstacles.minSpawnDistance = minSpawnDistance
+        self.obstacles.resize(obstacleCount)
+        self.obstacles.relX[:] = snapshot[position:position + obstacleCount]
+        position += obstacleCount
+        self.obstacles.relY[:] = snapshot[position:position + obstacleCount]
+        position += obstacleCount
+        self.obstacles.colliding[:] = snapshot[position:position + obstacleCount]
 
-        # finished copying over the car ======================================================
+        if self.grid is not None:
+            self.grid.rebuild()
+
+    @classmethod
+    def fromSnapshot(cls, snapshot: numpy.ndarray) -> "SingleSimulation":
+        """
+        returns a new instance in the state saved by snapshot
+        """
+        returnInstance = cls._blank()
+        returnInstance.restore(snapshot)
 
         return returnInstance
 
@@ -111,11 +289,22 @@ class SingleSimulation:
         Perform one tick of the simulation, with inputs given to the tick for the car
         turning < -0.5 means turn left, turning > 0.5 means turn right
         forward > 0.5 means go forward
+
+        if self.tickLog is a list, the inputs and where any obstacles respawned are added to the end of it,
+        which is enough for replayTick to repeat this tick exactly on a copy of the simulation
+        the same is given to self.recorder if there is one, see recording.Recorder
         """
         # no point running the tick if the car has already crashed
         if self.crashed:
             return
 
+        # see instrumentation, each phase of the tick is timed separately
+        timing = instrumentation.enabled
+        if timing:
+            tickStart = phaseStart = time.perf_counter()
+
+        respawnPositions = None if (self.tickLog is None and self.recorder is None) else []
+
         if turning < -0.5:
             self.car.direction -= SingleSimulation.TurnAmount
 
@@ -133,28 +322,50 @@ class SingleSimulation:
         else:
             self.car.speed = 0.0
 
-        # set up the car first
-        self.car.rotatePoints()
+        # set up the car first, the sensors are only aimed when they are about to be updated
+        lazySensors = self.car.sensors.refresher is not None
+        self.car.rotatePoints(not lazySensors)
+
+        if timing:
+            phaseStart = instrumentation.phase("tick.car", phaseStart)
+            respawnCountBefore = self.obstacleRespawnCount
+            obstacleCountBefore = len(self.obstacles)
 
         # go through every obstacle that is part of this simulation and check to see if it needs respawned
-        for obstacle in self.obstacleList:
-            # if the object has fallen outside of the bounds specified, or if it has x position infinity, signalling that it needs a respawn
-            if (abs(obstacle.relX) > self.sandboxSize) or (abs(obstacle.relY) > self.sandboxSize) or (obstacle.relX == float("Infinity")):
-                # Create a new obstacle every 20 respawns, this has the effect of gradually increasing the difficulty
-                if(self.obstacleRespawnCount % 20 == 0 and self.obstacleRespawnCount != 0):
-                    self.obstacleList.append(Obstacle(float("Infinity"), 0.0, self.sandboxSize))
+        self._respawnObstacles(self.obstacles.respawnIndices().tolist(), respawnPositions)
+
+        if timing:
+            phaseStart = instrumentation.phase("tick.respawn", phaseStart)
+            instrumentation.count("obstacles.respawned", self.obstacleRespawnCount - respawnCountBefore)
+            instrumentation.count("obstacles.added", len(self.obstacles) - obstacleCountBefore)
+
+        # once the obstacles have been respawned (if necessary), move them all in the given direction
+        self.obstacles.move(self.car.speed, self.car.direction)
 
-                obstacle.respawn(self.car.direction)
-                self.obstacleRespawnCount += 1
+        # with a spatial index, only the obstacles near the car need to be checked for collisions and by the sensors
+        # the obstacles it leaves out are too far away to make any difference to either
+        if self.grid is not None:
+            self.grid.move(self.car.speed, self.car.direction)
+            nearby = self.grid.query(Vehicle.collisionRange() if lazySensors else max(Vehicle.collisionRange(), self.car.sensors.length))
+            nearX = self.obstacles.relX[nearby]
+            nearY = self.obstacles.relY[nearby]
+        else:
+            nearby = slice(None)
+            nearX = self.obstacles.relX
+            nearY = self.obstacles.relY
+
+        if timing:
+            phaseStart = instrumentation.phase("tick.move", phaseStart)
 
-            # once the obstacle has been respawned (if necessary), move it in the given direction
-            obstacle.move(self.car.speed, self.car.direction)
+        # and check to see if the car has collided with any of the obstacles
+        collided = self.car.collidingIndices(nearX, nearY)
+        if len(collided) > 0:
+            # if it has then this simulation is done
+            self.crashed = True
+            self.obstacles.colliding[collided if self.grid is None else nearby[collided]] = True
 
-            # and check to see if the car has collided with the obstacle
-            if self.car.collidedWith(obstacle):
-                # if it has then this simulation is done
-                self.crashed = True
-                obstacle.collidingWithCar = True
+        if timing:
+            phaseStart = instrumentation.phase("tick.collision", phaseStart)
 
         # if the car isnt going in the correct direction quickly enough, fail it
         # this most likely means it got stuck doing donuts instead of progressing, which would otherwise lead to an infinite session
@@ -162,9 +373,768 @@ class SingleSimulation:
         if self.fitness < self.floorIsLavaHeight:
             self.crashed = True
 
-        # go through every dot sensor and check to see if there are any being detected
-        for sensor in self.car.dotSensorList:
-            sensor.updateDetect(self.obstacleList)
+        # update every dot sensor at once to see if there are any obstacles being detected
+        # or with lazy sensors, leave that until something reads them
+        if lazySensors:
+            self.car.sensors.stale = True
+        else:
+            self.car.sensors.updateDetect(nearX, nearY)
+
+        if timing:
+            instrumentation.phase("tick.sensors", phaseStart)
 
         # Increase the fitness (up direction)
         self.fitness += (cos(self.car.direction) * self.car.speed)
+
+        if self.tickLog is not None:
+            self.tickLog.append((turning, forward, respawnPositions))
+
+        if self.recorder is not None:
+            self.recorder.record(self, turning, forward, respawnPositions)
+
+        if timing:
+            instrumentation.phase("tick", tickStart)
+            instrumentation.count("ticks")
+            instrumentation.maybeReport()
+
+    def _respawnObstacles(self, respawnList: list, respawnPositions: list = None) -> None:
+        """
+        respawn every obstacle in respawnList, adding where each one went to respawnPositions if it is a list
+
+        this is done in the same order as the obstacles are stored, so the random numbers are drawn in the same order every time
+        """
+        i = 0
+        while i < len(respawnList):
+            # Create a new obstacle every 20 respawns, this has the effect of gradually increasing the difficulty
+            # the new obstacle has x position infinity, so it gets respawned at the end of this loop
+            if(self.obstacleRespawnCount % 20 == 0 and self.obstacleRespawnCount != 0):
+                self.obstacles.append(float("Infinity"), 0.0)
+                respawnList.append(len(self.obstacles) - 1)
+
+            obstacle = self.obstacleList[respawnList[i]]
+            obstacle.respawn(self.car.direction, None if self._scriptedRespawns is None else next(self._scriptedRespawns), self.rng)
+            self.obstacleRespawnCount += 1
+
+            if self.grid is not None:
+                self.grid.update(respawnList[i])
+            i += 1
+
+            if respawnPositions is not None:
+                respawnPositions.append((obstacle.relX, obstacle.relY))
+
+    def replayTick(self, turning: float, forward: float, respawnPositions: list) -> None:
+        """
+        Perform one tick of the simulation like tick does, but respawn obstacles at the positions given instead of random ones
+
+        given an entry from the tick log of another instance in the same state, this puts this instance in the same state that one ended up in
+        """
+        self._scriptedRespawns = iter(respawnPositions)
+        try:
+            self.tick(turning, forward)
+        finally:
+            self._scriptedRespawns = None
+
+    def advance(self, nTicks: int, turning: float = 0.0, forward: float = 1.0) -> int:
+        """
+        Perform nTicks ticks with the same inputs, ending in exactly the same state as calling tick nTicks times would
+        returns the number of ticks performed, which is less than nTicks if the car crashed
+
+        without turning, the car keeps the same heading, so every tick moves every obstacle by the same amount,
+        which means the next tick where an obstacle could hit the car, or leave the sandbox, can be worked out ahead of time
+        every tick before an obstacle could hit the car only moves the obstacles, updates the fitness and the floor is lava,
+        so a whole stretch of them is done with a few array operations, only stopping where something respawns or the floor is lava trips,
+        and the sensors are only updated at the end
+        """
+        # turning changes the heading every tick, and the tick log and recorder want every tick, so those are ticked one at a time
+        if -0.5 <= turning <= 0.5 and self.tickLog is None and self.recorder is None:
+            quietTicks = self._quietTicks
+        else:
+            quietTicks = None
+
+        ticks = 0
+        while ticks < nTicks and not self.crashed:
+            # a full tick, which also sets up the heading and speed, and respawns any obstacles that need it
+            self.tick(turning, forward)
+            ticks += 1
+
+            if quietTicks is None or self.crashed or ticks == nTicks:
+                continue
+
+            skip, respawnFree = quietTicks(nTicks - ticks)
+            if skip == 0:
+                continue
+
+            # the same as tick does, minus everything that makes no difference for these ticks
+            speed = self.car.speed
+            direction = self.car.direction
+            fitnessGain = cos(direction) * speed
+            deltaX = speed * sin(direction)
+            deltaY = speed * cos(direction)
+            skipped = 0
+
+            # a respawned obstacle is at least minSpawnDistance away (give or take rounding), so can't come into range for this many ticks
+            spawnTicks = int(floor((self.obstacles.minSpawnDistance - 1.0 - (Vehicle.collisionRange() + 1.0)) / speed)) - 1
+
+            # whether the obstacles were just respawned, which is done at the start of a tick, before it moves them
+            respawned = False
+
+            while skipped < skip:
+                # everything these ticks change, side by side, and how much each tick adds to each of them
+                # (the obstacles' x and y, then the fitness, the floor is lava and the grid's origin), respawning can add obstacles
+                obstacleCount = len(self.obstacles.relX)
+                fitnessColumn = 2 * obstacleCount
+                lavaColumn = fitnessColumn + 1
+                steps = numpy.empty(fitnessColumn + 4)
+                steps[:obstacleCount] = -deltaX
+                steps[obstacleCount:fitnessColumn] = deltaY
+                steps[fitnessColumn:] = (fitnessGain, SingleSimulation.FloorIsLavaSpeed, deltaX, -deltaY)
+
+                # the state before each of the next ticks at once, row j being the state after j of them
+                # numpy.add.accumulate adds each column up one row at a time, which is the same additions in the same order as ticking,
+                # so the state is exactly the same as if tick had been called every time
+                rows = min(skip - skipped, SingleSimulation.AdvanceStretch) + 1
+                origin = (self.grid.originX, self.grid.originY) if self.grid is not None else (0.0, 0.0)
+                path = SingleSimulation._path(numpy.concatenate((self.obstacles.relX, self.obstacles.relY,
+                                                                 (self.fitness, self.floorIsLavaHeight) + origin)), steps, rows)
+
+                # a tick that trips the floor is lava is left for tick to do
+                tripped = path[:, fitnessColumn] < path[:, lavaColumn] + SingleSimulation.FloorIsLavaSpeed
+                lavaRow = int(tripped.argmax()) if tripped.any() else rows
+
+                # as is one that starts with an obstacle outside of the sandbox, which can't happen until respawnFree ticks have passed
+                respawnRow = rows
+                if skipped + rows > respawnFree:
+                    positions = path[:, :fitnessColumn]
+                    outside = ((numpy.abs(positions) > self.obstacles.sandboxSize) | (positions == float("Infinity"))).any(axis=1)
+                    outside[0] &= not respawned
+                    if outside.any():
+                        respawnRow = int(outside.argmax())
+
+                stop = min(rows - 1, lavaRow, respawnRow)
+                if stop > 0:
+                    state = path[stop]
+                    self.obstacles.relX[:] = state[:obstacleCount]
+                    self.obstacles.relY[:] = state[obstacleCount:fitnessColumn]
+                    self.fitness, self.floorIsLavaHeight, originX, originY = state[fitnessColumn:].tolist()
+
+                    if self.grid is not None:
+                        self.grid.originX = originX
+                        self.grid.originY = originY
+
+                    skipped += stop
+                    respawned = False
+
+                if stop == lavaRow:
+                    break
+
+                if stop != respawnRow:
+                    continue
+
+                # otherwise the next tick starts by respawning, which the next full tick does if these ticks are up
+                if spawnTicks < 1 or skipped == skip:
+                    break
+
+                self._respawnObstacles(self.obstacles.respawnIndices().tolist())
+                skip = min(skip, skipped + spawnTicks)
+                respawned = True
+
+            ticks += skipped
+
+            if skipped > 0:
+                # the sensors only show the state after the last tick, so they only need updating once
+                if self.car.sensors.refresher is not None:
+                    self.car.sensors.stale = True
+                else:
+                    self._refreshSensors()
+
+                if instrumentation.enabled:
+                    instrumentation.count("ticks.skipped", skipped)
+
+        return ticks
+
+    @staticmethod
+    def _path(start: numpy.ndarray, steps, rows: int) -> numpy.ndarray:
+        """
+        returns 'rows' rows, the first being 'start', and each one after it the one before plus 'steps', added one row at a time
+        """
+        path = numpy.empty((rows,) + start.shape, dtype=numpy.result_type(start, steps))
+        path[0] = start
+        path[1:] = steps
+
+        return numpy.add.accumulate(path, axis=0, out=path)
+
+    def _quietTicks(self, limit: int) -> tuple:
+        """
+        if the car carries on as it is, returns how many of the next ticks (up to 'limit') are certain to have no obstacle come within
+        collisionRange of the car, and how many are certain to have no obstacle respawn
+
+        both are found in closed form, as the first tick at which any obstacle could come into range or leave the sandbox,
+        minus a tick of slack, so rounding can only ever make them smaller than they could have been
+        """
+        speed = self.car.speed
+        if speed == 0.0 or len(self.obstacles) == 0:
+            return (0, 0)
+
+        relX = self.obstacles.relX
+        relY = self.obstacles.relY
+        sandboxSize = self.obstacles.sandboxSize
+
+        # every tick each obstacle moves by (velocityX, velocityY)
+        velocityX = -(speed * sin(self.car.direction))
+        velocityY = speed * cos(self.car.direction)
+
+        # ticks until the first obstacle leaves the sandbox, which is respawned the tick after
+        exit = float("Infinity")
+        if velocityX > 0:
+            exit = min(exit, (sandboxSize - float(relX.max())) / velocityX)
+        elif velocityX < 0:
+            exit = min(exit, (sandboxSize + float(relX.min())) / -velocityX)
+
+        if velocityY > 0:
+            exit = min(exit, (sandboxSize - float(relY.max())) / velocityY)
+        elif velocityY < 0:
+            exit = min(exit, (sandboxSize + float(relY.min())) / -velocityY)
+
+        # ticks until the first obstacle could come within collisionRange (plus a pixel) of the car,
+        # at first assuming every obstacle heads straight for the car, which only needs the nearest one
+        collisionRange = Vehicle.collisionRange() + 1.0
+        distanceSquared = (relX * relX) + (relY * relY)
+        enter = (sqrt(float(distanceSquared.min())) - collisionRange) / speed
+
+        # if that is what stops the ticks being skipped, work out properly when each obstacle comes into range,
+        # the earlier root of |position + (t * velocity)| = range
+        if enter < limit + 1:
+            b = (relX * velocityX) + (relY * velocityY)
+            c = distanceSquared - (collisionRange * collisionRange)
+            a = speed * speed
+            discriminant = (b * b) - (a * c)
+
+            # only obstacles getting closer whose path passes within range come into it, b < 0 is getting closer
+            approaching = numpy.flatnonzero((discriminant >= 0) & (b < 0))
+            if len(approaching) == 0:
+                enter = float("Infinity")
+            else:
+                enter = float(((-b[approaching] - numpy.sqrt(discriminant[approaching])) / a).min())
+
+            if (c <= 0).any():
+                enter = 0.0
+
+        # the tick that moves an obstacle into range has to be a full tick,
+        # and the tick after one moves an obstacle out of the sandbox has to check for respawns, both with a tick of slack
+        return tuple(limit if first == float("Infinity") else max(0, min(limit, int(floor(first)) - 1)) for first in (enter, exit))
+
+
+class BatchSimulation:
+    """
+    A class to control many instances of the simulation at once, each one a separate world with its own car and obstacles
+
+    every world follows the same rules as SingleSimulation, but the state of all of them is held in stacked arrays (one row per world)
+    so that one call to tick advances every world in a single vectorised step
+    obstacles are held in a padded array, slots that are not in use in a world have their position set to NaN
+    """
+
+    def __init__(self, worldCount: int, numberOfObstacles: int, sandboxSize: float = 2000.0, minDistance: float = 500.0, seed=None, autoReset: bool = True):
+        # Make sure obstacles are not spawned outside a valid range
+        if sandboxSize < minDistance:
+            raise ValueError("Invalid sandboxSize/minDistance combination, minDistance must be less than sandboxSize")
+
+        self.worldCount = worldCount
+        self.numberOfObstacles = numberOfObstacles
+        self.sandboxSize = sandboxSize
+        self.minSpawnDistance = minDistance
+        self.autoReset = autoReset
+
+        self.rng = numpy.random.default_rng(seed)
+
+        # Vehicle state, one entry per world
+        self.direction = numpy.zeros(worldCount)
+        self.speed = numpy.zeros(worldCount)
+        self.fitness = numpy.zeros(worldCount)
+        self.crashed = numpy.zeros(worldCount, dtype=numpy.bool_)
+        self.floorIsLavaHeight = numpy.full(worldCount, float(SingleSimulation.FloorIsLavaStart))
+        self.obstacleRespawnCount = numpy.zeros(worldCount, dtype=numpy.int64)
+
+        # worlds that crashed on the last tick, and the fitness they finished with
+        # with autoReset on, these worlds have already been reset by the time tick returns
+        self.terminated = numpy.zeros(worldCount, dtype=numpy.bool_)
+        self.finalFitness = numpy.zeros(worldCount)
+
+        # Obstacle state, one row per world and one column per obstacle slot
+        capacity = max(16, 2 * numberOfObstacles)
+        self.obstacleCount = numpy.zeros(worldCount, dtype=numpy.int64)
+        self.relX = numpy.full((worldCount, capacity), numpy.nan)
+        self.relY = numpy.full((worldCount, capacity), numpy.nan)
+        self.colliding = numpy.zeros((worldCount, capacity), dtype=numpy.bool_)
+
+        # Sensor state, one row per world and one column per sensor
+        self.sensorOffsets = numpy.radians(numpy.array(Vehicle.dotSensorAngleList, dtype=numpy.float64))
+        self.sensorLength = DotSensor().length
+        self.detect = numpy.zeros((worldCount, len(self.sensorOffsets)))
+
+        # with this off, tick leaves the sensors as they are, for rollouts that only look at fitness and crashed
+        self.sensorsEnabled = True
+
+        self.reset()
+
+    @classmethod
+    def fromSingle(cls, sim: SingleSimulation, worldCount: int, seed=None, autoReset: bool = False) -> "BatchSimulation":
+        """
+        returns a batch of 'worldCount' worlds that all start in the state of 'sim', see loadSingle
+        """
+        returnInstance = cls(worldCount, len(sim.obstacles), sim.obstacles.sandboxSize, sim.obstacles.minSpawnDistance, seed, autoReset)
+        returnInstance.loadSingle(sim)
+
+        return returnInstance
+
+    def loadSingle(self, sim: SingleSimulation) -> None:
+        """
+        put every world into the state of 'sim', so each one can carry on from there on its own
+        the worlds draw their respawns from this batch's generator, so they only respawn obstacles the same way 'sim' would by chance
+        """
+        obstacleCount = len(sim.obstacles)
+        self._growTo(obstacleCount)
+
+        self.sandboxSize = sim.obstacles.sandboxSize
+        self.minSpawnDistance = sim.obstacles.minSpawnDistance
+
+        self.direction[:] = sim.car.direction
+        self.speed[:] = sim.car.speed
+        self.fitness[:] = sim.fitness
+        self.crashed[:] = sim.crashed
+        self.floorIsLavaHeight[:] = sim.floorIsLavaHeight
+        self.obstacleRespawnCount[:] = sim.obstacleRespawnCount
+        self.terminated[:] = False
+
+        self.obstacleCount[:] = obstacleCount
+        self.relX[:, :obstacleCount] = sim.obstacles.relX
+        self.relX[:, obstacleCount:] = numpy.nan
+        self.relY[:, :obstacleCount] = sim.obstacles.relY
+        self.relY[:, obstacleCount:] = numpy.nan
+        self.colliding[:, :obstacleCount] = sim.obstacles.colliding
+        self.colliding[:, obstacleCount:] = False
+
+        if self.sensorsEnabled:
+            self.detect[:] = sim.car.sensors.detect
+
+    def reset(self, worlds=None) -> None:
+        """
+        put the given worlds (a boolean mask, or every world if not given) back to the start of a new run
+        """
+        if worlds is None:
+            worlds = numpy.ones(self.worldCount, dtype=numpy.bool_)
+
+        self.direction[worlds] = 0.0
+        self.speed[worlds] = 0.0
+        self.fitness[worlds] = 0.0
+        self.crashed[worlds] = False
+        self.floorIsLavaHeight[worlds] = SingleSimulation.FloorIsLavaStart
+        self.obstacleRespawnCount[worlds] = 0
+
+        # x position infinity signals that an obstacle needs respawning, which happens in the tick below
+        self.obstacleCount[worlds] = self.numberOfObstacles
+        self.relX[worlds] = numpy.nan
+        self.relY[worlds] = numpy.nan
+        self.relX[worlds, :self.numberOfObstacles] = float("Infinity")
+        self.relY[worlds, :self.numberOfObstacles] = 0.0
+        self.colliding[worlds] = False
+
+        # Tick over once
+        self._tick(numpy.zeros(self.worldCount), numpy.zeros(self.worldCount), worlds)
+
+    def tick(self, turning, forward) -> None:
+        """
+        Perform one tick of every world, with an input for each world given in the turning and forward arrays
+        the inputs mean the same as they do for SingleSimulation.tick
+
+        worlds that crash are flagged in self.terminated, and if autoReset is on they are started again straight away
+        """
+        self.terminated = self._tick(numpy.asarray(turning, dtype=numpy.float64), numpy.asarray(forward, dtype=numpy.float64), ~self.crashed)
+        self.finalFitness[self.terminated] = self.fitness[self.terminated]
+
+        if self.autoReset and self.terminated.any():
+            self.reset(self.terminated)
+
+    def _tick(self, turning: numpy.ndarray, forward: numpy.ndarray, worlds: numpy.ndarray) -> numpy.ndarray:
+        """
+        advance only the worlds in the boolean mask 'worlds', returns a mask of the worlds that crashed in this tick
+        """
+        self.direction[worlds & (turning < -0.5)] -= SingleSimulation.TurnAmount
+        self.direction[worlds & (turning > 0.5)] += SingleSimulation.TurnAmount
+
+        # this keeps the value of direction a sane value
+        self.direction[self.direction > (2 * pi)] -= (2 * pi)
+        self.direction[self.direction < 0] += (2 * pi)
+
+        self.speed[worlds] = numpy.where(forward[worlds] > 0.5, SingleSimulation.CarSpeed, 0.0)
+
+        self._respawn(worlds)
+
+        # move every obstacle in every world that is being ticked
+        sinDirection = numpy.sin(self.direction)[:, None]
+        cosDirection = numpy.cos(self.direction)[:, None]
+        speed = numpy.where(worlds, self.speed, 0.0)[:, None]
+
+        self.relX -= speed * sinDirection
+        self.relY += speed * cosDirection
+
+        # unused slots are NaN, which never collides
+        collidedWorld, collidedSlot = BatchSimulation.collidingPairs(self.relX, self.relY, self.direction, worlds)
+        self.colliding[collidedWorld, collidedSlot] = True
+
+        crashedNow = numpy.zeros(self.worldCount, dtype=numpy.bool_)
+        crashedNow[collidedWorld] = True
+
+        # floor is lava, see SingleSimulation.tick
+        self.floorIsLavaHeight[worlds] += SingleSimulation.FloorIsLavaSpeed
+        crashedNow |= worlds & (self.fitness < self.floorIsLavaHeight)
+
+        self.crashed |= crashedNow
+
+        if self.sensorsEnabled:
+            self._updateSensors(worlds)
+
+        # Increase the fitness (up direction)
+        self.fitness[worlds] += numpy.cos(self.direction[worlds]) * self.speed[worlds]
+
+        return crashedNow
+
+    def _respawn(self, worlds: numpy.ndarray) -> None:
+        """
+        respawn every obstacle that has fallen outside of its world's sandbox, and add new obstacles to the worlds that have earned them
+        """
+        needsRespawn = ((numpy.abs(self.relX) > self.sandboxSize) | (numpy.abs(self.relY) > self.sandboxSize) | (self.relX == float("Infinity"))) & worlds[:, None]
+
+        respawns = needsRespawn.sum(axis=1)
+        if not respawns.any():
+            return
+
+        # SingleSimulation adds an obstacle whenever the respawn count is a non zero multiple of 20 just before a respawn,
+        # and each new obstacle is respawned in the same tick, which can in turn add another one
+        # so keep counting the multiples of 20 passed until the total number of respawns stops changing
+        startCount = self.obstacleRespawnCount
+        totalRespawns = respawns
+        while True:
+            lastCount = startCount + totalRespawns - 1
+            newObstacles = numpy.where(totalRespawns > 0, (lastCount // 20) - (numpy.maximum(startCount - 1, 0) // 20), 0)
+            if numpy.array_equal(respawns + newObstacles, totalRespawns):
+                break
+            totalRespawns = respawns + newObstacles
+
+        if newObstacles.any():
+            self._growTo(int((self.obstacleCount + newObstacles).max()))
+
+            # new slots are flagged for respawning straight away
+            slots = numpy.arange(self.relX.shape[1])
+            newSlots = (slots >= self.obstacleCount[:, None]) & (slots < (self.obstacleCount + newObstacles)[:, None])
+            self.relX[newSlots] = float("Infinity")
+            self.relY[newSlots] = 0.0
+            self.colliding[newSlots] = False
+            needsRespawn = numpy.pad(needsRespawn, ((0, 0), (0, self.relX.shape[1] - needsRespawn.shape[1]))) | newSlots
+
+            self.obstacleCount += newObstacles
+
+        self.obstacleRespawnCount += totalRespawns
+
+        worldIndex, slotIndex = numpy.nonzero(needsRespawn)
+        self.relX[worldIndex, slotIndex], self.relY[worldIndex, slotIndex] = BatchSimulation.spawnOffsets(self.direction[worldIndex], self.minSpawnDistance, self.sandboxSize, self.rng)
+
+    @staticmethod
+    def spawnOffsets(direction: numpy.ndarray, minSpawnDistance: float, sandboxSize: float, rng: numpy.random.Generator) -> tuple:
+        """
+        returns where to respawn one obstacle for each car pointing in 'direction', relative to that car
+        each one is at a random point in the general direction of its car, see Obstacle.respawn
+        """
+        alongX = ((direction > pi / 4) & (direction < ((3 / 4) * pi))) | ((direction >= ((5 / 4) * pi)) & (direction < ((7 / 4) * pi)))
+        sign = numpy.where((direction > pi / 4) & (direction < ((5 / 4) * pi)), 1.0, -1.0)
+
+        ahead = sign * rng.integers(round(minSpawnDistance), round(sandboxSize), size=len(direction), endpoint=True)
+        across = rng.integers(-round(sandboxSize), round(sandboxSize), size=len(direction), endpoint=True).astype(numpy.float64)
+
+        return (numpy.where(alongX, ahead, across), numpy.where(alongX, across, ahead))
+
+    def _growTo(self, capacity: int) -> None:
+        """
+        make sure there are at least 'capacity' obstacle slots in each world
+        """
+        if capacity <= self.relX.shape[1]:
+            return
+
+        extra = max(capacity, 2 * self.relX.shape[1]) - self.relX.shape[1]
+        self.relX = numpy.pad(self.relX, ((0, 0), (0, extra)), constant_values=numpy.nan)
+        self.relY = numpy.pad(self.relY, ((0, 0), (0, extra)), constant_values=numpy.nan)
+        self.colliding = numpy.pad(self.colliding, ((0, 0), (0, extra)))
+
+    def _updateSensors(self, worlds: numpy.ndarray) -> None:
+        """
+        update the sensors of every car in the given worlds, see DotSensorArray.updateDetect
+        """
+        self.detect[worlds] = BatchSimulation.sensorKernel(self.relX, self.relY, self.direction, self.sensorOffsets, self.sensorLength, worlds)[worlds]
+
+    @staticmethod
+    def collidingPairs(relX: numpy.ndarray, relY: numpy.ndarray, direction: numpy.ndarray, rows: numpy.ndarray) -> tuple:
+        """
+        returns the row and column index of every obstacle that collides with the car of its row, for the rows in the boolean mask 'rows'
+        relX and relY hold one row of obstacle positions relative to each car, and 'direction' the direction of each car
+        """
+        # only obstacles within collisionRange of their car can collide, which is hardly ever more than a few of them in the whole batch,
+        # so the kernel is only run on those
+        nearRow, nearColumn = numpy.nonzero((((relX * relX) + (relY * relY)) <= (Vehicle.collisionRange() ** 2)) & rows[:, None])
+        if len(nearRow) == 0:
+            return (nearRow, nearColumn)
+
+        # rotate the corners of each car, see Vehicle.rotatePoints
+        halfWidth = Vehicle.getWidth() / 2
+        halfHeight = Vehicle.getHeight() / 2
+        sinDirection = numpy.sin(direction)[nearRow]
+        cosDirection = numpy.cos(direction)[nearRow]
+
+        def rotate(x, y):
+            return ((x * cosDirection) - (y * sinDirection), (x * sinDirection) + (y * cosDirection))
+
+        topLeft     = rotate(-halfWidth, -halfHeight)
+        topRight    = rotate(halfWidth, -halfHeight)
+        bottomLeft  = rotate(-halfWidth, halfHeight)
+        bottomRight = rotate(halfWidth, halfHeight)
+
+        collisions = Vehicle.collisionKernel(topLeft, topRight, bottomLeft, bottomRight, relX[nearRow, nearColumn], relY[nearRow, nearColumn])
+
+        return (nearRow[collisions], nearColumn[collisions])
+
+    @staticmethod
+    def sensorKernel(relX: numpy.ndarray, relY: numpy.ndarray, direction: numpy.ndarray, sensorOffsets: numpy.ndarray, sensorLength: float,
+                     rows: numpy.ndarray) -> numpy.ndarray:
+        """
+        returns the detect value of every sensor (columns) of every car (rows), for the rows in the boolean mask 'rows', the rest are left at 0
+        relX and relY hold one row of obstacle positions relative to each car, and 'direction' the direction of each car
+        """
+        lengthSquared = sensorLength ** 2
+        distanceSquared = (relX ** 2) + (relY ** 2)
+
+        # only a few obstacles are ever in range of the sensors, so gather those to the front of each row and only check them
+        inRange = (distanceSquared <= lengthSquared) & rows[:, None]
+        mostInRange = int(inRange.sum(axis=1).max()) if len(inRange) > 0 else 0
+
+        if mostInRange == 0:
+            return numpy.zeros((len(direction), len(sensorOffsets)))
+
+        order = numpy.argsort(~inRange, axis=1, kind="stable")[:, :mostInRange]
+        relX = numpy.take_along_axis(relX, order, axis=1)[:, None, :]
+        relY = numpy.take_along_axis(relY, order, axis=1)[:, None, :]
+        distanceSquared = numpy.where(numpy.take_along_axis(inRange, order, axis=1), numpy.take_along_axis(distanceSquared, order, axis=1), float("Infinity"))[:, None, :]
+
+        facingDirection = direction[:, None] + sensorOffsets[None, :]
+        farCornerX = (numpy.sin(facingDirection) * sensorLength)[:, :, None]
+        farCornerY = -(numpy.cos(facingDirection) * sensorLength)[:, :, None]
+        d_r_2 = (farCornerX ** 2) + (farCornerY ** 2)
+
+        nearestDistanceSquared = DotSensorArray.nearestDetected(farCornerX, farCornerY, d_r_2, lengthSquared, relX, relY, distanceSquared)
+
+        return numpy.where(rows[:, None], numpy.clip(1.0 - (numpy.sqrt(nearestDistanceSquared) / sensorLength), 0.0, 1.0), 0.0)
+
+
+class SharedWorldSimulation:
+    """
+    A class to control many cars driving through one shared field of obstacles, so they can be compared against exactly the same obstacles
+
+    unlike SingleSimulation and BatchSimulation, positions here are absolute, so the cars move and the obstacles stay where they are
+    each car has its own fitness, floor is lava height and crashed flag, held in arrays (one entry per car) like BatchSimulation,
+    but the obstacles only have to be checked for respawning once per tick for the whole field, instead of once for every car
+    the cars are ghosts to each other, they only ever crash into obstacles
+    """
+
+    # how many times a respawned obstacle is placed again for landing too close to a car, before it is left for the next tick
+    SpawnAttempts = 8
+
+    def __init__(self, vehicleCount: int, numberOfObstacles: int, sandboxSize: float = 2000.0, minDistance: float = 500.0, seed=None):
+        # Make sure obstacles are not spawned outside a valid range
+        if sandboxSize < minDistance:
+            raise ValueError("Invalid sandboxSize/minDistance combination, minDistance must be less than sandboxSize")
+
+        self.vehicleCount = vehicleCount
+        self.sandboxSize = sandboxSize
+        self.minSpawnDistance = minDistance
+
+        self.rng = numpy.random.default_rng(seed)
+
+        # Vehicle state, one entry per car, every car starts at the origin
+        self.x = numpy.zeros(vehicleCount)
+        self.y = numpy.zeros(vehicleCount)
+        self.direction = numpy.zeros(vehicleCount)
+        self.speed = numpy.zeros(vehicleCount)
+        self.fitness = numpy.zeros(vehicleCount)
+        self.crashed = numpy.zeros(vehicleCount, dtype=numpy.bool_)
+        self.floorIsLavaHeight = numpy.full(vehicleCount, float(SingleSimulation.FloorIsLavaStart))
+
+        # cars that crashed on the last tick
+        self.terminated = numpy.zeros(vehicleCount, dtype=numpy.bool_)
+
+        # Obstacle state, shared by every car, slots past obstacleCount are not in use
+        self.obstacleRespawnCount = 0
+        self.obstacleCount = 0
+        capacity = max(16, 2 * numberOfObstacles)
+        self.obstacleX = numpy.full(capacity, numpy.nan)
+        self.obstacleY = numpy.full(capacity, numpy.nan)
+        self.colliding = numpy.zeros(capacity, dtype=numpy.bool_)
+
+        for _ in range(numberOfObstacles):
+            self._addObstacle()
+
+        # Sensor state, one row per car and one column per sensor
+        self.sensorOffsets = numpy.radians(numpy.array(Vehicle.dotSensorAngleList, dtype=numpy.float64))
+        self.sensorLength = DotSensor().length
+        self.detect = numpy.zeros((vehicleCount, len(self.sensorOffsets)))
+
+        # with this off, tick leaves the sensors as they are, see BatchSimulation
+        self.sensorsEnabled = True
+
+        # Tick over once
+        self.tick(numpy.zeros(vehicleCount), numpy.zeros(vehicleCount))
+
+    def tick(self, turning, forward) -> None:
+        """
+        Perform one tick of every car, with an input for each car given in the turning and forward arrays
+        the inputs mean the same as they do for SingleSimulation.tick
+
+        cars that crash are flagged in self.terminated, and cars that have already crashed are left where they are
+        """
+        turning = numpy.asarray(turning, dtype=numpy.float64)
+        forward = numpy.asarray(forward, dtype=numpy.float64)
+
+        driving = ~self.crashed
+        self.terminated = numpy.zeros(self.vehicleCount, dtype=numpy.bool_)
+        if not driving.any():
+            return
+
+        self.direction[driving & (turning < -0.5)] -= SingleSimulation.TurnAmount
+        self.direction[driving & (turning > 0.5)] += SingleSimulation.TurnAmount
+
+        # this keeps the value of direction a sane value
+        self.direction[self.direction > (2 * pi)] -= (2 * pi)
+        self.direction[self.direction < 0] += (2 * pi)
+
+        self.speed[driving] = numpy.where(forward[driving] > 0.5, SingleSimulation.CarSpeed, 0.0)
+
+        self._respawn(driving)
+
+        # move every car that is still driving, the same way SingleSimulation moves the obstacles the other way
+        speed = numpy.where(driving, self.speed, 0.0)
+        self.x += speed * numpy.sin(self.direction)
+        self.y -= speed * numpy.cos(self.direction)
+
+        # every obstacle relative to every car, one row per car, for the collisions and sensors to share
+        relX = self.obstacleX[None, :self.obstacleCount] - self.x[:, None]
+        relY = self.obstacleY[None, :self.obstacleCount] - self.y[:, None]
+
+        collidedVehicle, collidedObstacle = BatchSimulation.collidingPairs(relX, relY, self.direction, driving)
+        self.colliding[collidedObstacle] = True
+        self.terminated[collidedVehicle] = True
+
+        # floor is lava, see SingleSimulation.tick
+        self.floorIsLavaHeight[driving] += SingleSimulation.FloorIsLavaSpeed
+        self.terminated |= driving & (self.fitness < self.floorIsLavaHeight)
+
+        self.crashed |= self.terminated
+
+        if self.sensorsEnabled:
+            self.detect[driving] = BatchSimulation.sensorKernel(relX, relY, self.direction, self.sensorOffsets, self.sensorLength, driving)[driving]
+
+        # Increase the fitness (up direction)
+        self.fitness[driving] += numpy.cos(self.direction[driving]) * self.speed[driving]
+
+    def toSingle(self, vehicle: int, out: SingleSimulation = None) -> SingleSimulation:
+        """
+        returns a SingleSimulation in the state that car 'vehicle' is in, with every obstacle relative to it,
+        so the agents in collisionavoidance.py can choose where each car goes
+        if 'out' is given it is overwritten and returned, instead of creating a new instance
+
+        the SingleSimulation respawns obstacles on its own, so a lookahead in it only matches this world until something respawns
+        """
+        sim = SingleSimulation._blank() if out is None else out
+
+        sim.sandboxSize = self.sandboxSize
+        sim.obstacleRespawnCount = self.obstacleRespawnCount
+        sim.fitness = float(self.fitness[vehicle])
+        sim.crashed = bool(self.crashed[vehicle])
+        sim.floorIsLavaHeight = float(self.floorIsLavaHeight[vehicle])
+
+        sim.car.direction = float(self.direction[vehicle])
+        sim.car.speed = float(self.speed[vehicle])
+        sim.car.sensors.stale = False
+        sim.car.rotatePoints()
+        sim.car.sensors.detect[:] = self.detect[vehicle]
+
+        sim.obstacles.sandboxSize = self.sandboxSize
+        sim.obstacles.minSpawnDistance = self.minSpawnDistance
+        sim.obstacles.resize(self.obstacleCount)
+        sim.obstacles.relX[:] = self.obstacleX[:self.obstacleCount] - self.x[vehicle]
+        sim.obstacles.relY[:] = self.obstacleY[:self.obstacleCount] - self.y[vehicle]
+        sim.obstacles.colliding[:] = self.colliding[:self.obstacleCount]
+
+        if sim.grid is not None:
+            sim.grid.rebuild()
+
+        return sim
+
+    def _addObstacle(self) -> int:
+        """
+        add an obstacle at infinity, so it gets respawned, returns its index
+        """
+        if self.obstacleCount == len(self.obstacleX):
+            extra = len(self.obstacleX)
+            self.obstacleX = numpy.pad(self.obstacleX, (0, extra), constant_values=numpy.nan)
+            self.obstacleY = numpy.pad(self.obstacleY, (0, extra), constant_values=numpy.nan)
+            self.colliding = numpy.pad(self.colliding, (0, extra))
+
+        index = self.obstacleCount
+        self.obstacleX[index] = float("Infinity")
+        self.obstacleY[index] = 0.0
+        self.colliding[index] = False
+        self.obstacleCount += 1
+
+        return index
+
+    def _respawn(self, driving: numpy.ndarray) -> None:
+        """
+        respawn every obstacle that is outside of the sandbox of every car still driving, as none of them can reach it any more
+        """
+        cars = numpy.flatnonzero(driving)
+
+        relX = self.obstacleX[None, :self.obstacleCount] - self.x[cars, None]
+        relY = self.obstacleY[None, :self.obstacleCount] - self.y[cars, None]
+
+        # obstacles at infinity are never inside a sandbox
+        needed = ((numpy.abs(relX) <= self.sandboxSize) & (numpy.abs(relY) <= self.sandboxSize)).any(axis=0)
+        respawnList = numpy.flatnonzero(~needed).tolist()
+        if len(respawnList) == 0:
+            return
+
+        # Create a new obstacle every 20 respawns, the same as SingleSimulation, but counted once for the whole field
+        i = 0
+        while i < len(respawnList):
+            if(self.obstacleRespawnCount % 20 == 0 and self.obstacleRespawnCount != 0):
+                respawnList.append(self._addObstacle())
+
+            self.obstacleRespawnCount += 1
+            i += 1
+
+        # each obstacle goes in the general direction of a car picked at random from the ones still driving, see BatchSimulation.spawnOffsets
+        # one that lands within minSpawnDistance of any other car is placed again, so nothing appears right in front of a car,
+        # and anything that still has not found a place after SpawnAttempts goes is left at infinity for the next tick
+        remaining = numpy.array(respawnList)
+        for _ in range(SharedWorldSimulation.SpawnAttempts):
+            owner = self.rng.choice(cars, size=len(remaining))
+            offsetX, offsetY = BatchSimulation.spawnOffsets(self.direction[owner], self.minSpawnDistance, self.sandboxSize, self.rng)
+            positionX = self.x[owner] + offsetX
+            positionY = self.y[owner] + offsetY
+
+            tooClose = ((((positionX[:, None] - self.x[cars]) ** 2) + ((positionY[:, None] - self.y[cars]) ** 2)) < (self.minSpawnDistance ** 2)).any(axis=1)
+
+            self.obstacleX[remaining[~tooClose]] = positionX[~tooClose]
+            self.obstacleY[remaining[~tooClose]] = positionY[~tooClose]
+
+            remaining = remaining[tooClose]
+            if len(remaining) == 0:
+                return
+
+        self.obstacleX[remaining] = float("Infinity")
+        self.obstacleY[remaining] = 0.0
@@ -38,10 +38,13 @@ def main():
     gymnasium.register(id="gymnasium_env/SimulationGymnasiumAdapter-v0",
                        entry_point=gymadapter.SimulationGymnasiumAdapter)
 
-    ml_vec_env = stable_baselines3.common.env_util.make_vec_env(gymadapter.SimulationGymnasiumAdapter)
-
     # Load the agent
-    ml_model = stable_baselines3.A2C.load(inputFilename, env=ml_vec_env)
+    ml_model = stable_baselines3.A2C.load(inputFilename)
+
+    # observe the environment the same way the model was trained to, see train_model.py --observations
+    observation_mode = gymadapter.observation_mode_of(ml_model.observation_space)
+    ml_vec_env = stable_baselines3.common.env_util.make_vec_env(gymadapter.SimulationGymnasiumAdapter, env_kwargs={"observation_mode": observation_mode})
+    ml_model.set_env(ml_vec_env)
 
     # Test the agent
     obs = ml_vec_env.reset()
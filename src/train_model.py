@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -10,15 +11,34 @@ sys.path.append(os.path.dirname(__file__) + "/../lib/stable_baselines3")
 import stable_baselines3
 
 import common
+import instrumentation
 import simulation
 import renderer
 import gymadapter
+import rolloutpool
+import sb3adapter
 
 def main():
     """
     Runs the simulations and AI agents
     """
 
+    parser = argparse.ArgumentParser(description="Train an A2C model to drive the car")
+    parser.add_argument("--envs", type=int, default=1,
+                        help="number of environments to train on at once, more than 1 uses the batched simulation without rendering")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes to run the environments in, more than 1 runs at least one environment per worker without rendering")
+    parser.add_argument("--observations", choices=gymadapter.SimulationGymnasiumAdapter.observation_modes, default="multidiscrete",
+                        help="multidiscrete observes the heading and sensors truncated to ints, float32 observes sin/cos of the heading and the full sensor values")
+    parser.add_argument("--instrument", default=None, metavar="FILE",
+                        help="record how long each part of stepping the environment takes, and write summaries to FILE as JSON lines")
+    parser.add_argument("--instrument-interval", type=float, default=10.0,
+                        help="seconds between summaries written with --instrument")
+    args = parser.parse_args()
+
+    if args.instrument is not None:
+        instrumentation.enable(args.instrument, args.instrument_interval)
+
     # Set the load path for assets
     pyglet.resource.path = [os.path.dirname(__file__) + "/.."]
     pyglet.resource.reindex()
@@ -28,7 +48,14 @@ def main():
     gymnasium.register(id="gymnasium_env/SimulationGymnasiumAdapter-v0",
                        entry_point=gymadapter.SimulationGymnasiumAdapter)
 
-    ml_env = gymnasium.make("gymnasium_env/SimulationGymnasiumAdapter-v0", render_mode="pyglet_renderer")
+    if args.workers > 1:
+        ml_env = rolloutpool.SharedMemoryVecEnv(max(args.envs, args.workers), args.workers, observation_mode=args.observations)
+    elif args.envs > 1:
+        ml_env = sb3adapter.SimulationVecEnvAdapter(args.envs, observation_mode=args.observations)
+    else:
+        # draw in a separate process, so training never waits for the window
+        ml_env = gymnasium.make("gymnasium_env/SimulationGymnasiumAdapter-v0", render_mode="pyglet_async",
+                                observation_mode=args.observations)
 
     # Set up the agent
     ml_model = stable_baselines3.A2C("MlpPolicy", ml_env, verbose=1)
@@ -39,6 +66,11 @@ def main():
     # Save the agent
     ml_model.save("a2c_collision_avoidance")
 
+    ml_env.close()
+
+    if args.instrument is not None:
+        instrumentation.disable()
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,185 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy
+import pyglet
+
+import renderer
+import simulation
+from entity.vehicle import Vehicle
+
+# the header at the start of every slot, followed by the snapshot itself (see SingleSimulation.snapshot)
+# sequence is odd while a snapshot is being written, and goes up by 2 for every snapshot written
+HEADER_SEQUENCE = 0
+HEADER_SIZE     = 1
+HEADER_INSTANCE = 2
+HEADER_LENGTH   = 3
+
+
+class SnapshotSlot:
+    """
+    One simulation snapshot in shared memory, which one process writes and another reads without either waiting for the other
+
+    the sequence number at the start works as a seqlock: the writer makes it odd, writes the snapshot, then makes it even again
+    a reader copies the snapshot out and only keeps it if the sequence number was the same even number before and after,
+    otherwise it was being overwritten at the time and the reader just tries again on its next frame
+    """
+
+    def __init__(self, capacity, name=None):
+        self.capacity = capacity
+
+        if name is None:
+            self.block = shared_memory.SharedMemory(create=True, size=(HEADER_LENGTH + capacity) * numpy.dtype(numpy.float64).itemsize)
+        else:
+            self.block = shared_memory.SharedMemory(name=name)
+
+        self.header = numpy.ndarray((HEADER_LENGTH,), dtype=numpy.float64, buffer=self.block.buf)
+        self.data = numpy.ndarray((capacity,), dtype=numpy.float64, buffer=self.block.buf, offset=HEADER_LENGTH * numpy.dtype(numpy.float64).itemsize)
+
+        if name is None:
+            self.header[:] = 0
+
+        # the last sequence number read, so a reader can tell if there is anything new
+        self.lastRead = 0
+
+    def write(self, sim) -> bool:
+        """
+        publish the current state of 'sim', returns False if it was too big to fit
+        """
+        if sim.snapshotSize() > self.capacity:
+            return False
+
+        sequence = self.header[HEADER_SEQUENCE]
+        self.header[HEADER_SEQUENCE] = sequence + 1
+
+        snapshot = sim.snapshot(self.data)
+        self.header[HEADER_SIZE] = len(snapshot)
+        self.header[HEADER_INSTANCE] = sim.instanceNo
+
+        self.header[HEADER_SEQUENCE] = sequence + 2
+        return True
+
+    def read(self):
+        """
+        returns (instanceNo, snapshot) of the latest snapshot, or None if there has not been a new one since the last read
+        or the writer was part way through one
+        """
+        sequence = self.header[HEADER_SEQUENCE]
+        if sequence == self.lastRead or sequence % 2 == 1:
+            return None
+
+        size = int(self.header[HEADER_SIZE])
+        instanceNo = int(self.header[HEADER_INSTANCE])
+        snapshot = self.data[:size].copy()
+
+        if self.header[HEADER_SEQUENCE] != sequence:
+            return None
+
+        self.lastRead = sequence
+        return instanceNo, snapshot
+
+    def close(self, unlink=False):
+        # the arrays have to be dropped before the memory they point into can be closed
+        self.header = None
+        self.data = None
+
+        self.block.close()
+        if unlink:
+            self.block.unlink()
+
+
+def _viewer(names, capacity, fps, resourcePath, running):
+    """
+    runs in the visualiser process, showing the latest snapshot from each slot in its own window
+    """
+    pyglet.resource.path = resourcePath
+    pyglet.resource.reindex()
+
+    slots = [SnapshotSlot(capacity, name) for name in names]
+    windows = []
+    renderers = []
+
+    for index in range(len(slots)):
+        window = pyglet.window.Window(800, 800, "Car Navigation - Renderer" + ("" if len(slots) == 1 else " " + str(index + 1)))
+        windows.append(window)
+        renderers.append(renderer.Renderer(window))
+
+    frameInterval = 1.0 / fps
+
+    try:
+        while running.value and any(window.context is not None for window in windows):
+            frameStart = time.perf_counter()
+
+            for slot, window, slotRenderer in zip(slots, windows, renderers):
+                # the renderer's on_close closes the window, which leaves it without a context
+                if window.context is None:
+                    continue
+
+                latest = slot.read()
+                if latest is not None:
+                    instanceNo, snapshot = latest
+                    if slotRenderer.sim is None:
+                        slotRenderer.sim = simulation.SingleSimulation.fromSnapshot(snapshot)
+                    else:
+                        slotRenderer.sim.restore(snapshot)
+                    slotRenderer.sim.instanceNo = instanceNo
+
+                window.switch_to()
+                window.dispatch_events()
+                if window.context is None:
+                    continue
+
+                window.dispatch_event("on_draw")
+                window.flip()
+
+            time.sleep(max(0.0, frameInterval - (time.perf_counter() - frameStart)))
+
+    finally:
+        for window in windows:
+            window.close()
+
+        for slot in slots:
+            slot.close()
+
+
+class Visualiser:
+    """
+    Shows simulations in windows drawn by a separate process, so whatever is running the simulations never waits on the display
+
+    publish copies the state of a simulation into shared memory and returns straight away,
+    the visualiser process draws whatever the latest state is at its own frame rate, skipping any states it was too slow to see
+    each slot is a separate window, so several simulations can be watched side by side
+    """
+
+    def __init__(self, slots=1, fps=30.0, maxObstacles=4096):
+        capacity = len(simulation.SingleSimulation.SnapshotHeader) + len(Vehicle.dotSensorAngleList) + (3 * maxObstacles)
+
+        self.slots = [SnapshotSlot(capacity) for _ in range(slots)]
+
+        # the process is started fresh instead of forked, so it gets its own OpenGL state
+        context = multiprocessing.get_context("spawn")
+        self.running = context.Value("b", 1, lock=False)
+        self.process = context.Process(target=_viewer,
+                                       args=([slot.block.name for slot in self.slots], capacity, fps, list(pyglet.resource.path), self.running),
+                                       daemon=True)
+        self.process.start()
+
+    def publish(self, sim, slot=0) -> None:
+        """
+        make the current state of 'sim' the one shown in window 'slot'
+        """
+        if self.slots:
+            self.slots[slot].write(sim)
+
+    def close(self) -> None:
+        if not self.slots:
+            return
+
+        self.running.value = 0
+        self.process.join()
+
+        for slot in self.slots:
+            slot.close(unlink=True)
+
+        self.slots = []
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.append(os.path.dirname(__file__) + "/../src")
+
+import simulation
+
+
+def state(simInstance):
+    """
+    everything advance has to leave exactly as ticking would
+    """
+    grid = None if simInstance.grid is None else (simInstance.grid.originX, simInstance.grid.originY)
+    return (simInstance.snapshot().tolist(), simInstance.rng.bit_generator.state, grid)
+
+
+@pytest.mark.parametrize("spatialIndex", [False, True])
+@pytest.mark.parametrize("lazySensors", [False, True])
+@pytest.mark.parametrize("numberOfObstacles, sandboxSize, minDistance", [(10, 800, 500), (20, 600, 300), (10, 2000, 500), (40, 700, 350)])
+def test_advance_matches_ticking(numberOfObstacles, sandboxSize, minDistance, spatialIndex, lazySensors):
+    choices = numpy.random.default_rng(numberOfObstacles + sandboxSize)
+    cases = 0
+
+    for seed in range(3):
+        sim = simulation.SingleSimulation(numberOfObstacles, sandboxSize, minDistance, spatialIndex=spatialIndex, seed=seed)
+
+        while cases < 30 * (seed + 1) and not sim.crashed:
+            # wander somewhere new between cases, so they start from all sorts of states
+            for _ in range(int(choices.integers(1, 40))):
+                sim.tick(float(choices.choice([-1.0, 0.0, 1.0])), 1.0)
+            if sim.crashed:
+                break
+
+            nTicks = int(choices.choice([1, 3, 8, 24, 64, 300, 900]))
+            turning = float(choices.choice([0.0, 0.0, 0.0, 0.3, -1.0, 1.0]))
+            forward = float(choices.choice([1.0, 1.0, 0.5]))
+
+            advanced = sim.copy()
+            advanced.lazySensors = lazySensors
+            ticked = sim.copy()
+            ticked.lazySensors = lazySensors
+
+            ticks = advanced.advance(nTicks, turning, forward)
+
+            expected = 0
+            while expected < nTicks and not ticked.crashed:
+                ticked.tick(turning, forward)
+                expected += 1
+
+            assert ticks == expected
+            assert state(advanced) == state(ticked)
+            cases += 1
+
+    assert cases > 0
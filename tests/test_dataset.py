@@ -0,0 +1,60 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.append(os.path.dirname(__file__) + "/../src")
+
+import dataset
+
+ObservationSize = 13
+
+
+@pytest.fixture
+def written(tmp_path):
+    """
+    a float32 dataset of 10 transitions split over shards of 4, and the observations written to it
+    """
+    observations = numpy.arange(10 * ObservationSize, dtype=numpy.float32).reshape(10, ObservationSize) / 7.0
+
+    writer = dataset.ShardWriter(tmp_path, ObservationSize, shardSize=4, observationMode="float32")
+    for row, observation in enumerate(observations):
+        writer.append(observation, row % 3, float(row), row == 9, row == 4)
+    writer.close()
+
+    return dataset.Dataset(tmp_path), observations
+
+
+def test_get_across_shards(written):
+    data, observations = written
+    indices = [9, 0, 5, 4, 3, 8]
+
+    batch = data.get(indices)
+
+    assert batch["observations"].dtype == numpy.float32
+    assert numpy.array_equal(batch["observations"], observations[indices])
+    assert batch["actions"].tolist() == [index % 3 for index in indices]
+    assert batch["rewards"].tolist() == [float(index) for index in indices]
+    assert batch["terminated"].tolist() == [index == 9 for index in indices]
+    assert batch["truncated"].tolist() == [index == 4 for index in indices]
+
+
+def test_get_nothing_keeps_the_shape_of_each_field(written):
+    data, _ = written
+
+    batch = data.get([])
+
+    assert batch["observations"].shape == (0, ObservationSize)
+    assert batch["observations"].dtype == numpy.float32
+    for field in ("actions", "rewards", "terminated", "truncated"):
+        assert batch[field].shape == (0,)
+        assert batch[field].dtype == data.fields[field]
+
+
+@pytest.mark.parametrize("indices", [[-1], [0, 10], [3, -4]])
+def test_get_rejects_indices_outside_the_dataset(written, indices):
+    data, _ = written
+
+    with pytest.raises(IndexError, match="the dataset has 10 transitions"):
+        data.get(indices)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy
+import pytest
+
+sys.path.append(os.path.dirname(__file__) + "/../src")
+
+import entity.kernels
+import simulation
+
+
+def run(ticks, spatialIndex):
+    """
+    the snapshot after every tick of seeded episodes driven by seeded random inputs, starting a new episode after each crash
+    """
+    choices = numpy.random.default_rng(11)
+    seed = 0
+    sim = simulation.SingleSimulation(20, 600, 300, spatialIndex=spatialIndex, seed=seed)
+    snapshots = []
+
+    for _ in range(ticks):
+        if sim.crashed:
+            seed += 1
+            sim = simulation.SingleSimulation(20, 600, 300, spatialIndex=spatialIndex, seed=seed)
+
+        sim.tick(float(choices.choice([-1.0, 0.0, 1.0, 0.3])), float(choices.choice([1.0, 1.0, 0.5])))
+        snapshots.append(sim.snapshot().tolist())
+
+    # more than one episode, so crashes and respawns have both been through the kernels
+    assert seed > 0
+
+    return snapshots
+
+
+@pytest.fixture
+def numpyBackend(monkeypatch):
+    monkeypatch.setenv("COLLISION_AVOIDANCE_BACKEND", "numpy")
+    monkeypatch.setattr(entity.kernels, "backend", "numpy")
+
+
+@pytest.mark.parametrize("spatialIndex", [False, True])
+def test_uncompiled_kernels_match_numpy(numpyBackend, monkeypatch, spatialIndex):
+    expected = run(400, spatialIndex)
+
+    # without numba the kernels are plain python loops, which do the same operations as what numba would compile,
+    # so this checks the kernels themselves even where numba is not installed
+    # (setBackend refuses the numba backend without numba, so it is switched on directly)
+    monkeypatch.setattr(entity.kernels, "backend", "numba")
+
+    assert run(400, spatialIndex) == expected
+
+
+@pytest.mark.parametrize("spatialIndex", [False, True])
+def test_compiled_kernels_match_numpy(numpyBackend, spatialIndex):
+    pytest.importorskip("numba")
+
+    expected = run(400, spatialIndex)
+    entity.kernels.setBackend("numba")
+
+    assert run(400, spatialIndex) == expected
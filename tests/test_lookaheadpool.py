@@ -0,0 +1,86 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__) + "/../src")
+
+import lookaheadpool
+import simulation
+
+
+def inProcessScores(simInstance, actions, nSteps, crashPenalty):
+    """
+    the scores SearchAgent works out without a pool, along with whether any of the lookaheads respawned an obstacle
+    """
+    scores = []
+    respawned = False
+
+    for action in actions:
+        checkingInstance = simInstance.copy()
+        checkingInstance.lazySensors = True
+        checkingInstance.advance(nSteps, action, 1.0)
+
+        respawned = respawned or checkingInstance.obstacleRespawnCount > simInstance.obstacleRespawnCount
+        scores.append(checkingInstance.fitness + (crashPenalty if checkingInstance.crashed else 0.0))
+
+    return scores, respawned
+
+
+def test_pool_scores_match_in_process_across_respawns():
+    actions = [-1.0, 0.0, 1.0]
+    nSteps = 64
+    crashPenalty = -1e9
+
+    sim = simulation.SingleSimulation(20, 600, 300, seed=7)
+    pool = lookaheadpool.LookaheadPool(2)
+
+    try:
+        anyRespawned = False
+        for _ in range(200):
+            expected, respawned = inProcessScores(sim, actions, nSteps, crashPenalty)
+            anyRespawned = anyRespawned or respawned
+
+            assert pool.evaluate(sim, actions, nSteps, crashPenalty) == expected
+
+            # drive the way SearchAgent would, so the lookaheads keep avoiding obstacles long enough to meet respawned ones
+            sim.tick(actions[expected.index(max(expected))], 1.0)
+            if sim.crashed:
+                break
+
+        # otherwise the rng state was never needed and this tests nothing
+        assert anyRespawned
+        # after the first snapshot the workers only needed the ticks in between
+        assert pool.snapshotsSent == 1
+    finally:
+        pool.close()
+
+
+def test_pool_turns_off_the_tick_log_of_simulations_it_stops_following():
+    actions = [-1.0, 0.0, 1.0]
+    first = simulation.SingleSimulation(10, 800, 500, seed=1)
+    second = simulation.SingleSimulation(10, 800, 500, seed=2)
+    pool = lookaheadpool.LookaheadPool(2)
+
+    try:
+        pool.evaluate(first, actions, 8, -1e9)
+        assert first.tickLog == []
+
+        first.tick(0.0, 1.0)
+        assert len(first.tickLog) == 1
+
+        # following another simulation lets go of the first
+        pool.evaluate(second, actions, 8, -1e9)
+        assert first.tickLog is None
+        assert second.tickLog == []
+        assert pool.snapshotsSent == 2
+
+        pool.stopFollowing()
+        assert second.tickLog is None
+
+        # which is sent in full again if it comes back, and is still scored the same as without a pool
+        second.tick(1.0, 1.0)
+        assert pool.evaluate(second, actions, 8, -1e9) == inProcessScores(second, actions, 8, -1e9)[0]
+        assert pool.snapshotsSent == 3
+    finally:
+        pool.close()
+
+    assert second.tickLog is None
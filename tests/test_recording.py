@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy
+
+sys.path.append(os.path.dirname(__file__) + "/../src")
+
+import collisionavoidance
+import recording
+import simulation
+
+KeyframeInterval = 32
+
+
+def record(path, ticks):
+    """
+    records a seeded episode to 'path', returning the live snapshot from before the first tick and after every tick
+    """
+    sim = simulation.SingleSimulation(20, 600, 300, seed=7)
+    agent = collisionavoidance.SearchAgent(16)
+    recorder = recording.Recorder(path, sim, keyframeInterval=KeyframeInterval)
+
+    snapshots = [sim.snapshot().tolist()]
+    for _ in range(ticks):
+        sim.tick(agent.chooseDirection(sim), 1.0)
+        snapshots.append(sim.snapshot().tolist())
+
+    # otherwise the replay never had to put a respawned obstacle where it was, or the episode ended early
+    assert sim.obstacleRespawnCount > 0
+    assert not sim.crashed
+
+    recorder.close()
+    return snapshots
+
+
+def test_replay_matches_live_snapshots(tmp_path):
+    path = tmp_path / "episode.trace"
+    snapshots = record(path, 100)
+
+    replay = recording.Replay(path)
+    try:
+        assert len(replay) == 100
+
+        # the first and last tick of a chunk either side of each chunk boundary, and the ends of the recording
+        for tick in (0, 1, 31, 32, 33, 63, 64, 65, 95, 96, 99, 100):
+            assert replay.simulationAt(tick).snapshot().tolist() == snapshots[tick], tick
+
+        # a simulation that is given to be put into the state, rather than a new one
+        sim = replay.simulationAt(10)
+        assert replay.simulationAt(70, sim) is sim
+        assert sim.snapshot().tolist() == snapshots[70]
+
+        for tick, sim in enumerate(replay.play(20, 90), start=21):
+            assert sim.snapshot().tolist() == snapshots[tick], tick
+        assert tick == 90
+
+        assert numpy.array_equal(replay.column("fitness"), [snapshot[2] for snapshot in snapshots[1:]])
+    finally:
+        replay.close()
+
+
+def test_truncated_trace_reads_up_to_last_whole_chunk(tmp_path):
+    path = tmp_path / "episode.trace"
+    snapshots = record(path, 100)
+
+    # cut the file off part way through the last chunk, the ticks from 96 on, as if the recording had crashed while writing it
+    data = path.read_bytes()
+    path.write_bytes(data[:-8])
+
+    replay = recording.Replay(path)
+    try:
+        assert len(replay) == 96
+        assert replay.simulationAt(96).snapshot().tolist() == snapshots[96]
+        assert replay.simulationAt(50).snapshot().tolist() == snapshots[50]
+    finally:
+        replay.close()